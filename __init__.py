@@ -2,3 +2,4 @@ import basis
 import hamiltonian
 import group
 import utils
+import solver
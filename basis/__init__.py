@@ -4,3 +4,4 @@ Construct the physical Hilbert space for a given group and set of irreps
 from .basis import vertex_basis, Basis, State
 from .invariant import invariant_states
 from .gauss import gauss_operator
+from .symmetry import SymmetrySectors, state_permutation, reflection_operator
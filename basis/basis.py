@@ -3,10 +3,12 @@ Compute the physical basis, in "compressed form",
 for a given group, irreps and lattice geometry
 """
 
-from itertools import product
+import numpy as np
+from itertools import product, chain
+from functools import cached_property
 from collections import namedtuple
 
-from basis.invariant import invariant_states
+from basis.invariant import invariant_states, invariant_dims
 from group import Group, Irreps
 from utils.mytyping import IrrepConf, VertexLinks, InvariantSpace
 
@@ -15,21 +17,28 @@ def vertex_basis(
         group: Group,
         irreps: Irreps,
         state_dict=False,
-        sanitized=True
+        sanitized=True,
+        method='nullspace'
     ) -> dict[IrrepConf, InvariantSpace]:
     """
     Calculate the whole invariant space of a vertex, given `group` and `irreps`.
-    Used in building the complete physical Hilbert space
+    Used in building the complete physical Hilbert space.
+    See `invariant_states` for the available methods
     """
     basis = dict()
     irrep_conf = product(range(len(irreps)), repeat=4)
+    if method == 'projector':
+        # only the configurations with at least one invariant state
+        dims = invariant_dims(group, irreps)
+        irrep_conf = (conf for conf in irrep_conf if dims[conf])
     for conf in irrep_conf:
         inv_states = invariant_states(
             group,
             irreps,
             conf,
             sanitized=sanitized,
-            state_dict=state_dict
+            state_dict=state_dict,
+            method=method
         )
         if inv_states:
             shape = tuple(irreps.dim(j) for j in conf)
@@ -45,6 +54,86 @@ def vertex_conf(
     return tuple(irrep_conf[l] for l in vertex)
 
 
+def _extension_index(vbasis: dict[IrrepConf, InvariantSpace]) -> dict[tuple, set[int]]:
+    """
+    For each partial vertex configuration (with None for the links not yet assigned)
+    and each unassigned position, the set of irreps that can be assigned there
+    while leaving the configuration completable to one with invariant states
+    """
+    index = dict()
+    for conf in vbasis:
+        for mask in product((False, True), repeat=len(conf)):
+            partial = tuple(j if assigned else None for j, assigned in zip(conf, mask))
+            for pos, assigned in enumerate(mask):
+                if not assigned:
+                    index.setdefault((partial, pos), set()).add(conf[pos])
+    return index
+
+
+def _link_order(vertices: list[VertexLinks], nlinks: int) -> list[int]:
+    """Order the links vertex by vertex, so that each vertex is completed as soon as possible"""
+    order = []
+    for link in chain(chain.from_iterable(vertices), range(nlinks)):
+        if link not in order:
+            order.append(link)
+    return order
+
+
+def allowed_irrep_confs(
+        vertices: list[VertexLinks],
+        nlinks: int,
+        vbasis: dict[IrrepConf, InvariantSpace]
+    ) -> list[IrrepConf]:
+    """
+    Find all the irrep configurations on the links with invariant states on
+    every vertex, in lexicographic order (same as `product` over all the links).
+    The links are assigned by backtracking, pruning as soon as the partial
+    configuration of a vertex has no invariant states
+    """
+    index = _extension_index(vbasis)
+    order = _link_order(vertices, nlinks)
+    # vertices touching each link, with all the positions of the link in the vertex
+    # (a link is on two legs of the same vertex on lattices one vertex wide)
+    link_vertices = [
+        [(vertex, [i for i, l in enumerate(vertex) if l == link]) for vertex in vertices if link in vertex]
+        for link in range(nlinks)
+    ]
+    conf = [None] * nlinks
+    confs = []
+    empty = set()
+
+    def vertex_allowed(vertex: VertexLinks, positions: list[int]) -> set[int]:
+        """Irreps that can be assigned at once to all the `positions` of the vertex"""
+        partial = [conf[l] for l in vertex]
+        allowed = index.get((tuple(partial), positions[0]), empty)
+        if len(positions) == 1:
+            return allowed
+        result = set()
+        for j in allowed:
+            for pos in positions[:-1]:
+                partial[pos] = j
+            if j in index.get((tuple(partial), positions[-1]), empty):
+                result.add(j)
+        return result
+
+    def assign(depth: int):
+        if depth == nlinks:
+            confs.append(tuple(conf))
+            return
+        link = order[depth]
+        allowed = set.intersection(*(
+            vertex_allowed(vertex, positions)
+            for vertex, positions in link_vertices[link]
+        ))
+        for j in allowed:
+            conf[link] = j
+            assign(depth + 1)
+        conf[link] = None
+
+    assign(0)
+    return sorted(confs)
+
+
 State = namedtuple('State', ['irreps', 'subindex'])
 
 
@@ -54,48 +143,157 @@ class Basis:
             group: Group,
             irreps: Irreps,
             vertices: list[VertexLinks],
-            nlinks: int
+            nlinks: int,
+            vbasis: dict[IrrepConf, InvariantSpace] | None = None,
+            basis_dict: dict[IrrepConf, list[InvariantSpace]] | None = None
         ):
+        """
+        The vertex basis (`vbasis`, output of `vertex_basis`) and the
+        invariant spaces of each irrep configuration (`basis_dict`)
+        can be given if they are already known, e.g. from a cache
+        """
         self.group = group
         self.irreps = irreps
         self.vertices = vertices
         self.nlinks = nlinks
-        self._basis = self._compute_basis()
-        self.states = self._expand_state_labels()
+        if basis_dict is not None:
+            self._basis = basis_dict
+        else:
+            self._basis = self._compute_basis(vbasis)
+        self._pack_states()
+        self._pack_vertex_tensors()
 
 
-    def _compute_basis(self) -> dict[IrrepConf, list[InvariantSpace]]:
+    def _compute_basis(
+            self,
+            vbasis: dict[IrrepConf, InvariantSpace] | None = None
+        ) -> dict[IrrepConf, list[InvariantSpace]]:
         """
         Compute the physical Hilbert space, given `group` and `irreps`, the links
         of each vertex (`vertices`) and the number of links
         """
-        possible_irrep_confs = product(range(len(self.irreps)), repeat=self.nlinks)
-        vbasis = vertex_basis(self.group, self.irreps)
-        basis = dict()
-        for conf in possible_irrep_confs:
-            inv_spaces = [
-                vbasis[vertex_conf(conf, vertex)]
-                for vertex in self.vertices
-                if vertex_conf(conf, vertex) in vbasis
-            ]
-            if len(inv_spaces) == len(self.vertices):
-                basis.update({conf: inv_spaces})
-        return basis
-
-    def _expand_state_labels(self):
-        states_list = []
-        for irrep_conf in self._basis.keys():
-            iterators = [range(len(vs)) for vs in self._basis[irrep_conf]]
-            states_list += [
-                State(irrep_conf, subindex)
-                for subindex in product(*iterators)
-            ]
-        return states_list
+        if vbasis is None:
+            vbasis = vertex_basis(self.group, self.irreps)
+        confs = allowed_irrep_confs(self.vertices, self.nlinks, vbasis)
+        return {
+            conf: [vbasis[vertex_conf(conf, vertex)] for vertex in self.vertices]
+            for conf in confs
+        }
 
-    def __call__(self, state: State = None, n: int = None):
-        if n is not None:
-            return self(self.states[n])
+    def _pack_states(self):
+        """
+        Store all the states as rows of a packed integer array
+        `(irreps on the links..., subindex on the vertices...)`,
+        in the same order of `states`. The states of each irrep configuration
+        are contiguous, in the range `conf_ranges[conf]`
+        """
+        nvertices = len(self.vertices)
+        blocks = []
+        self.conf_ranges = dict()
+        start = 0
+        for irrep_conf, spaces in self._basis.items():
+            sizes = [len(vs) for vs in spaces]
+            subindices = np.indices(sizes).reshape(nvertices, -1).T
+            block = np.empty((len(subindices), self.nlinks + nvertices), dtype=np.int64)
+            block[:, :self.nlinks] = irrep_conf
+            block[:, self.nlinks:] = subindices
+            blocks.append(block)
+            self.conf_ranges[irrep_conf] = (start, start + len(block))
+            start += len(block)
+        packed = np.concatenate(blocks) if blocks else \
+            np.zeros((0, self.nlinks + nvertices), dtype=np.int64)
+        self.state_array = packed.astype(np.min_scalar_type(max(packed.max(initial=0), 1)))
+
+        # mixed-radix key of each state, links as the most significant digits
+        max_inv = max((len(vs) for spaces in self._basis.values() for vs in spaces), default=1)
+        radices = [len(self.irreps)] * self.nlinks + [max_inv] * nvertices
+        if np.prod(radices, dtype=object) >= 2**63:
+            raise OverflowError("Too many states to label them with 64-bit keys")
+        self._weights = np.cumprod([1] + radices[:0:-1], dtype=np.int64)[::-1]
+        self.keys = self.state_array @ self._weights
+        self._key_order = np.argsort(self.keys, kind='stable')
+        self._sorted_keys = self.keys[self._key_order]
+
+    def _pack_vertex_tensors(self):
+        """
+        Store the invariant tensors of each vertex configuration in a contiguous
+        array `vertex_stores[n]`, stacked along the first axis (the subindex).
+        `vertex_conf_ids` gives the position `n` of each vertex configuration
+        and `vertex_conf_index[i, v]` the one of the vertex `v` in the `i`-th state
+        """
+        self.vertex_stores = []
+        self.vertex_conf_ids = dict()
+        nvertices = len(self.vertices)
+        self.vertex_conf_index = np.empty((len(self), nvertices), dtype=np.int64)
+        for irrep_conf, spaces in self._basis.items():
+            start, stop = self.conf_ranges[irrep_conf]
+            for v, space in enumerate(spaces):
+                key = vertex_conf(irrep_conf, self.vertices[v])
+                if key not in self.vertex_conf_ids:
+                    self.vertex_conf_ids[key] = len(self.vertex_stores)
+                    self.vertex_stores.append(np.ascontiguousarray(space))
+                self.vertex_conf_index[start:stop, v] = self.vertex_conf_ids[key]
+        self.vertex_conf_index = self.vertex_conf_index.astype(
+            np.min_scalar_type(max(len(self.vertex_stores) - 1, 1))
+        )
+
+    def vertex_tensors(self, irrep_conf: IrrepConf, vertex: int) -> np.ndarray:
+        """Invariant tensors of `vertex` in the irrep configuration, stacked along the first axis"""
+        return self.vertex_stores[self.vertex_conf_ids[vertex_conf(irrep_conf, self.vertices[vertex])]]
+
+    def vertex_tensor(self, state: State | int, vertex: int) -> np.ndarray:
+        """
+        Invariant tensor of `vertex` in the given state (or index of the state),
+        as a view of the store
+        """
+        if isinstance(state, State):
+            return self.vertex_tensors(state.irreps, vertex)[state.subindex[vertex]]
+        conf_id = self.vertex_conf_index[state, vertex]
+        return self.vertex_stores[conf_id][self.subindex_array[state, vertex]]
+
+    def __len__(self):
+        """Number of states"""
+        return len(self.state_array)
+
+    @property
+    def irreps_array(self) -> np.ndarray:
+        """Irreps on the links of each state, as a `(n_states, nlinks)` array"""
+        return self.state_array[:, :self.nlinks]
+
+    @property
+    def subindex_array(self) -> np.ndarray:
+        """Vertex subindices of each state, as a `(n_states, nvertices)` array"""
+        return self.state_array[:, self.nlinks:]
+
+    @cached_property
+    def states(self) -> list[State]:
+        """List of all the states, built on first access"""
         return [
-            self._basis[state.irreps][vertex][subind]
-            for vertex, subind  in enumerate(state.subindex)
+            State(tuple(row[:self.nlinks]), tuple(row[self.nlinks:]))
+            for row in self.state_array.tolist()
         ]
+
+    def indices_of(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Return the indices of the states given as rows of a packed array
+        (same layout of `state_array`), or -1 for the ones not in the basis
+        """
+        keys = np.asarray(rows, dtype=np.int64) @ self._weights
+        if len(self._sorted_keys) == 0:
+            return np.full(len(keys), -1)
+        pos = np.searchsorted(self._sorted_keys, keys)
+        pos = np.minimum(pos, len(self._sorted_keys) - 1)
+        found = self._sorted_keys[pos] == keys
+        return np.where(found, self._key_order[pos], -1)
+
+    def index_of(self, state: State) -> int:
+        """Return the index of `state` in `states`"""
+        index = self.indices_of([tuple(state.irreps) + tuple(state.subindex)])[0]
+        if index < 0:
+            raise KeyError(f"{state} is not in the basis")
+        return int(index)
+
+    def __call__(self, state: State = None, n: int = None):
+        if n is not None:
+            return [self.vertex_tensor(n, vertex) for vertex in range(len(self.vertices))]
+        return [self.vertex_tensor(state, vertex) for vertex in range(len(self.vertices))]
@@ -3,7 +3,6 @@ Utilities for composing and contracting the gauge-invariant states
 """
 
 import numpy as np
-from itertools import chain
 from functools import reduce
 
 from basis import State, Basis
@@ -15,9 +14,8 @@ Tensor = np.ndarray
 
 
 def compose_inv_tensors(psi0: Tensor, psi1: Tensor) -> Tensor:
-    final_shape = tuple(chain(psi0.shape, psi1.shape))
-    result = np.kron(psi0, psi1).reshape(final_shape)
-    return result
+    """Tensor product of two invariant tensors, with the axes of `psi0` first"""
+    return np.multiply.outer(psi0, psi1)
 
 
 def tensor_around_plaq(
@@ -25,7 +23,7 @@ def tensor_around_plaq(
         state: State,
         plaq:  PlaqVertices
     ) -> Tensor:
-    return reduce(compose_inv_tensors, (basis(state)[v] for v in plaq))
+    return reduce(compose_inv_tensors, (basis.vertex_tensor(state, v) for v in plaq))
 
 
 def contract_outside_plaq(
@@ -44,7 +42,7 @@ def contract_magnetic_elem(
         plaq_tensor: Tensor,
         bra_tensor: Tensor,
         ket_tensor: Tensor
-    ) -> float | np.complex:
+    ) -> float | complex:
     axes_list1 = list(range(16))
     axes_list2 = [0, 6, 2, 1, 5, 3, 4, 7, 8, 14, 10, 9, 13, 11, 12, 15]
     psi_plaq = contract_outside_plaq(bra_tensor, ket_tensor)
@@ -53,3 +51,42 @@ def contract_magnetic_elem(
         psi_plaq,
         axes = (axes_list2, axes_list1)
     )
+
+
+# contraction of the legs outside the plaquette of the bra and ket invariant
+# tensors of a vertex, for each position of the vertex in the plaquette:
+# (subindex, legs), (subindex, legs) -> (bra subindex, bra legs, ket subindex, ket legs)
+_VERTEX_SUBSCRIPTS = (
+    '...iabxy,...IABxy->...iabIAB',
+    '...ixcdy,...IxCDy->...icdICD',
+    '...ixyef,...IxyEF->...iefIEF',
+    '...igxyh,...IGxyH->...ighIGH',
+)
+# plaquette tensor (bra links then ket links) with the four vertex matrices,
+# same axes pairing of `contract_magnetic_elem`
+_BLOCK_SUBSCRIPTS = '...adcfgebhADCFGEBH,...iabIAB,...jcdJCD,...kefKEF,...lghLGH->...ijklIJKL'
+_block_paths = dict()
+
+
+def contract_magnetic_block(
+        plaq_tensor: Tensor,
+        bra_tensors: list[Tensor],
+        ket_tensors: list[Tensor]
+    ) -> Tensor:
+    """
+    Matrix elements of a plaquette tensor between all the states of two irrep
+    configurations. `bra_tensors` and `ket_tensors` are the invariant tensors
+    of the four plaquette vertices, each stacked along its first axis (the subindex).
+    Returns a tensor with the subindices of the bra vertices and then of the ket
+    vertices as axes. Leading axes of all the arguments are treated as batch axes
+    """
+    vertex_matrices = [
+        np.einsum(subscripts, np.conj(bra), ket)
+        for subscripts, bra, ket in zip(_VERTEX_SUBSCRIPTS, bra_tensors, ket_tensors)
+    ]
+    key = (plaq_tensor.shape,) + tuple(M.shape for M in vertex_matrices)
+    if key not in _block_paths:
+        _block_paths[key] = np.einsum_path(
+            _BLOCK_SUBSCRIPTS, plaq_tensor, *vertex_matrices, optimize='optimal'
+        )[0]
+    return np.einsum(_BLOCK_SUBSCRIPTS, plaq_tensor, *vertex_matrices, optimize=_block_paths[key])
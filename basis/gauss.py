@@ -4,9 +4,9 @@ Gauss operators in the irrep basis
 import numpy as np
 from functools import reduce
 
-from group import Group_elem
+from group import Group_elem, Group, Irreps
 from utils.utils import sanitize
-from utils.mytyping import IrrepFn
+from utils.mytyping import IrrepFn, IrrepConf
 
 def left_irrep(g: Group_elem, irrep):
     return np.conj(irrep(g))
@@ -29,3 +29,19 @@ def gauss_operator(
                        for action, irrep in zip(actions, irrep_seq)
                 ])
     return sanitize(gauss) if sanitized else gauss
+
+
+def vertex_gauss_operator(
+        group: Group,
+        irreps: Irreps,
+        g: int,
+        conf: IrrepConf,
+        sanitized=False
+    ) -> np.ndarray:
+    """
+    Same as `gauss_operator`, but for the element label `g` and the irrep
+    configuration `conf`, reading the matrices from the irreps tables
+    """
+    mats = [irreps.matrix(group, j, g) for j in conf]
+    gauss = reduce(np.kron, [np.conj(mats[0]), np.conj(mats[1]), mats[2], mats[3]])
+    return sanitize(gauss) if sanitized else gauss
@@ -2,11 +2,12 @@
 Find the invariant states of a single vertex
 """
 import numpy as np
+from functools import cache
 
 from group import Group, Irreps
-from basis.gauss import gauss_operator
+from basis.gauss import vertex_gauss_operator
 from utils.mytyping import IrrepConf, IrrepFn, Vector
-from utils.linalg import projector, null_space_system
+from utils.linalg import projector, null_space_system, range_basis
 from utils.utils import  sanitize, multiindex
 
 
@@ -41,6 +42,40 @@ def to_state_dict(
     return state_dict
 
 
+@cache
+def invariant_dims(group: Group, irreps: Irreps) -> np.ndarray:
+    r"""
+    Dimension of the invariant subspace of every vertex configuration,
+    as an array indexed by the four irreps of the links. From the characters
+    $$
+        \frac{1}{|G|} \sum_g \chi^{j_1}(g)^* \chi^{j_2}(g)^* \chi^{j_3}(g) \chi^{j_4}(g)
+    $$
+    """
+    chars = irreps.char_table(group)
+    dims = np.einsum(
+        'ag,bg,cg,dg->abcd',
+        np.conj(chars), np.conj(chars), chars, chars
+    ) / len(group)
+    return np.rint(np.real(dims)).astype(int)
+
+
+def invariant_projector(group: Group, irreps: Irreps, conf: IrrepConf) -> np.ndarray:
+    """
+    Projector onto the invariant subspace of the vertex configuration `conf`,
+    i.e. the group average of the Gauss operators
+    """
+    mats = [
+        irreps.matrices(group)[j, :, :irreps.dim(j), :irreps.dim(j)]
+        for j in conf
+    ]
+    size = int(np.prod(size_conf(conf, irreps)))
+    gauss = np.einsum(
+        'gab,gcd,gef,ghi->acehbdfi',
+        np.conj(mats[0]), np.conj(mats[1]), mats[2], mats[3]
+    )
+    return gauss.reshape(size, size) / len(group)
+
+
 # TODO: transformation to a state_dict should be separate
 #       from the calculation of the invariant_space
 def invariant_states(
@@ -48,12 +83,28 @@ def invariant_states(
         irreps: Irreps,
         conf: tuple[int],
         sanitized=True,
-        state_dict=True
+        state_dict=True,
+        method='nullspace'
     ):
-    gauss_null_space = null_space_system([
-                projector(gauss_operator(g, irrep_conf(conf, irreps)))
-                for g in group.generators
-            ])
+    """
+    Find an orthonormal basis of the invariant states of a vertex, either
+    as the common null space of `G(g) - 1` for the generators (`method='nullspace'`)
+    or as the range of the group-averaged projector (`method='projector'`).
+    The latter gets the dimension from the characters first, and skips
+    the configurations without invariant states
+    """
+    if method == 'nullspace':
+        gauss_null_space = null_space_system([
+                    projector(vertex_gauss_operator(group, irreps, g, conf))
+                    for g in group.indices(group.generators)
+                ])
+    elif method == 'projector':
+        dim = invariant_dims(group, irreps)[conf]
+        if not dim:
+            return []
+        gauss_null_space = range_basis(invariant_projector(group, irreps, conf), dim)
+    else:
+        raise ValueError(f"Unknown method '{method}'")
     f = lambda x: sanitize(x) if sanitized else x
     g = lambda x: to_state_dict(x, conf, irreps) if state_dict else x
     return [g(f(state)) for state in gauss_null_space.T]
@@ -0,0 +1,309 @@
+"""
+Decompose the physical Hilbert space in sectors of lattice momentum and
+parity, with the lattice translations and reflections acting on the states
+"""
+
+import logging as log
+import multiprocessing as mp
+import numpy as np
+import scipy.sparse as sparse
+from itertools import product
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh
+from tqdm import tqdm
+
+from basis.basis import Basis
+from utils.lattice import translation_group, reflection
+from utils.linalg import COOBuffer
+
+
+SectorLabel = tuple[tuple[int, int], int | None]
+
+
+def state_permutation(basis: Basis, vertex_perm: list[int], link_perm: list[int]) -> np.ndarray:
+    """
+    Index of the image of every state under the lattice translation that sends
+    the vertex `v` to `vertex_perm[v]` and the link `l` to `link_perm[l]`.
+    The vertices keep their legs, so their subindices move unchanged
+    """
+    states = basis.state_array
+    translated = np.empty_like(states)
+    translated[:, np.asarray(link_perm)] = states[:, :basis.nlinks]
+    translated[:, basis.nlinks + np.asarray(vertex_perm)] = states[:, basis.nlinks:]
+    perm = basis.indices_of(translated)
+    if np.any(perm < 0):
+        raise ValueError("The basis is not invariant under the translation")
+    return perm
+
+
+def _reflected_tensors(
+        basis: Basis,
+        leg_perm: tuple[int, ...]
+    ) -> dict[int, tuple[int, np.ndarray]]:
+    """
+    For every vertex configuration (by id), the id of its reflected one and
+    the orthogonal matrix expressing the reflected invariant tensors, i.e.
+    with the legs permuted by `leg_perm`, in the basis of the latter
+    """
+    axes = (0,) + tuple(1 + np.argsort(leg_perm))
+    result = dict()
+    for conf, conf_id in basis.vertex_conf_ids.items():
+        image = [None] * 4
+        for leg, j in enumerate(conf):
+            image[leg_perm[leg]] = j
+        image_id = basis.vertex_conf_ids.get(tuple(image))
+        if image_id is None:
+            raise ValueError(f"The vertex configuration {conf} has no reflected one")
+        tensors = basis.vertex_stores[conf_id].transpose(axes)
+        image_tensors = basis.vertex_stores[image_id]
+        overlaps = np.conj(image_tensors.reshape(len(image_tensors), -1)) \
+            @ tensors.reshape(len(tensors), -1).T
+        if overlaps.shape[0] != overlaps.shape[1] or \
+                not np.allclose(overlaps.conj().T @ overlaps, np.eye(len(overlaps))):
+            raise ValueError(f"The invariant tensors of {conf} are not mapped into each other")
+        result[conf_id] = (image_id, overlaps)
+    return result
+
+
+def reflection_operator(
+        basis: Basis,
+        vertex_perm: list[int],
+        link_perm: list[int],
+        leg_perm: tuple[int, ...],
+        tol: float = 1e-12
+    ) -> sparse.csr_array:
+    """
+    Operator of the lattice reflection given by `utils.lattice.reflection`.
+    The links move as the states are permuted, and the invariant tensors of
+    the vertices transform by the permutation of their legs, mixing the
+    subindices of each vertex. Needs real irreps, whose conjugate (on the
+    reversed links) is the irrep itself
+    """
+    matrices = basis.irreps.matrices(basis.group)
+    if np.iscomplexobj(matrices) and np.abs(matrices.imag).max() > tol:
+        raise ValueError("Reflections are only implemented for real irreps")
+    nvertices = len(basis.vertices)
+    tensor_maps = _reflected_tensors(basis, leg_perm)
+    n_states = len(basis)
+    coo = COOBuffer((n_states, n_states), dtype=np.float64)
+    link_perm = np.asarray(link_perm)
+    for conf, (start, stop) in basis.conf_ranges.items():
+        image_conf = [None] * basis.nlinks
+        for link, j in enumerate(conf):
+            image_conf[link_perm[link]] = j
+        image_start, image_stop = basis.conf_ranges[tuple(image_conf)]
+        # the vertex v goes to vertex_perm[v], mixing the subindices with its overlaps
+        operands = []
+        for v in range(nvertices):
+            operands += [np.real(tensor_maps[basis.vertex_conf_index[start, v]][1]),
+                         [nvertices + vertex_perm[v], v]]
+        block = np.einsum(*operands, list(range(nvertices, 2 * nvertices)) + list(range(nvertices)))
+        block = block.reshape(image_stop - image_start, stop - start)
+        rows, cols = np.nonzero(np.abs(block) > tol)
+        coo.extend(image_start + rows, start + cols, block[rows, cols])
+    return coo.tocsr()
+
+
+def _parity_split(M: sparse.csr_array, tol: float = 1e-8) -> dict[int, sparse.csc_array]:
+    """
+    Eigenvectors of the involution `M` with eigenvalue +1 and -1, as columns of
+    sparse isometries. `M` is split into its connected blocks, which are
+    diagonalized in stacks of blocks of the same size
+    """
+    n = M.shape[0]
+    n_blocks, labels = connected_components(M != 0, directed=False)
+    order = np.argsort(labels, kind='stable')
+    sizes = np.bincount(labels, minlength=n_blocks)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    position = np.empty(n, dtype=np.int64)
+    position[order] = np.arange(n) - np.repeat(starts, sizes)
+
+    M = M.tocoo()
+    columns = {1: [], -1: []}
+    for size in np.unique(sizes):
+        blocks_of_size = np.flatnonzero(sizes == size)
+        slot = np.full(n_blocks, -1)
+        slot[blocks_of_size] = np.arange(len(blocks_of_size))
+        # states of each block, and the dense blocks gathered from the entries
+        members = order[starts[blocks_of_size][:, None] + np.arange(size)]
+        stack = np.zeros((len(blocks_of_size), size, size), dtype=M.dtype)
+        entries = slot[labels[M.row]] >= 0
+        stack[slot[labels[M.row[entries]]], position[M.row[entries]], position[M.col[entries]]] = M.data[entries]
+        evals, evecs = np.linalg.eigh(stack)
+        for parity in (1, -1):
+            blk, vec = np.nonzero(np.abs(evals - parity) < tol)
+            if np.any(np.abs(np.abs(evals) - 1) > tol):
+                raise ValueError("The reflection is not an involution on the sector")
+            columns[parity].append((members[blk], evecs[blk, :, vec]))
+
+    result = dict()
+    for parity, parts in columns.items():
+        n_cols = 0
+        coo = COOBuffer((n, sum(len(rows) for rows, _ in parts)), dtype=M.dtype)
+        for rows, vecs in parts:
+            cols = n_cols + np.repeat(np.arange(len(rows)), rows.shape[1])
+            coo.extend(rows.ravel(), cols, vecs.ravel())
+            n_cols += len(rows)
+        result[parity] = coo.tocsc()
+    return result
+
+
+class SymmetrySectors:
+    """
+    Sectors of the Hilbert space of `basis` with definite lattice momentum and,
+    for the momenta mapped into themselves by the reflection of `axis`, definite
+    parity under it. Each sector is given by a sparse isometry, whose columns
+    are the symmetry-adapted states in terms of the states of `basis`.
+
+    Sectors are labelled by `((m_x, m_y), parity)`, for the momentum
+    `2π (m_x / L_x, m_y / L_y)` and the parity +1, -1 or None
+    """
+    def __init__(self, basis: Basis, parity: bool = True, axis: int = 0):
+        self.basis = basis
+        translations = translation_group(basis.vertices)
+        self.shifts = np.array(list(translations))
+        self.periods = tuple(self.shifts.max(axis=0) + 1)
+        self.perms = np.stack([state_permutation(basis, *perms) for perms in translations.values()])
+        # orbit representatives, the states with the smallest index in their orbit
+        self.representatives = np.flatnonzero(self.perms.min(axis=0) == np.arange(len(basis)))
+
+        self.axis = axis
+        self.reflection = None
+        if parity:
+            refl = reflection(basis.vertices, axis)
+            if refl is None:
+                log.warning(f"The lattice is not symmetric under the reflection of axis {axis}")
+            else:
+                self.reflection = reflection_operator(basis, *refl)
+
+        self.sectors = dict()
+        for momentum in product(*(range(L) for L in self.periods)):
+            P = self.momentum_basis(momentum)
+            if P.shape[1] == 0:
+                continue
+            if self.reflection is not None and self.reflected(momentum) == momentum:
+                M = (P.conj().T @ self.reflection @ P).tocsr()
+                for p, U in _parity_split(M).items():
+                    if U.shape[1]:
+                        self.sectors[(momentum, p)] = (P @ U).tocsc()
+            else:
+                self.sectors[(momentum, None)] = P
+
+    def reflected(self, momentum: tuple[int, int]) -> tuple[int, int]:
+        """Momentum of the reflection of a state of momentum `momentum`"""
+        reflected = list(momentum)
+        reflected[self.axis] = (-momentum[self.axis]) % self.periods[self.axis]
+        return tuple(reflected)
+
+    def phases(self, momentum: tuple[int, int]) -> np.ndarray:
+        """Characters of the translations in the given momentum"""
+        phases = np.exp(2j * np.pi * (self.shifts / self.periods) @ np.asarray(momentum))
+        return np.real(phases) if np.allclose(phases.imag, 0) else phases
+
+    def momentum_basis(self, momentum: tuple[int, int]) -> sparse.csc_array:
+        """
+        Isometry onto the states of given momentum, the normalized projections
+        of the orbit representatives (the ones with a non-zero projection)
+        """
+        phases = self.phases(momentum)
+        n_reps = len(self.representatives)
+        rows = self.perms[:, self.representatives]
+        cols = np.broadcast_to(np.arange(n_reps), rows.shape)
+        data = np.broadcast_to(np.conj(phases)[:, None], rows.shape)
+        P = sparse.csc_array(
+            (data.ravel(), (rows.ravel(), cols.ravel())), shape=(len(self.basis), n_reps)
+        )
+        norms = np.sqrt(np.asarray(abs(P).power(2).sum(axis=0))).ravel()
+        keep = norms > 1e-8
+        return (P[:, keep] @ sparse.diags_array(1 / norms[keep])).tocsc()
+
+    def __len__(self):
+        return len(self.sectors)
+
+    def __iter__(self):
+        return iter(self.sectors)
+
+    def dims(self) -> dict[SectorLabel, int]:
+        """Dimension of every sector"""
+        return {label: B.shape[1] for label, B in self.sectors.items()}
+
+    def project(self, H, label: SectorLabel) -> sparse.csr_array:
+        """Block of the sparse (or diagonal, as a 1-D array) operator `H` in a sector"""
+        B = self.sectors[label]
+        if isinstance(H, np.ndarray) and H.ndim == 1:
+            H = sparse.diags_array(H)
+        return (B.conj().T @ (H @ B)).tocsr()
+
+
+def sector_hamiltonians(
+        sectors: SymmetrySectors,
+        elec_hamil,
+        magn_hamil
+    ) -> dict[SectorLabel, tuple[sparse.csr_array, sparse.csr_array]]:
+    """Blocks of H_E and H_B in every sector"""
+    return {
+        label: (sectors.project(elec_hamil, label), sectors.project(magn_hamil, label))
+        for label in sectors
+    }
+
+
+def _sector_eigvals(H: sparse.csr_array, n_eigs: int, dense_dim: int) -> np.ndarray:
+    """Lowest `n_eigs` eigenvalues of a sector Hamiltonian"""
+    if H.shape[0] <= max(dense_dim, n_eigs + 1):
+        return np.linalg.eigvalsh(H.toarray())[:n_eigs]
+    return np.sort(eigsh(H, k=n_eigs, which='SA', return_eigenvectors=False))
+
+
+_shared_blocks = None
+
+def _shared_sector_eigvals(args):
+    """Worker: eigenvalues of one sector, reading the blocks from the parent"""
+    label, coupling, n_eigs, dense_dim = args
+    HE, HB = _shared_blocks[label]
+    return label, _sector_eigvals((1 - coupling) * HE - coupling * HB, n_eigs, dense_dim)
+
+
+def diagonalize_sectors(
+        blocks: dict[SectorLabel, tuple[sparse.csr_array, sparse.csr_array]],
+        coupling: float,
+        n_eigs: int,
+        dense_dim: int = 2000,
+        pool_size: int = 1,
+        progress_bar: bool = False
+    ) -> dict[SectorLabel, np.ndarray]:
+    """
+    Lowest `n_eigs` eigenvalues of (1-λ) H_E - λ H_B in every sector, from the
+    blocks of `sector_hamiltonians`. Sectors up to `dense_dim` states are
+    diagonalized densely. With `pool_size` > 1 the sectors are split between
+    forked processes, sharing the blocks copy-on-write
+    """
+    global _shared_blocks
+    tasks = [(label, coupling, n_eigs, dense_dim) for label in blocks]
+    if pool_size > 1 and 'fork' not in mp.get_all_start_methods():
+        log.warning('fork is not available, diagonalizing the sectors serially')
+        pool_size = 1
+
+    _shared_blocks = blocks
+    try:
+        if pool_size > 1:
+            with mp.get_context('fork').Pool(pool_size) as pool:
+                results = list(tqdm(
+                    pool.imap_unordered(_shared_sector_eigvals, tasks),
+                    total=len(tasks), disable=not progress_bar
+                ))
+        else:
+            results = [_shared_sector_eigvals(task) for task in tqdm(tasks, disable=not progress_bar)]
+    finally:
+        _shared_blocks = None
+    return dict(results)
+
+
+def merge_spectra(
+        spectra: dict[SectorLabel, np.ndarray],
+        n_eigs: int
+    ) -> tuple[np.ndarray, list[SectorLabel]]:
+    """Lowest `n_eigs` eigenvalues over all the sectors, with their sector labels"""
+    energies = np.concatenate(list(spectra.values()))
+    labels = [label for label, evals in spectra.items() for _ in evals]
+    order = np.argsort(energies, kind='stable')[:n_eigs]
+    return energies[order], [labels[k] for k in order]
@@ -0,0 +1,221 @@
+"""
+Cached versions of the expensive computations: plaquette tables, vertex
+bases, physical bases and Hamiltonians, stored in an `ArtifactCache`
+"""
+
+import logging as log
+
+import numpy as np
+
+from group import Group, Irreps
+from basis.basis import Basis, vertex_basis
+from hamiltonian.plaquette import PlaquetteMels, wl_blocks
+from hamiltonian.magnetic import plaquette_hamiltonian
+from hamiltonian.shards import ShardedMagneticBuild
+from utils.cache import ArtifactCache, group_key, irreps_key, lattice_key, hash_bytes
+from utils.mytyping import VertexLinks, PlaqVertices
+
+# modules each artifact is computed with, only editing them invalidates it
+# (the group and the irreps are described by their tables, not by their code)
+WL_BLOCKS_MODULES = ('hamiltonian.plaquette', 'utils.utils')
+VERTEX_BASIS_MODULES = ('basis.basis', 'basis.invariant', 'basis.gauss', 'utils.linalg', 'utils.utils')
+BASIS_MODULES = ('basis.basis',)
+PLAQUETTE_HAMILTONIAN_MODULES = (
+    'hamiltonian.magnetic', 'hamiltonian.plaquette', 'basis.contractions', 'basis.symmetry',
+    'utils.lattice', 'utils.linalg'
+) + BASIS_MODULES
+
+
+def plaq_mels_key(plaq_mels: PlaquetteMels) -> dict:
+    """Description of the single-plaquette matrix elements, from their content"""
+    return {
+        'plaq_mels': hash_bytes(*(
+            np.ascontiguousarray(getattr(plaq_mels, name)).tobytes()
+            for name in PlaquetteMels._files
+        ))
+    }
+
+
+def cached_wl_blocks(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int,
+        method: str = 'sum',
+        cache: ArtifactCache | None = None
+    ) -> dict:
+    """Cached version of `wl_blocks`"""
+    cache = cache or ArtifactCache()
+    return cache.get_or_compute(
+        'wl_blocks',
+        lambda: wl_blocks(group, irreps, magn_irrep, method=method),
+        WL_BLOCKS_MODULES,
+        **group_key(group), **irreps_key(group, irreps),
+        magn_irrep=magn_irrep, method=method
+    )
+
+
+def cached_plaquette_mels(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int,
+        cache: ArtifactCache | None = None
+    ) -> PlaquetteMels:
+    """Single-plaquette matrix elements, computed only on a cache miss"""
+    blocks = cached_wl_blocks(group, irreps, magn_irrep, cache=cache)
+    return PlaquetteMels(irreps=irreps, from_blocks=blocks)
+
+
+def cached_vertex_basis(
+        group: Group,
+        irreps: Irreps,
+        method: str = 'nullspace',
+        cache: ArtifactCache | None = None
+    ) -> dict:
+    """Cached version of `vertex_basis`"""
+    cache = cache or ArtifactCache()
+    return cache.get_or_compute(
+        'vertex_basis',
+        lambda: vertex_basis(group, irreps, method=method),
+        VERTEX_BASIS_MODULES,
+        **group_key(group), **irreps_key(group, irreps),
+        method=method
+    )
+
+
+def cached_basis(
+        group: Group,
+        irreps: Irreps,
+        vertices: list[VertexLinks],
+        nlinks: int,
+        method: str = 'nullspace',
+        cache: ArtifactCache | None = None
+    ) -> Basis:
+    """
+    Physical basis, with the irrep configurations computed only on a cache miss.
+    `method` is the one used for the vertex basis (see `vertex_basis`)
+    """
+    cache = cache or ArtifactCache()
+    vbasis = cached_vertex_basis(group, irreps, method=method, cache=cache)
+    confs = cache.get_or_compute(
+        'basis',
+        lambda: Basis(group, irreps, vertices, nlinks, vbasis=vbasis)._basis,
+        BASIS_MODULES,
+        **group_key(group), **irreps_key(group, irreps),
+        **lattice_key(vertices, nlinks), method=method
+    )
+    return Basis(group, irreps, vertices, nlinks, basis_dict=confs)
+
+
+def cached_plaquette_hamiltonian(
+        basis: Basis,
+        plaqs_vertices: list[PlaqVertices],
+        plaq_index: int,
+        plaq_mels: PlaquetteMels,
+        cache: ArtifactCache | None = None,
+        reference: int = 0,
+        pool_size: int | None = None,
+        format: str = 'csr',
+        **kwargs
+    ):
+    """
+    Cached magnetic Hamiltonian of the single plaquette `plaq_index`, as a
+    `format` sparse matrix (the cache always holds the CSR one), computed with
+    `plaquette_hamiltonian` (keyword arguments are passed to it). If it is a
+    translation of the `reference` plaquette it is obtained from the (cached)
+    Hamiltonian of the latter
+    """
+    cache = cache or ArtifactCache()
+    p_vertices = plaqs_vertices[plaq_index]
+    reference_hamiltonian = lambda: cached_plaquette_hamiltonian(
+        basis, plaqs_vertices, reference, plaq_mels, cache=cache,
+        reference=reference, pool_size=pool_size, **kwargs
+    )
+    compute = lambda: plaquette_hamiltonian(
+        basis, plaqs_vertices, plaq_index, plaq_mels, reference,
+        reference_hamiltonian=reference_hamiltonian, pool_size=pool_size, **kwargs
+    )
+    return cache.get_or_compute(
+        'plaquette_hamiltonian',
+        compute,
+        PLAQUETTE_HAMILTONIAN_MODULES,
+        **plaquette_hamiltonian_key(basis, p_vertices, plaq_mels)
+    ).asformat(format)
+
+
+def plaquette_hamiltonian_key(
+        basis: Basis,
+        p_vertices: PlaqVertices,
+        plaq_mels: PlaquetteMels
+    ) -> dict:
+    """Description of the magnetic Hamiltonian of a single plaquette"""
+    return {
+        **group_key(basis.group), **irreps_key(basis.group, basis.irreps),
+        **lattice_key(basis.vertices, basis.nlinks, [p_vertices]),
+        **plaq_mels_key(plaq_mels)
+    }
+
+
+def sharded_plaquette_hamiltonian(
+        basis: Basis,
+        plaqs_vertices: list[PlaqVertices],
+        plaq_mels: PlaquetteMels,
+        workdir: str,
+        cache: ArtifactCache | None = None,
+        reference: int = 0,
+        n_shards: int | None = None,
+        row_range: tuple[int, int] | None = None,
+        pool_size: int = 1,
+        progress_bar = False
+    ):
+    """
+    Build the Hamiltonian of the `reference` plaquette in shards saved to
+    `workdir` (see `ShardedMagneticBuild`), resuming from the shards already
+    there and computing only those in `row_range` if given.
+    Once all the shards are done they are merged and the result is stored
+    in the cache, where `cached_magnetic_hamiltonian` picks it up.
+    The shards are tied to the description of the Hamiltonian but not to the
+    source code, so that a build can be resumed after editing the code
+    (remove `workdir` to start over after a change of the results).
+    Returns the Hamiltonian, or None while shards are missing
+    """
+    cache = cache or ArtifactCache()
+    p_vertices = plaqs_vertices[reference]
+    description = plaquette_hamiltonian_key(basis, p_vertices, plaq_mels)
+    key = cache.key('plaquette_hamiltonian', PLAQUETTE_HAMILTONIAN_MODULES, **description)
+    if key in cache:
+        log.info(f'Cache hit for plaquette_hamiltonian ({key[:12]})')
+        return cache.get(key)
+    build = ShardedMagneticBuild(
+        workdir, basis, [p_vertices], plaq_mels,
+        key=cache.key('plaquette_hamiltonian', **description), n_shards=n_shards
+    )
+    build.build(row_range, pool_size=pool_size, progress_bar=progress_bar)
+    if not build.complete():
+        log.info(f'{len(build.pending())} shards of {len(build)} still missing in {workdir}')
+        return None
+    H = build.merge()
+    cache.put(key, H)
+    return H
+
+
+def cached_magnetic_hamiltonian(
+        basis: Basis,
+        plaqs_vertices: list[PlaqVertices],
+        plaq_mels: PlaquetteMels,
+        cache: ArtifactCache | None = None,
+        pool_size: int | None = None,
+        format: str = 'csr',
+        **kwargs
+    ):
+    """
+    Magnetic Hamiltonian, as a `format` sparse matrix, as the sum of the cached
+    Hamiltonians of the single plaquettes (see `cached_plaquette_hamiltonian`,
+    keyword arguments are passed to it)
+    """
+    cache = cache or ArtifactCache()
+    return sum(
+        cached_plaquette_hamiltonian(
+            basis, plaqs_vertices, plaq_index, plaq_mels, cache=cache, pool_size=pool_size, **kwargs
+        )
+        for plaq_index in range(len(plaqs_vertices))
+    ).asformat(format)
@@ -1,24 +1,50 @@
+import argparse
+import os
+
 from group import DihGroup, DihIrreps
-from basis.basis import Basis
-from hamiltonian.plaquette import PlaquetteMels
-from hamiltonian.magnetic import magnetic_hamiltonian
+from utils.cache import ArtifactCache
+from cache import cached_basis, cached_plaquette_mels, cached_magnetic_hamiltonian, \
+                  sharded_plaquette_hamiltonian
 from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
-import pickle
+
+parser = argparse.ArgumentParser(
+    description='Build the magnetic Hamiltonian in shards saved to a work directory. '
+                'Rerunning resumes from the completed shards; with --rows several machines '
+                'sharing the work directory can build disjoint row ranges. '
+                'Once all the shards are done they are merged into the cache.'
+)
+parser.add_argument('--workdir', default='magnetic_shards', help='directory of the shards')
+parser.add_argument('--shards', type=int,
+                    help='number of shards (default 256), fixed when the work directory is created')
+parser.add_argument('--rows', type=int, nargs=2, metavar=('START', 'STOP'),
+                    help='build only the shards starting in this range of rows')
+parser.add_argument('--pool-size', type=int, default=os.cpu_count(), help='number of processes')
+args = parser.parse_args()
 
 group = DihGroup(4)
 irreps = DihIrreps(group.N)
-filename = 'magn_hamilt_D4.pkl'
+magn_irrep = 4
+cache = ArtifactCache()
 
 print("> Computing physical Hilbert space")
-basis = Basis(group, irreps, vertices, nlinks)
+basis = cached_basis(group, irreps, vertices, nlinks, cache=cache)
 print(f"\ttotal number of states: {len(basis.states)}\n")
 
 print('> Loading single plaquette matrix elements')
-plaq_mels = PlaquetteMels(irreps=irreps, from_file="pickled/plaquette_data_D4.pkl")
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep, cache=cache)
 print('> Plaquette loaded')
 print(f'\t#rows: {len(plaq_mels)}\n')
 
-H_B = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
-
-with open(filename, 'wb') as file:
-    pickle.dump(H_B, file)
+print(f'> Building the reference plaquette in {args.workdir}')
+H_ref = sharded_plaquette_hamiltonian(
+    basis, plaqs_vertices, plaq_mels, args.workdir, cache=cache, n_shards=args.shards,
+    row_range=args.rows, pool_size=args.pool_size, progress_bar=True
+)
+if H_ref is None:
+    print('\tshards still missing, rerun when the other row ranges are done')
+else:
+    # the other plaquettes are translations of the reference one
+    H_B = cached_magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels, cache=cache,
+                                      pool_size=args.pool_size, progress_bar=True)
+    print(f'> Magnetic Hamiltonian stored in the cache at {cache.root}')
+    print(f'\t{repr(H_B)}')
@@ -27,11 +27,28 @@ class Group_elem():
 
 
 class Group():
-    __slots__ = "name", "elements"
+    __slots__ = "name", "elements", "_indices", "mul_table", "inv_table", "id_index"
 
     def __init__(self):
-        self.name = "(undefined)"
-        self.elements = []
+        """
+        Number the elements of the group and precompute the Cayley table.
+        Concrete groups call it after having defined `elements`
+        """
+        if not hasattr(self, "elements"):
+            raise RuntimeError("Group elements are not defined")
+        self._make_tables()
+
+    def _make_tables(self):
+        self._indices = {g: k for k, g in enumerate(self.elements)}
+        self.mul_table = np.array(
+            [[self._indices[g*h] for h in self.elements] for g in self.elements],
+            dtype=np.intp
+        )
+        self.inv_table = np.array(
+            [self._indices[~g] for g in self.elements],
+            dtype=np.intp
+        )
+        self.id_index = self._indices[self.id]
 
     def __repr__(self):
         return f"<{self.name} group>"
@@ -59,14 +76,30 @@ class Group():
         """List of generators of the group"""
         pass
 
-    def mul_table(self):
-        """Returns the multiplication table of the group"""
-        return [[g*h for h in self.elements] for g in self.elements]
+    def index(self, g):
+        """Return the integer label of the element `g`, in 0..|G|-1"""
+        return self._indices[g]
+
+    def indices(self, g_elems):
+        """Return the integer labels of a sequence of elements as an array"""
+        return np.array([self._indices[g] for g in g_elems], dtype=np.intp)
+
+    def mul(self, a, b):
+        """
+        Multiply element labels (ints or arrays of ints, broadcasted)
+        using the Cayley table
+        """
+        return self.mul_table[a, b]
+
+    def inv(self, a):
+        """Invert element labels (ints or arrays of ints)"""
+        return self.inv_table[a]
 
     def conj_class(self, g):
         """Return the conjugacy class of the element `g`"""
-        cclass = list({(~h) * g * h for h in self.elements})
-        return cclass
+        h = np.arange(len(self.elements))
+        cclass = np.unique(self.mul(self.mul(self.inv(h), self.index(g)), h))
+        return [self.elements[k] for k in cclass]
 
     def conj_classes(self):
         """Return a list of all the conjugacy classes of the group"""
@@ -169,6 +202,72 @@ class Irreps():
                 mat_elems.update({f"{j}": r })
         return mat_elems
 
+    @cache
+    def matrices(self, group: Group) -> np.ndarray:
+        """
+        All the representation matrices of `group` as a single array of shape
+        `(n_irreps, |G|, dmax, dmax)`, indexed by irrep and element label.
+        Lower-dimensional irreps are padded with zeros (the 1d irreps are
+        stored in `[j, g, 0, 0]`). The array is real if all the irreps are real
+        """
+        dmax = max(self.dim(j) for j in range(len(self.irreps)))
+        mats = np.zeros((len(self.irreps), len(group), dmax, dmax), dtype=complex)
+        for j, irr in enumerate(self.irreps):
+            d = self.dim(j)
+            for k, g in enumerate(group):
+                mats[j, k, :d, :d] = irr(g)
+        if not np.any(mats.imag):
+            mats = np.ascontiguousarray(mats.real)
+        mats.flags.writeable = False
+        return mats
+
+    @cache
+    def char_table(self, group: Group) -> np.ndarray:
+        """Characters of all the irreps, as an array of shape `(n_irreps, |G|)`"""
+        chars = np.trace(self.matrices(group), axis1=2, axis2=3)
+        chars.flags.writeable = False
+        return chars
+
+    @cache
+    def clebsch_gordan(self, group: Group, j1: int, j2: int) -> dict[int, np.ndarray]:
+        r"""
+        Clebsch-Gordan coefficients for the decomposition of `j1` x `j2`.
+        Returns a dict `{j3: C}` with the irreps `j3` contained in the product,
+        where `C` has shape `(multiplicity, dim(j1), dim(j2), dim(j3))` and
+        $$
+            \sum_{m' n'} \pi^{j_1}_{m m'}(g) \pi^{j_2}_{n n'}(g) C^\alpha_{m' n' p}
+            = \sum_{p'} C^\alpha_{m n p'} \pi^{j_3}_{p' p}(g)
+        $$
+        The coefficients are computed with the projectors onto the
+        first row of each irrep, and are orthonormal for unitary irreps
+        """
+        mats = self.matrices(group)
+        d1, d2 = self.dim(j1), self.dim(j2)
+        prod_mats = np.einsum(
+            'gab,gmn->gambn',
+            mats[j1, :, :d1, :d1],
+            mats[j2, :, :d2, :d2]
+        ).reshape(len(group), d1*d2, d1*d2)
+        cg = dict()
+        for j3 in range(len(self.irreps)):
+            d3 = self.dim(j3)
+            # P_{pq} = d3/|G| sum_g [pi^{j3}(g)]^*_{pq} (pi^{j1} x pi^{j2})(g)
+            proj = lambda p, q: d3 / len(group) * np.einsum(
+                'g,gab->ab', np.conj(mats[j3, :, p, q]), prod_mats
+            )
+            eigvals, eigvecs = np.linalg.eigh(proj(0, 0))
+            highest = eigvecs[:, eigvals > 0.5]
+            if highest.shape[1] == 0:
+                continue
+            C = np.stack([proj(p, 0) @ highest for p in range(d3)], axis=-1)
+            cg[j3] = C.transpose(1, 0, 2).reshape(-1, d1, d2, d3)
+        return cg
+
+    def matrix(self, group: Group, j: int, g: int) -> np.ndarray:
+        """Representation matrix of the `j`-th irrep for the element label `g`"""
+        d = self.dim(j)
+        return self.matrices(group)[j, g, :d, :d]
+
     def mel_indices(self):
         return [ (j, m, n)
             for j in range(len(self.irreps))
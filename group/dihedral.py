@@ -54,6 +54,7 @@ class DihGroup(Group):
         self.elements = [
             Dih_elem(N)(r, s) for s in [0, 1] for r in range(N)
         ]
+        super().__init__()
 
     def __len__(self):
         return 2*self.N
@@ -115,7 +116,7 @@ def _Dih_2d_irrep_complex(N, k):
         if g.s == 0:
             return np.array([[phase**(k*g.r), 0], [0, phase**(-k*g.r)]])
         else:
-            return np.array([[0, phase**(-k*g.r)], [phase**(k*g.r), 0]])
+            return np.array([[0, phase**(k*g.r)], [phase**(-k*g.r), 0]])
 
     return irrep
 
@@ -41,15 +41,20 @@ class Q8_elem(Group_elem):
         else:
             raise ValueError("Invalid input string \"{input}\"")
 
+    def __eq__(self, other):
+        return self.sign == other.sign and self.elem == other.elem
+
     def __mul__(self, other):
         # Group multiplication implemented with a lookup table because
         # I could not think of a better method
-        result_sign = self.sign * other._sign * Q8_sign_table[self.elem][other._elem]
-        result_elem = Q8_elem_table[self.elem][other._elem]
+        result_sign = self.sign * other.sign * Q8_sign_table[self.elem][other.elem]
+        result_elem = Q8_elem_table[self.elem][other.elem]
         return Q8_elem(f"{sign_str(result_sign)}{elem_str(result_elem)}")
 
     def __invert__(self):
-        return Q8_elem(f"{sign_str(-1*self.sign)}{self.elem}")
+        # +-1 are their own inverses, while i^-1 = -i (same for j and k)
+        sign = self.sign if self.elem == 0 else -1*self.sign
+        return Q8_elem(f"{sign_str(sign)}{elem_str(self.elem)}")
 
     def __hash__(self):
         return hash(('Q8', self.sign, self.elem))
@@ -69,6 +74,7 @@ class Q8(Group):
         self.elements = [
             Q8_elem(f"{sign}{elem}") for sign, elem in product("+-", "1ijk")
         ]
+        super().__init__()
 
     def __len__(self):
         return len(self.elements)
@@ -94,7 +100,8 @@ pauli = {
 }
 
 def _make_1d_irreps(elem: int):
-    return lambda g: -1 if g.elem == elem else 1
+    # the kernel is the subgroup {+-1, +-elem}
+    return lambda g: 1 if g.elem in (0, elem) else -1
 
 def _Q8_2d_irrep(g: Q8_elem):
     match g.elem:
@@ -109,9 +116,9 @@ class Q8_Irreps(Irreps):
     def __init__(self):
         self._1d_irreps = [
             lambda g: 1,
-            _make_1d_irreps(1), # -1 only on "+-i"
-            _make_1d_irreps(2), # -1 only on "+-j"
-            _make_1d_irreps(3)  # -1 only on "+-k"
+            _make_1d_irreps(1), # +1 only on "+-1" and "+-i"
+            _make_1d_irreps(2), # +1 only on "+-1" and "+-j"
+            _make_1d_irreps(3)  # +1 only on "+-1" and "+-k"
         ]
         self._2d_irreps = [ _Q8_2d_irrep ]
         super().__init__()
@@ -2,5 +2,5 @@
 Construct the Hamiltonian
 """
 from .plaquette import PlaquetteMels
-from .electric import elec_hamiltonian, elec_single_link_fn
-from .magnetic import magn_hamiltonian_mel, magnetic_hamiltonian
+from .electric import elec_hamiltonian, elec_hamiltonians, elec_diagonals, elec_single_link_fn
+from .magnetic import magn_hamiltonian_mel, magnetic_hamiltonian, MagneticOperator
@@ -2,36 +2,97 @@
 Compute the electric Hamiltonian
 """
 
+import numpy as np
 import scipy.sparse as sparse
 from collections.abc import Callable, Iterable
-from tqdm import tqdm
 
 from basis.basis import Basis
-from group import Group_elem, Irreps
+from group import Group_elem, Group, Irreps
 
 
 def elec_single_link_fn(
         generating_set: Iterable[Group_elem],
-        irreps: Irreps
+        irreps: Irreps,
+        group: Group | None = None
     ) -> Callable[[int], float]:
+    """
+    Electric energy of a single link in the irrep `j`. The characters are
+    read from the character table of `group` if given, otherwise they are
+    evaluated element by element
+    """
+    generating_set = list(generating_set)
+    if group is None:
+        char_sums = [sum(chi(g) for g in generating_set) for chi in irreps.chars]
+    else:
+        char_sums = np.real(irreps.char_table(group)[:, group.indices(generating_set)].sum(axis=1))
     def f(j):
         dim = irreps.dim(j)
-        char_sum = sum(irreps.chars[j](g) for g in generating_set)
-        return len(generating_set) - (char_sum / dim)
+        return len(generating_set) - (char_sums[j] / dim)
     return f
 
 
+def casimir_values(
+        generating_sets: Iterable[Iterable[Group_elem]],
+        irreps: Irreps,
+        group: Group
+    ) -> np.ndarray:
+    """
+    Single link electric energies, one row per generating set and one
+    column per irrep
+    """
+    char_table = np.real(irreps.char_table(group))
+    dims = np.array([irreps.dim(j) for j in range(len(irreps))])
+    values = []
+    for gen_set in generating_sets:
+        gen_set = list(gen_set)
+        char_sums = char_table[:, group.indices(gen_set)].sum(axis=1)
+        values.append(len(gen_set) - char_sums / dims)
+    return np.array(values)
+
+
+def elec_diagonals(
+        basis: Basis,
+        generating_sets: Iterable[Iterable[Group_elem]],
+        irreps: Irreps
+    ) -> np.ndarray:
+    """
+    Diagonals of the electric Hamiltonian for several generating sets,
+    as an array of shape (n_sets, n_states)
+    """
+    table = casimir_values(generating_sets, irreps, basis.group)
+    irreps_array = basis.irreps_array
+    diagonals = np.zeros((table.shape[0], irreps_array.shape[0]))
+    # gather link by link, avoids a (n_sets, n_states, n_links) temporary
+    for link_irreps in irreps_array.T:
+        diagonals += table[:, link_irreps]
+    return diagonals
+
+
+def elec_hamiltonians(
+        basis: Basis,
+        generating_sets: Iterable[Iterable[Group_elem]],
+        irreps: Irreps,
+        format: str = 'csr'
+    ) -> list[sparse.csr_matrix | sparse.csc_matrix]:
+    """
+    Electric Hamiltonians for several generating sets, each one as a
+    diagonal `format` sparse matrix
+    """
+    diagonals = elec_diagonals(basis, generating_sets, irreps)
+    return [sparse.diags(diagonal, format=format) for diagonal in diagonals]
+
+
 def elec_hamiltonian(
         basis: Basis,
-        generating_set: list[Group_elem],
+        generating_set: Iterable[Group_elem],
         irreps: Irreps,
-        progress_bar = False
-    ) -> list[float]:
-    f = elec_single_link_fn(generating_set, irreps)
-    n_states = len(basis.states)
-    H = sparse.dok_matrix((n_states, n_states))
-    iterator = tqdm(range(n_states)) if progress_bar else range(n_states)
-    for row in iterator:
-        state = basis.states[row]
-        H[row, row] = sum(f(j) for j in state[0])
-    return H
+        progress_bar = False,
+        format: str = 'csr'
+    ) -> sparse.csr_matrix | sparse.csc_matrix:
+    """
+    Electric Hamiltonian, diagonal in the irrep basis, as a `format`
+    ('csr' or 'csc') sparse matrix.
+    `progress_bar` does nothing: it is only kept for backward compatibility
+    of the callers, since there is no loop over the states anymore
+    """
+    return elec_hamiltonians(basis, [generating_set], irreps, format=format)[0]
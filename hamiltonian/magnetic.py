@@ -2,16 +2,24 @@
 Compute the magnetic Hamiltonian
 """
 
+import os
+import logging as log
+import multiprocessing as mp
 import numpy as np
 import scipy.sparse as sparse
+from functools import cache
+from scipy.sparse.linalg import LinearOperator
 
 from tqdm import tqdm
-from pathos.multiprocessing import ProcessingPool as Pool
 
-from basis.basis import Basis, State
-from basis.contractions import tensor_around_plaq, contract_magnetic_elem
+from basis.basis import Basis, State, vertex_conf
+from basis.symmetry import state_permutation
+from basis.contractions import tensor_around_plaq, contract_magnetic_elem, contract_magnetic_block
 from hamiltonian.plaquette import PlaquetteMels, get_plaq_links
+from utils.lattice import plaquette_translation
+from utils.linalg import COOBuffer
 from utils.mytyping import PlaqVertices
+from utils.utils import sanitize
 
 
 def magn_hamiltonian_mel(
@@ -33,20 +41,26 @@ def magn_hamiltonian_mel(
 
         bra_j_plq = tuple(bra.irreps[link] for link in p_links)
         ket_j_plq = tuple(ket.irreps[link] for link in p_links)
-        bra_j_out = tuple(bra.irreps[link] for link in non_p_links)
-        ket_j_out = tuple(ket.irreps[link] for link in non_p_links)
-
-        # one-plaquette Wilson loop
-        plaq_tensor = plaq_mels.tensor(bra_j_plq, ket_j_plq)
 
         # skip this plaquette if it has no nonzero matrix elements
-        if plaq_tensor is None:
+        if not plaq_mels.has_block(bra_j_plq, ket_j_plq):
             continue
 
+        bra_j_out = tuple(bra.irreps[link] for link in non_p_links)
+        ket_j_out = tuple(ket.irreps[link] for link in non_p_links)
+
         # skip the plaquette if the irreps outside the plaquettes are not the same
         if bra_j_out != ket_j_out:
             continue
 
+        # the vertices outside the plaquette must be in the same invariant state
+        if any(bra.subindex[v] != ket.subindex[v]
+               for v in range(len(basis.vertices)) if v not in p_vertices):
+            continue
+
+        # one-plaquette Wilson loop
+        plaq_tensor = plaq_mels.tensor(bra_j_plq, ket_j_plq)
+
         bra_tensor = tensor_around_plaq(basis, bra, p_vertices)
         ket_tensor = tensor_around_plaq(basis, ket, p_vertices)
         result += contract_magnetic_elem(plaq_tensor, bra_tensor, ket_tensor)
@@ -54,6 +68,50 @@ def magn_hamiltonian_mel(
     return result
 
 
+def plaq_selection(basis: Basis, p_vertices: PlaqVertices):
+    """
+    Precompute what is needed to apply the selection rules of a plaquette:
+    its links, the links and vertices outside of it, and the irrep
+    configurations grouped by the irreps outside the plaquette
+    """
+    p_links = get_plaq_links(basis.vertices, p_vertices)
+    non_p_links = [link for link in range(basis.nlinks) if link not in p_links]
+    non_p_vertices = [v for v in range(len(basis.vertices)) if v not in p_vertices]
+    confs_by_outside = dict()
+    for conf in basis.conf_ranges:
+        j_out = tuple(conf[link] for link in non_p_links)
+        confs_by_outside.setdefault(j_out, []).append(conf)
+    return p_links, non_p_links, non_p_vertices, confs_by_outside
+
+
+def nonzero_conf_pairs(basis: Basis, selection: list, plaq_mels: PlaquetteMels):
+    """
+    Generate the `(bra_conf, ket_conf, plaq_index)` triples of irrep
+    configurations connected by the plaquette `plaq_index`,
+    given the `plaq_selection` of every plaquette
+    """
+    for bra_conf in basis.conf_ranges:
+        for plaq_index, (p_links, non_p_links, _, confs_by_outside) in enumerate(selection):
+            bra_j_plq = tuple(bra_conf[link] for link in p_links)
+            bra_j_out = tuple(bra_conf[link] for link in non_p_links)
+            for ket_conf in confs_by_outside.get(bra_j_out, []):
+                ket_j_plq = tuple(ket_conf[link] for link in p_links)
+                if plaq_mels.has_block(bra_j_plq, ket_j_plq):
+                    yield bra_conf, ket_conf, plaq_index
+
+
+def plaq_state_indices(basis: Basis, conf, p_vertices: PlaqVertices) -> np.ndarray:
+    """
+    Indices of the states of the irrep configuration `conf`, as a matrix with
+    the subindices of the plaquette vertices along the rows (in the order of
+    `p_vertices`) and the subindices of the other vertices along the columns
+    """
+    start, stop = basis.conf_ranges[conf]
+    sizes = tuple(len(space) for space in basis._basis[conf])
+    rows = np.moveaxis(np.arange(start, stop).reshape(sizes), p_vertices, range(4))
+    return rows.reshape(np.prod(rows.shape[:4], dtype=int), -1)
+
+
 class MagneticWorker:
     def __init__(
             self,
@@ -64,6 +122,110 @@ class MagneticWorker:
         self.basis = basis
         self.plaqs_vertices = plaqs_vertices
         self.plaq_mels = plaq_mels
+        self._selection = [plaq_selection(basis, p) for p in plaqs_vertices]
+        self._confs = list(basis.conf_ranges)
+
+    def kets(self, row_index: int) -> np.ndarray:
+        """
+        Indices of the states that can have a nonzero matrix element
+        with the `row_index`-th state: for at least one plaquette they agree
+        with it outside the plaquette and their plaquette irreps
+        belong to a nonzero block of `plaq_mels`
+        """
+        basis = self.basis
+        bra = basis.state_array[row_index].tolist()
+        bra_conf, bra_sub = bra[:basis.nlinks], bra[basis.nlinks:]
+        subindices = basis.subindex_array
+
+        candidates = []
+        for p_links, non_p_links, non_p_vertices, confs_by_outside in self._selection:
+            bra_j_plq = tuple(bra_conf[link] for link in p_links)
+            bra_j_out = tuple(bra_conf[link] for link in non_p_links)
+            bra_sub_out = [bra_sub[v] for v in non_p_vertices]
+            for conf in confs_by_outside.get(bra_j_out, []):
+                ket_j_plq = tuple(conf[link] for link in p_links)
+                if not self.plaq_mels.has_block(bra_j_plq, ket_j_plq):
+                    continue
+                start, stop = basis.conf_ranges[conf]
+                same_out = np.all(
+                    subindices[start:stop, non_p_vertices] == bra_sub_out, axis=1
+                )
+                candidates.append(start + np.flatnonzero(same_out))
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(candidates))
+
+    def conf_pairs(self, bra_conf) -> list[tuple]:
+        """
+        `(ket_conf, plaq_index)` pairs connected to `bra_conf` by a plaquette,
+        restricted to the upper triangular part of the Hamiltonian
+        """
+        ranges = self.basis.conf_ranges
+        pairs = []
+        for plaq_index, (p_links, non_p_links, _, confs_by_outside) in enumerate(self._selection):
+            bra_j_plq = tuple(bra_conf[link] for link in p_links)
+            bra_j_out = tuple(bra_conf[link] for link in non_p_links)
+            for ket_conf in confs_by_outside.get(bra_j_out, []):
+                if ranges[ket_conf] < ranges[bra_conf]:
+                    continue
+                ket_j_plq = tuple(ket_conf[link] for link in p_links)
+                if self.plaq_mels.has_block(bra_j_plq, ket_j_plq):
+                    pairs.append((ket_conf, plaq_index))
+        return pairs
+
+    def conf_costs(self) -> np.ndarray:
+        """
+        Estimated cost of `conf_entries` for every irrep configuration
+        (in the order of `basis.conf_ranges`): number of blocks to contract
+        """
+        return np.array([len(self.conf_pairs(conf)) for conf in self.basis.conf_ranges])
+
+    def conf_entries(self, bra_conf) -> tuple[np.ndarray, ...]:
+        """
+        Upper triangular part of the rows of the states of `bra_conf`,
+        as `(rows, cols, values)` arrays. Each plaquette block is contracted
+        at once for all the states of the two configurations
+        """
+        rows, cols, values = [], [], []
+        for ket_conf, plaq_index in self.conf_pairs(bra_conf):
+            p_links = self._selection[plaq_index][0]
+            p_vertices = self.plaqs_vertices[plaq_index]
+            plaq_tensor = self.plaq_mels.tensor(
+                tuple(bra_conf[link] for link in p_links),
+                tuple(ket_conf[link] for link in p_links)
+            )
+            block = contract_magnetic_block(
+                plaq_tensor,
+                [self.basis.vertex_tensors(bra_conf, v) for v in p_vertices],
+                [self.basis.vertex_tensors(ket_conf, v) for v in p_vertices]
+            )
+            bra_rows = plaq_state_indices(self.basis, bra_conf, p_vertices)
+            ket_rows = plaq_state_indices(self.basis, ket_conf, p_vertices)
+            block = sanitize(block.reshape(len(bra_rows), len(ket_rows)))
+
+            # the states outside the plaquette are the same for bra and ket
+            shape = (len(bra_rows), len(ket_rows), bra_rows.shape[1])
+            block_rows = np.broadcast_to(bra_rows[:, None, :], shape)
+            block_cols = np.broadcast_to(ket_rows[None, :, :], shape)
+            block_values = np.broadcast_to(block[:, :, None], shape)
+            keep = (block_values != 0) & (block_cols >= block_rows)
+            rows.append(block_rows[keep])
+            cols.append(block_cols[keep])
+            values.append(block_values[keep])
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=magnetic_dtype(self.basis, self.plaq_mels))
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+    def confs_entries(self, start: int, stop: int) -> tuple[np.ndarray, ...]:
+        """
+        Entries of the irrep configurations in `range(start, stop)`
+        (in the order of `basis.conf_ranges`), as in `conf_entries`
+        """
+        coo = COOBuffer((len(self.basis),) * 2, dtype=magnetic_dtype(self.basis, self.plaq_mels))
+        for conf in self._confs[start:stop]:
+            coo.extend(*self.conf_entries(conf))
+        return coo.triplets()
 
     def full_row(self, bra: State):
         """
@@ -71,7 +233,8 @@ class MagneticWorker:
         Mainly used for testing
         """
         results = dict()
-        for ket in self.basis.states:
+        for ket_index in self.kets(self.basis.index_of(bra)):
+            ket = self.basis.states[ket_index]
             mel = magn_hamiltonian_mel(
                 basis = self.basis,
                 bra = bra,
@@ -91,58 +254,318 @@ class MagneticWorker:
         """
         bra = self.basis.states[row_index]
         # calculate only at the right of the diagonal
-        kets = self.basis.states[row_index:]
+        kets = self.kets(row_index)
+        kets = kets[kets >= row_index]
         results = dict()
-        for i, ket in enumerate(kets):
+        for ket_index in kets.tolist():
             mel = magn_hamiltonian_mel(
                 basis = self.basis,
                 bra = bra,
-                ket = ket,
+                ket = self.basis.states[ket_index],
                 plaqs_vertices = self.plaqs_vertices,
                 plaq_mels = self.plaq_mels
             )
             if mel:
-                results[row_index + i] = mel
+                results[ket_index] = mel
         return results
 
 
+def magnetic_dtype(basis: Basis, plaq_mels: PlaquetteMels) -> np.dtype:
+    """Dtype of the magnetic Hamiltonian: real if the irreps and the plaquette are real"""
+    return np.result_type(
+        basis.irreps.matrices(basis.group).dtype, plaq_mels.values.dtype, np.float64
+    )
+
+
 def magnetic_hamiltonian(
         basis: Basis,
         plaqs_vertices: list[PlaqVertices],
         plaq_mels: PlaquetteMels,
-        progress_bar = False
-    ) -> sparse.dok_matrix:
-    """Compute the entire magnetic Hamiltonian"""
+        progress_bar = False,
+        format: str = 'csr'
+    ) -> sparse.csr_matrix | sparse.csc_matrix:
+    """
+    Compute the entire magnetic Hamiltonian, as a `format` ('csr' or 'csc')
+    sparse matrix, block by block between irrep configurations.
+    Only the upper triangle is computed, the rest is mirrored
+    """
     worker = MagneticWorker(basis, plaqs_vertices, plaq_mels)
-    n_states = len(basis.states)
-    H = sparse.dok_matrix((n_states, n_states))
-    iterator = tqdm(range(n_states)) if progress_bar else range(n_states)
-    for row_ind in iterator:
-        row = worker.partial_row(row_ind)
-        for col_ind, elem in row.items():
-            H[row_ind, col_ind] = elem
-            H[col_ind, row_ind] = np.conj(elem)
-    return H
+    n_states = len(basis)
+    coo = COOBuffer((n_states, n_states), dtype=magnetic_dtype(basis, plaq_mels))
+    confs = list(basis.conf_ranges)
+    iterator = tqdm(confs) if progress_bar else confs
+    for conf in iterator:
+        coo.extend(*worker.conf_entries(conf))
+    return coo.tocoo(hermitian=True).asformat(format)
+
+
+def translate_operator(
+        basis: Basis,
+        H: sparse.spmatrix,
+        vertex_perm: list[int],
+        link_perm: list[int],
+        format: str = 'csr'
+    ) -> sparse.csr_matrix | sparse.csc_matrix:
+    """
+    Operator `H` transformed by the lattice translation that sends the vertex `v`
+    to `vertex_perm[v]` and the link `l` to `link_perm[l]` (see `utils.lattice.translation`)
+    """
+    perm = state_permutation(basis, vertex_perm, link_perm)
+    H = H.tocoo()
+    return sparse.coo_matrix((H.data, (perm[H.row], perm[H.col])), shape=H.shape).asformat(format)
+
+
+def plaquette_hamiltonian(
+        basis: Basis,
+        plaqs_vertices: list[PlaqVertices],
+        plaq_index: int,
+        plaq_mels: PlaquetteMels,
+        reference: int = 0,
+        reference_hamiltonian = None,
+        pool_size: int | None = None,
+        **kwargs
+    ) -> sparse.csr_matrix | sparse.csc_matrix:
+    """
+    Magnetic Hamiltonian of the single plaquette `plaq_index`. Whenever the lattice
+    allows it, it is obtained by translation from the one of the `reference`
+    plaquette, returned by `reference_hamiltonian()` (computed here if not given).
+    Otherwise it is computed with `magnetic_hamiltonian` (or `magnetic_hamiltonian_mp`
+    if `pool_size` is given), keyword arguments are passed to it
+    """
+    p_vertices = plaqs_vertices[plaq_index]
+    perms = plaquette_translation(basis.vertices, plaqs_vertices[reference], p_vertices)
+    if plaq_index == reference or perms is None:
+        if pool_size:
+            return magnetic_hamiltonian_mp(basis, [p_vertices], plaq_mels, pool_size=pool_size, **kwargs)
+        return magnetic_hamiltonian(basis, [p_vertices], plaq_mels, **kwargs)
+    if reference_hamiltonian is None:
+        H_ref = plaquette_hamiltonian(
+            basis, plaqs_vertices, reference, plaq_mels, reference, pool_size=pool_size, **kwargs
+        )
+    else:
+        H_ref = reference_hamiltonian()
+    return translate_operator(basis, H_ref, *perms, format=H_ref.format)
+
+
+def plaquette_hamiltonians(
+        basis: Basis,
+        plaqs_vertices: list[PlaqVertices],
+        plaq_mels: PlaquetteMels,
+        reference: int = 0,
+        **kwargs
+    ) -> list[sparse.csr_matrix | sparse.csc_matrix]:
+    """
+    Magnetic Hamiltonian of each plaquette, whose sum is the whole magnetic Hamiltonian.
+    Only the one of the `reference` plaquette is computed, the others are
+    obtained by translation whenever the lattice allows it (see `plaquette_hamiltonian`,
+    keyword arguments are passed to it)
+    """
+    H_ref = plaquette_hamiltonian(basis, plaqs_vertices, reference, plaq_mels, reference, **kwargs)
+    return [
+        H_ref if plaq_index == reference else plaquette_hamiltonian(
+            basis, plaqs_vertices, plaq_index, plaq_mels, reference,
+            reference_hamiltonian=lambda: H_ref, **kwargs
+        )
+        for plaq_index in range(len(plaqs_vertices))
+    ]
+
+
+def balanced_chunks(costs: np.ndarray, n_chunks: int) -> list[tuple[int, int]]:
+    """
+    Split `range(len(costs))` in at most `n_chunks` contiguous `(start, stop)`
+    ranges with approximately the same total cost
+    """
+    total = np.cumsum(costs, dtype=np.float64)
+    if len(total) == 0:
+        return []
+    targets = total[-1] * np.arange(1, n_chunks) / n_chunks
+    bounds = np.searchsorted(total, targets, side='right')
+    bounds = np.unique(np.concatenate(([0], bounds, [len(costs)])))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+# worker shared with the forked processes, inherited copy-on-write
+_shared_worker: MagneticWorker | None = None
+
+
+def _shared_confs_entries(chunk: tuple[int, int]) -> tuple[np.ndarray, ...]:
+    return _shared_worker.confs_entries(*chunk)
 
 
 def magnetic_hamiltonian_mp(
         basis: Basis,
         plaqs_vertices: list[PlaqVertices],
         plaq_mels: PlaquetteMels,
-        pool_size: int = 4
-    ) -> sparse.dok_matrix:
+        pool_size: int | None = None,
+        chunks_per_worker: int = 16,
+        progress_bar = False,
+        format: str = 'csr'
+    ) -> sparse.csr_matrix | sparse.csc_matrix:
     """
     Compute the entire magnetic Hamiltonian (Multiprocessing version).
-    Does not work very well
+
+    The worker is shared with `pool_size` forked processes (by default
+    one per core) without pickling it: the basis arrays and the plaquette
+    blocks are read-only, so they stay shared copy-on-write.
+    The irrep configurations are split in chunks of similar estimated cost, whose entries
+    are streamed back as soon as they are ready
     """
+    global _shared_worker
+    if 'fork' not in mp.get_all_start_methods():
+        log.warning('fork is not available, computing the magnetic Hamiltonian serially')
+        return magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels, progress_bar, format)
+
+    pool_size = pool_size or os.cpu_count()
     worker = MagneticWorker(basis, plaqs_vertices, plaq_mels)
-    pool = Pool(pool_size)
-    n_states = len(basis.states)
-    lst = list(range(n_states))
-    pool_result = pool.map(worker.partial_row, lst)
-    H = sparse.dok_matrix((n_states, n_states))
-    for row_ind, row in zip(lst, pool_result):
-        for col_ind, elem in row.items():
-            H[row_ind, col_ind] = elem
-            H[col_ind, row_ind] = np.conj(elem)
-    return H
+    chunks = balanced_chunks(worker.conf_costs(), pool_size * chunks_per_worker)
+    n_states = len(basis)
+    coo = COOBuffer((n_states, n_states), dtype=magnetic_dtype(basis, plaq_mels))
+
+    _shared_worker = worker
+    try:
+        with mp.get_context('fork').Pool(pool_size) as pool:
+            results = pool.imap_unordered(_shared_confs_entries, chunks)
+            if progress_bar:
+                results = tqdm(results, total=len(chunks))
+            for rows, cols, values in results:
+                coo.extend(rows, cols, values)
+    finally:
+        _shared_worker = None
+    return coo.tocoo(hermitian=True).asformat(format)
+
+
+class _BlockBatch:
+    """
+    Pairs of irrep configurations whose plaquette blocks have the same shapes,
+    so that they can be computed and applied together
+    """
+    __slots__ = "bra_shapes", "ket_shapes", "plaq_keys", "plaq_ids", \
+                "bra_ids", "ket_ids", "bra_rows", "ket_rows", "mirror"
+
+    def __init__(self, bra_shapes, ket_shapes, pairs):
+        self.bra_shapes = bra_shapes
+        self.ket_shapes = ket_shapes
+        # plaquette tensors are gathered from the distinct ones
+        plaq_index = dict()
+        self.plaq_ids = np.array([plaq_index.setdefault(pair[0], len(plaq_index)) for pair in pairs])
+        self.plaq_keys = list(plaq_index)
+        self.bra_ids = np.array([pair[1] for pair in pairs])
+        self.ket_ids = np.array([pair[2] for pair in pairs])
+        self.bra_rows = np.stack([pair[3] for pair in pairs])
+        self.ket_rows = np.stack([pair[4] for pair in pairs])
+        # pairs whose hermitian conjugate has to be applied too
+        self.mirror = np.array([pair[5] for pair in pairs])
+
+
+class MagneticOperator(LinearOperator):
+    """
+    Matrix-free magnetic Hamiltonian, to be used with `eigsh` when the stored
+    matrix does not fit in memory.
+
+    The states of an irrep configuration differ only by the vertex subindices,
+    so each plaquette term connecting two configurations is a dense block
+    acting on the subindices of the plaquette vertices. Only the state indices
+    of the blocks are stored: the blocks are recomputed at every product,
+    in batches of at most `batch_size` plaquette tensor entries,
+    unless `cache_blocks` is set
+    """
+
+    def __init__(
+            self,
+            basis: Basis,
+            plaqs_vertices: list[PlaqVertices],
+            plaq_mels: PlaquetteMels,
+            batch_size: int = 2**22,
+            cache_blocks: bool = False
+        ):
+        self.basis = basis
+        self.plaqs_vertices = plaqs_vertices
+        self.plaq_mels = plaq_mels
+        n_states = len(basis)
+        super().__init__(dtype=magnetic_dtype(basis, plaq_mels), shape=(n_states, n_states))
+
+        # invariant tensors of the vertex configurations, stacked in one table per shape
+        self._vertex_ids = []
+        tables = dict()
+        for store in basis.vertex_stores:
+            table = tables.setdefault(store.shape, [])
+            self._vertex_ids.append((store.shape, len(table)))
+            table.append(store)
+        self._vertex_tables = {shape: np.array(table) for shape, table in tables.items()}
+
+        selection = [plaq_selection(basis, p) for p in plaqs_vertices]
+
+        @cache
+        def local(conf, plaq_index):
+            p_vertices = plaqs_vertices[plaq_index]
+            return *self._plaq_vertex_ids(conf, p_vertices), plaq_state_indices(basis, conf, p_vertices)
+
+        batches = dict()
+        for bra_conf, ket_conf, plaq_index in nonzero_conf_pairs(basis, selection, plaq_mels):
+            # the operator is hermitian: keep only one of the two orderings
+            if basis.conf_ranges[bra_conf] > basis.conf_ranges[ket_conf]:
+                continue
+            p_links = selection[plaq_index][0]
+            plaq_key = (
+                tuple(bra_conf[link] for link in p_links),
+                tuple(ket_conf[link] for link in p_links)
+            )
+            bra_shapes, bra_ids, bra_rows = local(bra_conf, plaq_index)
+            ket_shapes, ket_ids, ket_rows = local(ket_conf, plaq_index)
+            batches.setdefault((bra_shapes, ket_shapes, bra_rows.shape[1]), []).append(
+                (plaq_key, bra_ids, ket_ids, bra_rows, ket_rows, bra_conf != ket_conf)
+            )
+
+        self._batches = []
+        for (bra_shapes, ket_shapes, _), pairs in batches.items():
+            step = max(1, batch_size // self.plaq_mels.tensor(*pairs[0][0]).size)
+            self._batches.extend(
+                _BlockBatch(bra_shapes, ket_shapes, pairs[start:start + step])
+                for start in range(0, len(pairs), step)
+            )
+        self._blocks = [self._compute_blocks(batch) for batch in self._batches] \
+            if cache_blocks else None
+
+    def _plaq_vertex_ids(self, conf, p_vertices):
+        """Shapes and table positions of the invariant tensors of the plaquette vertices"""
+        ids = [
+            self._vertex_ids[self.basis.vertex_conf_ids[vertex_conf(conf, self.basis.vertices[v])]]
+            for v in p_vertices
+        ]
+        return tuple(shape for shape, _ in ids), tuple(index for _, index in ids)
+
+    def _compute_blocks(self, batch: _BlockBatch) -> np.ndarray:
+        """Dense plaquette blocks of a batch of pairs, as `(pairs, bra, ket)`"""
+        plaq_tensors = np.stack([self.plaq_mels.tensor(*key) for key in batch.plaq_keys])
+        blocks = contract_magnetic_block(
+            plaq_tensors[batch.plaq_ids],
+            [self._vertex_tables[shape][batch.bra_ids[:, pos]]
+                for pos, shape in enumerate(batch.bra_shapes)],
+            [self._vertex_tables[shape][batch.ket_ids[:, pos]]
+                for pos, shape in enumerate(batch.ket_shapes)]
+        )
+        n_pairs, n_bra, n_ket = len(blocks), batch.bra_rows.shape[1], batch.ket_rows.shape[1]
+        return blocks.reshape(n_pairs, n_bra, n_ket)
+
+    def _matmat(self, X: np.ndarray) -> np.ndarray:
+        Y = np.zeros(X.shape, dtype=np.result_type(self.dtype, X.dtype))
+        n_cols = X.shape[1]
+        for n, batch in enumerate(self._batches):
+            blocks = self._blocks[n] if self._blocks is not None else self._compute_blocks(batch)
+            n_pairs, n_bra, n_ket = blocks.shape
+            ket_x = X[batch.ket_rows].reshape(n_pairs, n_ket, -1)
+            np.add.at(Y, batch.bra_rows, (blocks @ ket_x).reshape(batch.bra_rows.shape + (n_cols,)))
+
+            mirror = batch.mirror
+            if mirror.any():
+                ket_rows = batch.ket_rows[mirror]
+                bra_x = X[batch.bra_rows[mirror]].reshape(len(ket_rows), n_bra, -1)
+                mirrored = np.conj(blocks[mirror]).transpose(0, 2, 1) @ bra_x
+                np.add.at(Y, ket_rows, mirrored.reshape(ket_rows.shape + (n_cols,)))
+        return Y
+
+    def _matvec(self, x: np.ndarray) -> np.ndarray:
+        return self._matmat(x.reshape(-1, 1)).reshape(x.shape)
+
+    def _adjoint(self):
+        return self
@@ -5,7 +5,7 @@ magnetic terms for a plaquette
 
 import logging as log
 import numpy as np
-import pickle
+import os
 
 from itertools import product, chain, repeat
 from functools import cache
@@ -13,8 +13,8 @@ from collections.abc import Sequence
 from pathos.multiprocessing import ProcessingPool as Pool
 
 from group import Group, Irreps
-from utils.utils import sanitize, multiply, all_true, iter_irrep_mels, unpickle
-from utils.mytyping import PlaqIndex, GroupTuple, IrrepIndex
+from utils.utils import sanitize, multiply, unpickle
+from utils.mytyping import PlaqIndex, GroupIndexTuple, IrrepIndex
 
 
 @cache
@@ -33,35 +33,38 @@ def prefactor(
     return 2 * np.sqrt(irrep_ket_dim * irrep_bra_dim) / (ord_group ** 4)
 
 
-@cache
 def plaq_character(
+        group: Group,
         irreps: Irreps,
-        g_elems: GroupTuple,
+        g_inds: GroupIndexTuple,
         magn_irrep: int
     ) -> float:
     """
-    Compute the character of plaquette given the magnetic irrep `magn_irrep`
+    Compute the character of plaquette given the magnetic irrep `magn_irrep`.
+    The element labels `g_inds` can be ints or arrays of ints
     """
-    g1, g2, g3, g4 = g_elems
-    return np.real(irreps.chars[magn_irrep](g1 * g2 * (~g3) * (~g4)))
+    chars = irreps.char_table(group)[magn_irrep]
+    return np.real(chars[plaq_holonomy(group, g_inds)])
 
 
-@cache
 def plaq_mels(
+        group: Group,
         irreps: Irreps,
-        g_elems: GroupTuple,
+        g_inds: GroupIndexTuple,
         plaq_state: PlaqIndex
     ) -> float | complex:
     """
     Computes
     $[\pi^{j_1}(g_1)]_{m_1 n_1} * ... * [\pi^{j_4}(g_4)]_{m_4 n_4}$
     """
-    return multiply(irreps.mel(*jmn)(g) for jmn, g in zip(plaq_state, g_elems))
+    mats = irreps.matrices(group)
+    return multiply(mats[j, g, m, n] for (j, m, n), g in zip(plaq_state, g_inds))
 
 
 def wl_sum_term(
+        group: Group,
         irreps: Irreps,
-        g_elems: GroupTuple,
+        g_inds: GroupIndexTuple,
         plaq_ket: PlaqIndex,
         plaq_bra: PlaqIndex,
         magn_irrep: int
@@ -73,11 +76,12 @@ def wl_sum_term(
         [\pi^{j_1}(g_1)]_{m_1 n_1} * ... * [\pi^{j_4}(g_4)]_{m_4 n_4} * \
         [\pi^{j'_1}(g_1)]^*_{m'_1 n'_1} * ... * [\pi^{j'_4}(g_4)]^*_{m'_4 n'_4}
     $$
+    If `g_inds` are arrays of labels it computes all the corresponding terms
     """
     return \
-        plaq_character(irreps, g_elems, magn_irrep) * \
-        plaq_mels(irreps, g_elems, plaq_ket) * \
-        np.conj(plaq_mels(irreps, g_elems, plaq_bra))
+        plaq_character(group, irreps, g_inds, magn_irrep) * \
+        plaq_mels(group, irreps, g_inds, plaq_ket) * \
+        np.conj(plaq_mels(group, irreps, g_inds, plaq_bra))
 
 
 def wl_mel(
@@ -86,17 +90,18 @@ def wl_mel(
         plaq_ket: PlaqIndex,
         plaq_bra: PlaqIndex,
         magn_irrep: int,
-        group_range: list[GroupTuple] or None = None
+        group_range: np.ndarray | None = None
     ) -> float | complex:
-    """Computes a single matrix element of the Wilson loop"""
-    if not group_range:
-        group_range = product(group, repeat=4)
+    """
+    Computes a single matrix element of the Wilson loop.
+    `group_range` is a `(4, n)` array of element labels to sum over,
+    by default the whole G x G x G x G
+    """
+    if group_range is None:
+        group_range = all_group_tuples(group)
     mel = sanitize(
             prefactor(group, irreps, plaq_ket, plaq_bra) * \
-            sum(
-                wl_sum_term(irreps, g_elems, plaq_ket, plaq_bra, magn_irrep)
-                for g_elems in group_range
-            )
+            np.sum(wl_sum_term(group, irreps, group_range, plaq_ket, plaq_bra, magn_irrep))
         )
     if mel:
         log.debug(f'bra: {plaq_bra}, ket: {plaq_ket}, mel: {mel}')
@@ -109,16 +114,34 @@ def wl_mel(
     # it is some improvement
 
 
-def non_zero_plaq_char(group: Group, irreps: Irreps, magn_irrep: int):
+def all_group_tuples(group: Group) -> np.ndarray:
+    """
+    All the elements of G x G x G x G as a `(4, |G|^4)` array of labels,
+    in the same order as `product(group, repeat=4)`
+    """
+    return np.indices((len(group),) * 4).reshape(4, -1)
+
+
+def plaq_holonomy(group: Group, g_inds) -> np.ndarray:
+    """
+    Labels of the holonomy $g_1 g_2 g_3^{-1} g_4^{-1}$, given the labels
+    `g_inds = (g_1, g_2, g_3, g_4)` as ints or arrays of ints
+    """
+    g1, g2, g3, g4 = g_inds
+    return group.mul(
+        group.mul(group.mul(g1, g2), group.inv(g3)),
+        group.inv(g4)
+    )
+
+
+def non_zero_plaq_char(group: Group, irreps: Irreps, magn_irrep: int) -> np.ndarray:
     """
-    Return a the list of states (in group repr) with
+    Return the states (as a `(4, n)` array of element labels) with
     non-zero character in the `magn_irrep` irrep
     """
-    return [
-        g_elems
-        for g_elems in product(group, repeat=4)
-        if sanitize(plaq_character(irreps, g_elems, magn_irrep))
-    ]
+    g_inds = all_group_tuples(group)
+    non_zero = sanitize(plaq_character(group, irreps, g_inds, magn_irrep)) != 0
+    return g_inds[:, non_zero]
 
 
 def wl_matrix(
@@ -141,8 +164,11 @@ def wl_matrix(
     for bra in irreps_bra:
         log.info(f'>> Calculating WL mels for bra: {bra}')
         irreps_ket = product(irrep_inds, repeat=4)
-        mels = {ket: wl_mel(group, irreps, ket, bra, magn_irrep, group_range)
-                for ket in irreps_ket}
+        mels = dict()
+        for ket in irreps_ket:
+            mel = wl_mel(group, irreps, ket, bra, magn_irrep, group_range)
+            if mel:
+                mels[ket] = mel
         if mels:
             C[bra] = mels
     return C
@@ -186,6 +212,227 @@ def wl_matrix_multiproc(
     return {bra: row for bra, row in zip(irreps_bras, result)}
 
 
+def wl_link_tensors(
+        group: Group,
+        irreps: Irreps,
+        magn_matrices: np.ndarray
+    ) -> np.ndarray:
+    r"""
+    Compute the group average over a single link of the plaquette
+    $$
+        F[j', j, a, b, m', n', m, n] = \frac{1}{|G|} \sum_g
+        [U(g)]_{a b} [\pi^{j}(g)]_{m n} [\pi^{j'}(g)]^*_{m' n'}
+    $$
+    where `magn_matrices[g]` are the matrices $U(g)$ of the magnetic irrep
+    """
+    mats = irreps.matrices(group)
+    return np.einsum(
+        'gab,kgmn,jgpq->jkabpqmn',
+        magn_matrices, mats, np.conj(mats),
+        optimize=True
+    ) / len(group)
+
+
+def _non_zero_pairs(link_tensors: Sequence[np.ndarray]) -> list[tuple[int, int]]:
+    """
+    Pairs of irreps (bra, ket) for which at least one of the link tensors is non-zero
+    """
+    non_zero = sum(
+        np.any(sanitize(np.abs(F)) != 0, axis=tuple(range(2, F.ndim)))
+        for F in link_tensors
+    )
+    return [(int(jb), int(jk)) for jb, jk in zip(*np.nonzero(non_zero))]
+
+
+# The single-plaquette Wilson loop as a chain of the link tensors,
+# bra indices first and then ket indices (same as in PlaquetteMels.tensor)
+_WL_SUBSCRIPTS = 'abABCD,bcEFGH,cdIJKL,daMNOP->ABEFIJMNCDGHKLOP'
+_wl_paths = dict()
+
+
+def _wl_contract(links: Sequence[np.ndarray]) -> np.ndarray:
+    """Contract the four link tensors around the plaquette"""
+    key = tuple(L.shape for L in links)
+    if key not in _wl_paths:
+        _wl_paths[key] = np.einsum_path(_WL_SUBSCRIPTS, *links, optimize='optimal')[0]
+    return np.einsum(_WL_SUBSCRIPTS, *links, optimize=_wl_paths[key])
+
+
+def _link_tensors_sum(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Link tensors of the direct and inverse links (g_1, g_2 and g_3, g_4),
+    computed as averages over the group (see `wl_link_tensors`)
+    """
+    dm = irreps.dim(magn_irrep)
+    U = irreps.matrices(group)[magn_irrep, :, :dm, :dm]
+    U_inv = U[group.inv_table]
+    # Re(chi) = (chi + chi^*)/2, the conjugate is needed only for complex irreps
+    versions = [(U, U_inv)]
+    if np.iscomplexobj(U):
+        versions.append((np.conj(U), np.conj(U_inv)))
+    return [
+        (wl_link_tensors(group, irreps, V), wl_link_tensors(group, irreps, V_inv))
+        for V, V_inv in versions
+    ]
+
+
+def wl_link_tensors_cg(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int
+    ) -> np.ndarray:
+    r"""
+    Same tensor as `wl_link_tensors` for the magnetic irrep, but in closed form.
+    By the Schur orthogonality relations the group average reduces to
+    $$
+        F[j', j, a, b, m', n', m, n] = \frac{1}{d_{j'}} \sum_\alpha
+        C^{\alpha}_{a m m'} (C^{\alpha}_{b n n'})^*
+    $$
+    where $C^\alpha$ are the Clebsch-Gordan coefficients of
+    `magn_irrep` x `j` -> `j'` (see `Irreps.clebsch_gordan`)
+    """
+    mats = irreps.matrices(group)
+    n_irreps, dmax = len(irreps), mats.shape[-1]
+    dm = irreps.dim(magn_irrep)
+    F = np.zeros((n_irreps, n_irreps, dm, dm) + (dmax,) * 4, dtype=mats.dtype)
+    for j in range(n_irreps):
+        dj = irreps.dim(j)
+        for jp, C in irreps.clebsch_gordan(group, magn_irrep, j).items():
+            djp = irreps.dim(jp)
+            F[jp, j, :, :, :djp, :djp, :dj, :dj] = \
+                np.einsum('xamp,xbnq->abpqmn', C, np.conj(C)) / djp
+    return F
+
+
+def _inverse_link(F: np.ndarray) -> np.ndarray:
+    """
+    Link tensor for $U(g^{-1}) = U(g)^\dagger$ from the one of $U(g)$,
+    valid for unitary irreps
+    """
+    return np.conj(F.transpose(1, 0, 3, 2, 6, 7, 4, 5))
+
+
+def _conj_link(F: np.ndarray) -> np.ndarray:
+    """Link tensor for $U(g)^*$ from the one of $U(g)$"""
+    return np.conj(F.transpose(1, 0, 2, 3, 6, 7, 4, 5))
+
+
+def _link_tensors_cg(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int
+    ) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Same as `_link_tensors_sum`, but from the Clebsch-Gordan coefficients"""
+    F = wl_link_tensors_cg(group, irreps, magn_irrep)
+    versions = [F]
+    if np.iscomplexobj(irreps.matrices(group)):
+        versions.append(_conj_link(F))
+    return [(V, _inverse_link(V)) for V in versions]
+
+
+_LINK_TENSORS = {
+    'sum': _link_tensors_sum,
+    'cg': _link_tensors_cg,
+}
+
+
+def wl_blocks(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int,
+        method: str = 'sum'
+    ) -> dict[tuple[tuple[IrrepIndex, ...], tuple[IrrepIndex, ...]], np.ndarray]:
+    """
+    Compute the single-plaquette Wilson loop grouped in blocks of fixed irreps.
+
+    The sum over G x G x G x G factorizes on the links once the character
+    is written as the trace of the product of the magnetic matrices, so each
+    block is a contraction of four link tensors. With `method='sum'` the link
+    tensors are averages over the group (see `wl_link_tensors`), with
+    `method='cg'` they are products of Clebsch-Gordan coefficients
+    (see `wl_link_tensors_cg`), whose cost does not grow with |G|.
+    Returns a dict `{(bra_irreps, ket_irreps): tensor}` with only the non-zero
+    blocks, each tensor with the same 16-index layout of `PlaquetteMels.tensor`
+    """
+    if method not in _LINK_TENSORS:
+        raise ValueError(f"Unknown method '{method}', expected one of {list(_LINK_TENSORS)}")
+    versions = _LINK_TENSORS[method](group, irreps, magn_irrep)
+    pairs = _non_zero_pairs([F for version in versions for F in version])
+    dims = [irreps.dim(j) for j in range(len(irreps))]
+
+    blocks = dict()
+    for link_pairs in product(pairs, repeat=4):
+        bra_irreps, ket_irreps = tuple(zip(*link_pairs))
+        block = 0
+        for F, F_inv in versions:
+            links = [
+                L[jb, jk, :, :, :dims[jb], :dims[jb], :dims[jk], :dims[jk]]
+                for L, (jb, jk) in zip((F, F, F_inv, F_inv), link_pairs)
+            ]
+            block = block + _wl_contract(links)
+        dim_prod = multiply(dims[j] for j in bra_irreps + ket_irreps)
+        block = sanitize(np.sqrt(dim_prod) * 2 * block / len(versions))
+        if np.any(block):
+            blocks[(bra_irreps, ket_irreps)] = block
+    return blocks
+
+
+def blocks_to_dict(blocks: dict) -> dict[PlaqIndex, dict[PlaqIndex, float]]:
+    """
+    Convert the blocks of `wl_blocks` in the nested dict format of `wl_matrix`
+    """
+    C = dict()
+    for (bra_irreps, ket_irreps), block in blocks.items():
+        for index in zip(*np.nonzero(block)):
+            bra = tuple((j, index[2*k], index[2*k+1]) for k, j in enumerate(bra_irreps))
+            ket = tuple((j, index[8+2*k], index[9+2*k]) for k, j in enumerate(ket_irreps))
+            C.setdefault(bra, dict())[ket] = block[index]
+    return C
+
+
+def wl_matrix_vectorized(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int
+    ) -> dict[PlaqIndex, dict[PlaqIndex, float]]:
+    """
+    Compute the matrix elements of the single-plaquette Wilson loop
+
+    Same output as `wl_matrix`, but computed with batched contractions
+    over the group tensors (see `wl_blocks`)
+    """
+    return blocks_to_dict(wl_blocks(group, irreps, magn_irrep))
+
+
+def wl_matrix_cg(
+        group: Group,
+        irreps: Irreps,
+        magn_irrep: int,
+        check: bool = False
+    ) -> dict[PlaqIndex, dict[PlaqIndex, float]]:
+    """
+    Compute the matrix elements of the single-plaquette Wilson loop
+    from the Clebsch-Gordan coefficients of `irreps`, without summing over the group
+
+    If `check` is true, the result is cross-checked against the direct sum
+    over the group (same output as `wl_matrix`), only viable for small groups
+    """
+    blocks = wl_blocks(group, irreps, magn_irrep, method='cg')
+    if check:
+        expected = wl_blocks(group, irreps, magn_irrep, method='sum')
+        if blocks.keys() != expected.keys() or not all(
+                np.allclose(blocks[key], expected[key]) for key in blocks):
+            raise RuntimeError(
+                f"Wilson loop from Clebsch-Gordan coefficients does not match the sum over {group}"
+            )
+        log.info(f'Wilson loop for {group} cross-checked')
+    return blocks_to_dict(blocks)
+
+
 def get_plaq_links(vertices, plaquette):
     """Returns the indices of the links the `ind`-th plaquette"""
     return tuple(vertices[i][k] for k, i in enumerate(plaquette))
@@ -194,42 +441,129 @@ def get_plaq_links(vertices, plaquette):
 class PlaquetteMels:
     """
     Class for interfacing with the matrix elements of a single plaquette Wilson loop
+
+    The matrix elements are stored in columnar form, grouped in blocks with
+    fixed irreps on the links (bra and ket). Each block `b` has the irreps
+    `block_irreps[b] = (j'_1, ..., j'_4, j_1, ..., j_4)` and owns the entries
+    `offsets[b]:offsets[b+1]` of the arrays
+        - `indices`, the 16 indices (m'_1, n'_1, ..., m_4, n_4) of each entry
+        - `values`, the value of each entry
     """
+    _files = ("block_irreps", "offsets", "indices", "values")
+
     def __init__(
             self,
             irreps: Irreps,
             from_dict: dict | None = None,
-            from_file: str | None = None
+            from_file: str | None = None,
+            from_blocks: dict | None = None
         ):
         """
-        Can be initialized from a dict (output of wl_matrix*) or read from a pickled file
+        Can be initialized from a dict (output of wl_matrix*), from the blocks
+        (output of wl_blocks) or read from a file. The file can be either
+        a directory written by `save` or a legacy pickled dict
         """
         self._irreps = irreps
-        self._mels = None
         if isinstance(from_dict, dict):
-            self._mels = from_dict
+            self._set_from_dict(from_dict)
+        elif isinstance(from_blocks, dict):
+            self._set_from_blocks(from_blocks)
+        elif isinstance(from_file, str):
+            self.load_file(from_file)
         else:
-            if isinstance(from_file, str):
-                self.load_file(from_file)
-            else:
-                raise ValueError('No valid argument given')
-        self._tensors = dict()
+            raise ValueError('No valid argument given')
 
 
     def __len__(self):
         """Returns the number of rows"""
-        return len(self._mels)
+        bra_irreps = np.repeat(self.block_irreps[:, :4], np.diff(self.offsets), axis=0)
+        rows = np.concatenate((bra_irreps, self.indices[:, :8]), axis=1)
+        return len(np.unique(rows, axis=0))
+
+
+    def _set_arrays(self, block_irreps, offsets, indices, values):
+        self.block_irreps = block_irreps
+        self.offsets = offsets
+        self.indices = indices
+        self.values = values
+        self._block_index = {
+            (tuple(map(int, irr[:4])), tuple(map(int, irr[4:]))): b
+            for b, irr in enumerate(self.block_irreps)
+        }
+        # dense tensor of each block, built on the first `tensor` call
+        # (so that memory-mapped values are only read when needed)
+        self._tensors = dict()
 
+    def _set_from_blocks(self, blocks: dict):
+        keys = sorted(blocks)
+        entries = [np.nonzero(blocks[key]) for key in keys]
+        counts = [len(entry[0]) for entry in entries]
+        values = [blocks[key][entry] for key, entry in zip(keys, entries)]
+        self._set_arrays(
+            block_irreps = np.array(
+                [bra + ket for bra, ket in keys], dtype=np.uint8
+            ).reshape(-1, 8),
+            offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            indices = np.concatenate(
+                [np.stack(entry, axis=1) for entry in entries] or [np.zeros((0, 16))]
+            ).astype(np.uint8),
+            values = np.concatenate(values) if values else np.zeros(0)
+        )
 
-    def load_file(self, filename: str):
-        """Load plaquette matrix elements from a file"""
-        self._mels = unpickle(filename)
+
+    def _set_from_dict(self, mels: dict):
+        blocks = dict()
+        for bra, row in mels.items():
+            for ket, val in row.items():
+                if val is None:
+                    continue
+                key = (tuple(jmn[0] for jmn in bra), tuple(jmn[0] for jmn in ket))
+                if key not in blocks:
+                    shape = tuple(chain(
+                        self._shape_from_irreps(key[0]),
+                        self._shape_from_irreps(key[1])
+                    ))
+                    blocks[key] = np.zeros(shape, dtype=np.result_type(val))
+                elif np.iscomplexobj(val) and not np.iscomplexobj(blocks[key]):
+                    blocks[key] = blocks[key].astype(complex)
+                index = tuple(chain.from_iterable((jmn[1], jmn[2]) for jmn in chain(bra, ket)))
+                blocks[key][index] = val
+        self._set_from_blocks(blocks)
+
+
+    def load_file(self, filename: str, mmap_mode: str | None = 'r'):
+        """
+        Load plaquette matrix elements from a file.
+        A directory written by `save` is memory-mapped (see `np.load`),
+        any other file is read as a pickled dict
+        """
+        if os.path.isdir(filename):
+            self._set_arrays(*(
+                np.load(os.path.join(filename, f"{name}.npy"), mmap_mode=mmap_mode)
+                for name in self._files
+            ))
+        else:
+            self._set_from_dict(unpickle(filename))
 
 
     def save(self, filename: str):
-        """Save the plaquette matrix elements to a file"""
-        with open(filename, 'wb') as file:
-            pickle.dump(file)
+        """
+        Save the plaquette matrix elements in the directory `filename`,
+        one .npy file for each array
+        """
+        os.makedirs(filename, exist_ok=True)
+        for name in self._files:
+            np.save(os.path.join(filename, f"{name}.npy"), getattr(self, name))
+
+
+    def _block_entries(self, block: int):
+        """Iterate over the entries (bra, ket, value) of a block, as in the dict format"""
+        irreps = self.block_irreps[block]
+        start, stop = self.offsets[block], self.offsets[block + 1]
+        for index, val in zip(self.indices[start:stop], self.values[start:stop]):
+            bra = tuple((int(irreps[k]), int(index[2*k]), int(index[2*k+1])) for k in range(4))
+            ket = tuple((int(irreps[4+k]), int(index[8+2*k]), int(index[9+2*k])) for k in range(4))
+            yield bra, ket, val
 
 
     def select_rows(self, irrep_conf: Sequence[IrrepIndex]):
@@ -237,11 +571,13 @@ class PlaquetteMels:
         Select the rows of the Wilson loop matrix corresponding to a
         irrep configuration on the links of the plaquette
         """
-        selected_rows = {
-            row: self._mels[row]
-            for row in iter_irrep_mels(irreps=self._irreps, irr_conf=irrep_conf)
-            if row in self._mels
-        }
+        irrep_conf = tuple(irrep_conf)
+        selected_rows = dict()
+        for (bra_irreps, _), block in self._block_index.items():
+            if bra_irreps != irrep_conf:
+                continue
+            for bra, ket, val in self._block_entries(block):
+                selected_rows.setdefault(bra, dict())[ket] = val
         return selected_rows
 
 
@@ -255,20 +591,14 @@ class PlaquetteMels:
         Select the matrix elements for a given bra and ket
         """
         selection = dict()
-        if flatten:
-            for row in self.select_rows(bra_irreps):
-                for col in self._mels[row]:
-                    if all_true(j == jmn[0] for j, jmn in zip(ket_irreps, col)):
-                        selection[(row, col)] = self._mels[row][col]
-        else:
-            for row in self.select_rows(bra_irreps):
-                selected_cols = {
-                    col: self._mels[row][col]
-                    for col in iter_irrep_mels(irreps=self._irreps, irr_conf=ket_irreps)
-                    if col in self._mels[row]
-                }
-                if selected_cols:
-                    selection[row] = selected_cols
+        block = self._block_index.get((tuple(bra_irreps), tuple(ket_irreps)))
+        if block is None:
+            return selection
+        for bra, ket, val in self._block_entries(block):
+            if flatten:
+                selection[(bra, ket)] = val
+            else:
+                selection.setdefault(bra, dict())[ket] = val
         return selection
 
 
@@ -284,27 +614,41 @@ class PlaquetteMels:
             bra_irreps: Sequence[IrrepIndex],
             ket_irreps: Sequence[IrrepIndex]
         ) -> np.ndarray | None:
-        selection = self.select(bra_irreps, ket_irreps, flatten=True)
-        if not selection:
+        block = self._block_index.get((tuple(bra_irreps), tuple(ket_irreps)))
+        if block is None:
             return None
         shape_bra = self._shape_from_irreps(bra_irreps)
         shape_ket = self._shape_from_irreps(ket_irreps)
-        C = np.zeros(tuple(chain.from_iterable((shape_bra, shape_ket))))
-        for bra, ket in selection:
-            index = tuple(chain.from_iterable((jmn[1], jmn[2]) for jmn in chain(bra, ket)))
-            C[index] = selection[(bra, ket)]
+        start, stop = self.offsets[block], self.offsets[block + 1]
+        C = np.zeros(
+            tuple(chain.from_iterable((shape_bra, shape_ket))),
+            dtype=self.values.dtype
+        )
+        C[tuple(self.indices[start:stop].T)] = self.values[start:stop]
         return C
 
 
+    def has_block(
+            self,
+            bra_irreps: Sequence[IrrepIndex],
+            ket_irreps: Sequence[IrrepIndex]
+        ) -> bool:
+        """Check if there are non-zero matrix elements between the given irreps"""
+        return (tuple(map(int, bra_irreps)), tuple(map(int, ket_irreps))) in self._block_index
+
+
     def tensor(
         self,
         bra_irreps: Sequence[IrrepIndex],
         ket_irreps: Sequence[IrrepIndex]
     ) -> np.ndarray | None:
-        key = (bra_irreps, ket_irreps)
-        if key in self._tensors:
-            return self._tensors[key]
-        else:
-            tensor = self._select_as_tensor(bra_irreps, ket_irreps)
-            self._tensors[key] = tensor
-            return tensor
+        """
+        Return the matrix elements between the given irreps as a 16-index tensor,
+        or None if they are all zero. Each tensor is built once and then reused
+        """
+        key = (tuple(map(int, bra_irreps)), tuple(map(int, ket_irreps)))
+        if key not in self._tensors:
+            if key not in self._block_index:
+                return None
+            self._tensors[key] = self._select_as_tensor(*key)
+        return self._tensors[key]
@@ -0,0 +1,204 @@
+"""
+Checkpointed build of the magnetic Hamiltonian: the rows are split in
+shards (contiguous ranges of irrep configurations) whose entries are saved
+to a work directory as soon as they are computed, so that an interrupted
+build resumes from the completed shards, and a build can be split by row
+range over several machines sharing (or later copying) the directory
+"""
+
+import json
+import logging as log
+import multiprocessing as mp
+import os
+import socket
+import tempfile
+import numpy as np
+import scipy.sparse as sparse
+
+from tqdm import tqdm
+
+from basis.basis import Basis
+from hamiltonian.magnetic import MagneticWorker, magnetic_dtype, balanced_chunks
+from hamiltonian.plaquette import PlaquetteMels
+from utils.linalg import COOBuffer
+from utils.mytyping import PlaqVertices
+
+
+TMP_SUFFIX = '.tmp'
+
+
+def _atomic_write(path: str, write):
+    """
+    Call `write(file)` on a temporary file in the same directory, then move it
+    to `path`. The temporary name is unique also across machines sharing the directory
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory or '.', prefix=f"{name}.{socket.gethostname()}.", suffix=TMP_SUFFIX
+    )
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        # only left if the write failed
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ShardedMagneticBuild:
+    """
+    Work directory with `manifest.json` (the key of the build and the
+    shards, each with its range of configurations and of rows) and one
+    `shard_XXXXX.npz` file per completed shard, with the `rows`, `cols` and
+    `values` of the upper triangle as in `MagneticWorker.confs_entries`.
+    The shards are fixed when the directory is created, reopening it with
+    a different `key` raises an error
+    """
+    MANIFEST = 'manifest.json'
+
+    def __init__(
+            self,
+            root: str,
+            basis: Basis,
+            plaqs_vertices: list[PlaqVertices],
+            plaq_mels: PlaquetteMels,
+            key: str,
+            n_shards: int | None = None
+        ):
+        """
+        `key` identifies what is being built (e.g. the cache key of the result).
+        The `n_shards` shards (256 by default) have approximately the same
+        estimated cost; when reopening, `n_shards` must match the manifest if given
+        """
+        self.root = root
+        self.basis = basis
+        self.worker = MagneticWorker(basis, plaqs_vertices, plaq_mels)
+        self.dtype = magnetic_dtype(basis, plaq_mels)
+        os.makedirs(root, exist_ok=True)
+        manifest_path = os.path.join(root, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+            if manifest['key'] != key or manifest['n_states'] != len(basis):
+                raise ValueError(f"{root} holds the shards of a different build")
+            if n_shards is not None and n_shards != len(manifest['shards']):
+                raise ValueError(
+                    f"{root} is split in {len(manifest['shards'])} shards, not {n_shards}"
+                )
+        else:
+            manifest = dict(key=key, n_states=len(basis), shards=self._make_shards(n_shards or 256))
+            _atomic_write(manifest_path, lambda file: file.write(json.dumps(manifest).encode()))
+        self.key = key
+        self.shards = manifest['shards']
+
+    def _make_shards(self, n_shards: int) -> list[dict]:
+        confs = list(self.basis.conf_ranges)
+        shards = []
+        for start, stop in balanced_chunks(self.worker.conf_costs(), n_shards):
+            shards.append(dict(
+                confs=[start, stop],
+                rows=[self.basis.conf_ranges[confs[start]][0], self.basis.conf_ranges[confs[stop - 1]][1]]
+            ))
+        return shards
+
+    def __len__(self):
+        return len(self.shards)
+
+    def shard_path(self, index: int) -> str:
+        return os.path.join(self.root, f"shard_{index:05d}.npz")
+
+    def done(self) -> list[int]:
+        """Indices of the completed shards"""
+        return [n for n in range(len(self.shards)) if os.path.exists(self.shard_path(n))]
+
+    def pending(self, row_range: tuple[int, int] | None = None) -> list[int]:
+        """
+        Indices of the shards still to compute, only those starting in
+        `row_range` if given: splitting the rows in disjoint ranges splits the shards
+        """
+        done = set(self.done())
+        result = []
+        for n, shard in enumerate(self.shards):
+            start = shard['rows'][0]
+            if n in done or (row_range is not None and not row_range[0] <= start < row_range[1]):
+                continue
+            result.append(n)
+        return result
+
+    def build_shard(self, index: int):
+        """Compute a shard and save it"""
+        rows, cols, values = self.worker.confs_entries(*self.shards[index]['confs'])
+        _atomic_write(
+            self.shard_path(index),
+            lambda file: np.savez(file, rows=rows, cols=cols, values=values)
+        )
+
+    def build(
+            self,
+            row_range: tuple[int, int] | None = None,
+            pool_size: int = 1,
+            progress_bar = False
+        ) -> list[int]:
+        """
+        Compute the pending shards (in `row_range`, see `pending`), with
+        `pool_size` forked processes that save their shards themselves.
+        Returns the indices of the shards computed
+        """
+        global _shared_build
+        pending = self.pending(row_range)
+        if len(pending) < len(self.shards):
+            log.info(f"{len(self.shards) - len(pending)} of {len(self.shards)} shards done or skipped")
+        if pool_size > 1 and 'fork' not in mp.get_all_start_methods():
+            log.warning('fork is not available, computing the shards serially')
+            pool_size = 1
+        if pool_size == 1 or len(pending) <= 1:
+            for index in tqdm(pending, disable=not progress_bar):
+                self.build_shard(index)
+            return pending
+
+        _shared_build = self
+        try:
+            with mp.get_context('fork').Pool(pool_size) as pool:
+                results = pool.imap_unordered(_shared_build_shard, pending)
+                for _ in tqdm(results, total=len(pending), disable=not progress_bar):
+                    pass
+        finally:
+            _shared_build = None
+        return pending
+
+    def complete(self) -> bool:
+        return len(self.done()) == len(self.shards)
+
+    def clean(self):
+        """
+        Remove the temporary files left by interrupted writes.
+        Only safe when no build is running on the directory
+        """
+        for name in os.listdir(self.root):
+            if name.endswith(TMP_SUFFIX):
+                os.remove(os.path.join(self.root, name))
+
+    def merge(self, format: str = 'csr') -> sparse.csr_matrix | sparse.csc_matrix:
+        """Assemble the Hamiltonian from all the shards, as a `format` sparse matrix"""
+        missing = self.pending()
+        if missing:
+            raise RuntimeError(f"{len(missing)} shards of {self.root} are missing, e.g. {missing[0]}")
+        # all the shards are written, what is left are interrupted writes
+        self.clean()
+        n_states = len(self.basis)
+        coo = COOBuffer((n_states, n_states), dtype=self.dtype)
+        for index in range(len(self.shards)):
+            with np.load(self.shard_path(index)) as shard:
+                coo.extend(shard['rows'], shard['cols'], shard['values'])
+        return coo.tocoo(hermitian=True).asformat(format)
+
+
+# build shared with the forked processes, inherited copy-on-write
+_shared_build: ShardedMagneticBuild | None = None
+
+
+def _shared_build_shard(index: int):
+    _shared_build.build_shard(index)
@@ -0,0 +1,8 @@
+"""
+Solve the Hamiltonian over ranges of the coupling
+"""
+from .sweep import CoupledHamiltonian, sweep, sweep_results, expt_value
+from .parallel import parallel_sweep, parallel_sweep_segments
+from .kpm import chebyshev_moments, density_of_states, thermal_averages, kpm_over_range
+from .evolution import evolve, quench
+from .results import ResultsStore, sweep_to_store, parallel_sweep_to_store, single_precision
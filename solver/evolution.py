@@ -0,0 +1,177 @@
+"""
+Real time evolution |ψ(t)⟩ = exp(-iHt)|ψ0⟩ with Krylov (Lanczos) steps of
+adaptive size, measuring the observables only at the requested times
+"""
+
+import logging as log
+import numpy as np
+import scipy.sparse as sparse
+from collections.abc import Iterable, Iterator
+from scipy.linalg import eigh_tridiagonal
+from scipy.sparse.linalg import eigsh, expm_multiply
+from tqdm import tqdm
+
+from basis.basis import Basis
+from .sweep import CoupledHamiltonian, expt_value
+
+
+class KrylovPropagator:
+    """
+    Lanczos decomposition H V = V T of the Krylov space of a state, giving
+    exp(-iH dt)|ψ⟩ and an error estimate for any dt at no further cost
+    """
+    def __init__(self, H, psi: np.ndarray, krylov_dim: int):
+        n = psi.shape[0]
+        norm = np.linalg.norm(psi)
+        V = np.zeros((krylov_dim + 1, n), dtype=np.complex128)
+        V[0] = psi / norm
+        alphas, betas = [], []
+        beta = 0.0
+        for j in range(krylov_dim):
+            w = H @ V[j]
+            alpha = np.vdot(V[j], w).real
+            w -= alpha * V[j]
+            if j > 0:
+                w -= betas[-1] * V[j - 1]
+            # full reorthogonalization, the Krylov space is small
+            w -= V[:j + 1].T @ (V[:j + 1].conj() @ w)
+            alphas.append(alpha)
+            beta = np.linalg.norm(w)
+            if beta < 1e-12 * norm:
+                # invariant subspace: the step is exact
+                beta = 0.0
+                break
+            if j < krylov_dim - 1:
+                betas.append(beta)
+            V[j + 1] = w / beta
+        self.norm = norm
+        self.basis = V[:len(alphas)]
+        self.last_beta = beta
+        self.evals, self.evecs = eigh_tridiagonal(np.array(alphas), np.array(betas))
+
+    def coefficients(self, dt: float) -> np.ndarray:
+        """exp(-iT dt) e_1 in the Krylov basis"""
+        return self.evecs @ (np.exp(-1j * self.evals * dt) * self.evecs[0].conj())
+
+    def error(self, dt: float) -> float:
+        """A posteriori estimate of the error of a step of size dt"""
+        return self.norm * self.last_beta * abs(self.coefficients(dt)[-1])
+
+    def step(self, dt: float) -> np.ndarray:
+        """exp(-iH dt)|ψ⟩"""
+        return self.norm * (self.basis.T @ self.coefficients(dt))
+
+
+def evolve(
+        H,
+        psi0: np.ndarray,
+        times: Iterable[float],
+        method: str = 'krylov',
+        krylov_dim: int = 30,
+        tol: float = 1e-10,
+        progress_bar: bool = False
+    ) -> Iterator[tuple[float, np.ndarray]]:
+    """
+    Evolve `psi0` from t = 0 with the Hermitian `H` and yield (t, ψ(t)) at
+    every one of the increasing `times`; only the current state is kept.
+
+    With method 'krylov' every step is the largest one (up to the next
+    requested time) whose Lanczos error estimate stays below `tol`.
+    With method 'expm' the steps between the requested times are done by
+    scipy's `expm_multiply`, which needs `H` as a sparse matrix
+    """
+    if method not in ('krylov', 'expm'):
+        raise ValueError(f"unknown method {method!r}")
+    if method == 'expm' and not sparse.issparse(H):
+        raise TypeError("method 'expm' needs a sparse matrix")
+    psi = np.array(psi0, dtype=np.complex128)
+    t = 0.0
+    dt = None
+    n_steps = 0
+    for target in tqdm(times, disable=not progress_bar):
+        if target < t:
+            raise ValueError("times must be non-negative and increasing")
+        if method == 'expm':
+            if target > t:
+                psi = expm_multiply(-1j * (target - t) * H, psi)
+            t = target
+        while t < target:
+            propagator = KrylovPropagator(H, psi, krylov_dim)
+            remaining = target - t
+            dt = remaining if dt is None else min(remaining, 2 * dt)
+            if propagator.last_beta > 0:
+                while propagator.error(dt) > tol:
+                    dt /= 2
+            psi = propagator.step(dt)
+            # do not leave a tiny step because of rounding
+            t = target if remaining - dt < 1e-12 * max(target, 1) else t + dt
+            n_steps += 1
+        yield t, psi
+    log.info(f"Time evolution done in {n_steps} Krylov steps")
+
+
+def link_expt_values(basis: Basis, link_values: np.ndarray, psi: np.ndarray) -> np.ndarray:
+    """
+    Expectation value of a single link operator diagonal in the irreps
+    (with value `link_values[j]` on irrep j) on every link
+    """
+    probs = np.abs(psi)**2
+    irreps_array = basis.irreps_array
+    return np.array([
+        np.bincount(link_irreps, weights=probs, minlength=len(link_values)) @ link_values
+        for link_irreps in irreps_array.T
+    ])
+
+
+def ground_state(H, seed: int | None = None) -> np.ndarray:
+    """Ground state of `H`"""
+    v0 = np.random.default_rng(seed).standard_normal(H.shape[0])
+    _, vecs = eigsh(H, k=1, which='SA', v0=v0)
+    return vecs[:, 0]
+
+
+def quench(
+        elec_hamil,
+        magn_hamil,
+        coupling: float,
+        times: Iterable[float],
+        psi0: np.ndarray | None = None,
+        initial_coupling: float | None = None,
+        basis: Basis | None = None,
+        link_energies: np.ndarray | None = None,
+        **kwargs
+    ) -> dict[str, np.ndarray]:
+    """
+    Evolve with (1-λ) H_E - λ H_B at λ = `coupling`, starting from `psi0`
+    or from the ground state at `initial_coupling`, and measure at `times`:
+    the norm, ⟨H_E⟩, ⟨H_B⟩ and, given the `basis` and the single link
+    energies per irrep (a row of `casimir_values`), the electric energy of
+    every link. Extra arguments go to `evolve`
+    """
+    if (psi0 is None) == (initial_coupling is None):
+        raise ValueError("give exactly one of psi0 and initial_coupling")
+    times = np.asarray(times, dtype=float)
+    if psi0 is None:
+        psi0 = ground_state(CoupledHamiltonian(elec_hamil, magn_hamil, initial_coupling))
+
+    H = CoupledHamiltonian(elec_hamil, magn_hamil, coupling)
+    if kwargs.get('method') == 'expm':
+        elec = sparse.diags(elec_hamil) if isinstance(elec_hamil, np.ndarray) else elec_hamil
+        H = sparse.csr_array((1 - coupling) * elec - coupling * magn_hamil)
+
+    n_times = len(times)
+    results = dict(
+        times = times,
+        norm = np.zeros(n_times),
+        expt_elec = np.zeros(n_times),
+        expt_magn = np.zeros(n_times)
+    )
+    if basis is not None and link_energies is not None:
+        results['link_elec'] = np.zeros((n_times, basis.irreps_array.shape[1]))
+    for n, (_, psi) in enumerate(evolve(H, psi0, times, **kwargs)):
+        results['norm'][n] = np.linalg.norm(psi)
+        results['expt_elec'][n] = expt_value(elec_hamil, psi)
+        results['expt_magn'][n] = expt_value(magn_hamil, psi)
+        if 'link_elec' in results:
+            results['link_elec'][n] = link_expt_values(basis, link_energies, psi)
+    return results
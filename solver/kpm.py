@@ -0,0 +1,208 @@
+"""
+Kernel polynomial method: Chebyshev moments of the Hamiltonian estimated
+with random vectors, for the density of states and thermal averages
+"""
+
+import logging as log
+import numpy as np
+from numpy.polynomial import chebyshev
+from scipy.sparse.linalg import eigsh
+from scipy.special import ive
+from tqdm import tqdm
+
+from .sweep import CoupledHamiltonian, _apply
+
+
+def spectral_bounds(
+        H,
+        margin: float = 0.01,
+        tol: float = 1e-4,
+        seed: int | None = None
+    ) -> tuple[float, float]:
+    """
+    Lowest and highest eigenvalue of `H`, computed to a loose tolerance and
+    widened by `margin` (relative to the bandwidth) on both sides
+    """
+    v0 = np.random.default_rng(seed).standard_normal(H.shape[0])
+    e_min = eigsh(H, k=1, which='SA', tol=tol, v0=v0, return_eigenvectors=False)[0]
+    e_max = eigsh(H, k=1, which='LA', tol=tol, v0=v0, return_eigenvectors=False)[0]
+    width = e_max - e_min
+    return e_min - margin * width, e_max + margin * width
+
+
+def rademacher(rng: np.random.Generator, n: int, n_vectors: int) -> np.ndarray:
+    """Random vectors with independent ±1 entries, as columns"""
+    return rng.integers(0, 2, size=(n, n_vectors)).astype(np.float64) * 2 - 1
+
+
+def chebyshev_moments(
+        H,
+        n_moments: int,
+        bounds: tuple[float, float],
+        observables: dict | None = None,
+        n_random: int = 16,
+        block_size: int = 16,
+        seed: int | None = None,
+        progress_bar: bool = False
+    ) -> dict[str, np.ndarray]:
+    """
+    Stochastic estimates of Tr[O T_n(H')] / dim for n < `n_moments`, with
+    H' = (H - center) / half_width mapping `bounds` onto [-1, 1].
+
+    The key 'identity' holds the moments of the density of states, the other
+    keys the ones of the `observables` (operators or diagonals, by name).
+    The trace is averaged over `n_random` Rademacher vectors, applied to H in
+    blocks of `block_size` columns, so the cost is n_moments * n_random
+    products with H
+    """
+    observables = observables or {}
+    n = H.shape[0]
+    e_min, e_max = bounds
+    center, half_width = (e_max + e_min) / 2, (e_max - e_min) / 2
+    moments = {name: np.zeros(n_moments) for name in ('identity', *observables)}
+    rng = np.random.default_rng(seed)
+
+    n_blocks = -(-n_random // block_size)
+    for block in tqdm(range(n_blocks), disable=not progress_bar):
+        size = min(block_size, n_random - block * block_size)
+        r = rademacher(rng, n, size)
+        left = {'identity': r}
+        left.update({name: _apply(O, r) for name, O in observables.items()})
+
+        # T_0 r = r, T_1 r = H' r, T_{n+1} r = 2 H' T_n r - T_{n-1} r
+        t_prev, t_curr = None, r
+        for m in range(n_moments):
+            if m == 1:
+                t_prev, t_curr = t_curr, (H @ t_curr - center * t_curr) / half_width
+            elif m > 1:
+                t_next = (H @ t_curr - center * t_curr) * (2 / half_width) - t_prev
+                t_prev, t_curr = t_curr, t_next
+            for name, l in left.items():
+                moments[name][m] += np.vdot(l, t_curr).real
+
+    for name in moments:
+        moments[name] /= n_random * n
+    return moments
+
+
+def jackson_kernel(n_moments: int) -> np.ndarray:
+    """Jackson damping factors, removing the Gibbs oscillations of the series"""
+    N = n_moments + 1
+    m = np.arange(n_moments)
+    return ((N - m) * np.cos(np.pi * m / N) + np.sin(np.pi * m / N) / np.tan(np.pi / N)) / N
+
+
+def density_of_states(
+        moments: np.ndarray,
+        bounds: tuple[float, float],
+        energies: np.ndarray | None = None,
+        n_points: int = 1000
+    ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Density of states, normalized to one, reconstructed from the moments
+    with the Jackson kernel. Returns (energies, dos)
+    """
+    e_min, e_max = bounds
+    center, half_width = (e_max + e_min) / 2, (e_max - e_min) / 2
+    if energies is None:
+        # Chebyshev nodes, dense where the series is most accurate
+        x = np.cos(np.pi * (np.arange(n_points) + 0.5) / n_points)[::-1]
+        energies = center + half_width * x
+    x = (np.asarray(energies) - center) / half_width
+    coeffs = jackson_kernel(len(moments)) * moments
+    coeffs[1:] *= 2
+    dos = chebyshev.chebval(x, coeffs) / (np.pi * np.sqrt(1 - x**2)) / half_width
+    return energies, dos
+
+
+def boltzmann_coefficients(
+        betas: np.ndarray,
+        n_moments: int,
+        bounds: tuple[float, float]
+    ) -> np.ndarray:
+    """
+    Chebyshev coefficients of exp(-β H), one row per β, up to a factor
+    exp(β (half_width - center)) that cancels in thermal averages
+    """
+    e_min, e_max = bounds
+    half_width = (e_max - e_min) / 2
+    m = np.arange(n_moments)
+    z = np.outer(betas, half_width * np.ones(n_moments))
+    # I_m(-z) = (-1)^m I_m(z), scaled by exp(-z) to avoid overflows
+    coeffs = (-1.0)**m * ive(m, z)
+    coeffs[:, 1:] *= 2
+    truncation = np.abs(coeffs[:, -1]) / np.abs(coeffs[:, 0])
+    if np.any(truncation > 1e-8):
+        log.warning(f"{n_moments} moments are not enough for β = {np.max(betas)}"
+                    f" (last coefficient {truncation.max():.1e})")
+    return coeffs
+
+
+def thermal_averages(
+        moments: dict[str, np.ndarray],
+        betas: np.ndarray,
+        bounds: tuple[float, float]
+    ) -> dict[str, np.ndarray]:
+    """
+    Thermal averages Tr[O exp(-βH)] / Tr[exp(-βH)] of every observable in
+    `moments`, one value per β
+    """
+    betas = np.atleast_1d(betas)
+    n_moments = len(moments['identity'])
+    coeffs = boltzmann_coefficients(betas, n_moments, bounds)
+    partition = coeffs @ moments['identity']
+    return {
+        name: coeffs @ mom / partition
+        for name, mom in moments.items() if name != 'identity'
+    }
+
+
+def kpm_over_range(
+        couplings: np.ndarray,
+        elec_hamil,
+        magn_hamil,
+        betas: np.ndarray,
+        n_moments: int = 256,
+        n_random: int = 16,
+        block_size: int = 16,
+        n_points: int = 1000,
+        seed: int | None = None,
+        progress_bar: bool = False
+    ) -> dict[str, np.ndarray]:
+    """
+    Density of states and thermal ⟨H_E⟩, ⟨H_B⟩, ⟨H⟩ of (1-λ) H_E - λ H_B,
+    for every coupling λ (rows) and inverse temperature β (columns).
+    The same random vectors are used for every coupling. The stochastic
+    error grows at low temperature, where few states dominate the trace:
+    there the ground state from `sweep` is the better tool
+    """
+    betas = np.atleast_1d(betas)
+    n_couplings = len(couplings)
+    results = dict(
+        couplings = np.asarray(couplings),
+        betas = betas,
+        bounds = np.zeros((n_couplings, 2)),
+        energies = np.zeros((n_couplings, n_points)),
+        dos = np.zeros((n_couplings, n_points)),
+        expt_elec = np.zeros((n_couplings, len(betas))),
+        expt_magn = np.zeros((n_couplings, len(betas))),
+        energy = np.zeros((n_couplings, len(betas)))
+    )
+    H = CoupledHamiltonian(elec_hamil, magn_hamil)
+    observables = dict(elec=elec_hamil, magn=magn_hamil)
+    for n, coupling in enumerate(tqdm(couplings, disable=not progress_bar)):
+        H.coupling = coupling
+        bounds = spectral_bounds(H, seed=seed)
+        moments = chebyshev_moments(
+            H, n_moments, bounds, observables, n_random=n_random,
+            block_size=block_size, seed=seed
+        )
+        energies, dos = density_of_states(moments['identity'], bounds, n_points=n_points)
+        averages = thermal_averages(moments, betas, bounds)
+        results['bounds'][n] = bounds
+        results['energies'][n] = energies
+        results['dos'][n] = dos
+        results['expt_elec'][n] = averages['elec']
+        results['expt_magn'][n] = averages['magn']
+        results['energy'][n] = (1 - coupling) * averages['elec'] - coupling * averages['magn']
+    return results
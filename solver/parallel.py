@@ -0,0 +1,191 @@
+"""
+Split a coupling sweep over worker processes sharing a single copy of
+the Hamiltonians through shared memory
+"""
+
+import os
+import logging as log
+import multiprocessing as mp
+import numpy as np
+import scipy.sparse as sparse
+from collections.abc import Iterator
+from multiprocessing import shared_memory
+
+from .sweep import sweep_results
+
+
+# environment variables read by the BLAS / OpenMP runtimes at import time
+THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+class SharedArrays:
+    """
+    Copies of named arrays in shared memory blocks. `specs` is picklable
+    and can be turned back into arrays in another process with `attach`
+    """
+    def __init__(self, arrays: dict[str, np.ndarray]):
+        self._blocks = []
+        self.specs = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        """Release and remove the shared memory blocks"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(specs: dict) -> tuple[dict[str, np.ndarray], list[shared_memory.SharedMemory]]:
+    """
+    Arrays backed by the shared memory blocks in `specs`, together with the
+    blocks, which must be kept alive while the arrays are in use
+    """
+    arrays, blocks = {}, []
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        blocks.append(block)
+    return arrays, blocks
+
+
+def hamiltonian_arrays(name: str, H) -> tuple[str, dict[str, np.ndarray]]:
+    """
+    Split a Hamiltonian into plain arrays: a diagonal ('diag') is kept as
+    is, a sparse matrix ('csr') is split into data, indices and indptr
+    """
+    if isinstance(H, np.ndarray) and H.ndim == 1:
+        return 'diag', {name: H}
+    if not sparse.issparse(H):
+        raise TypeError(f"{name} must be a sparse matrix or a diagonal, not {type(H).__name__}")
+    H = sparse.csr_array(H)
+    return 'csr', {
+        f'{name}.data': H.data, f'{name}.indices': H.indices, f'{name}.indptr': H.indptr
+    }
+
+
+def hamiltonian_from_arrays(name: str, kind: str, arrays: dict, shape: tuple[int, int]):
+    """Inverse of `hamiltonian_arrays`, without copying the arrays"""
+    if kind == 'diag':
+        return arrays[name]
+    return sparse.csr_array(
+        (arrays[f'{name}.data'], arrays[f'{name}.indices'], arrays[f'{name}.indptr']),
+        shape=shape, copy=False
+    )
+
+
+def _sweep_segment(args) -> tuple[int, dict[str, np.ndarray]]:
+    """Worker: attach to the shared Hamiltonians and sweep one segment"""
+    index, specs, kinds, shape, couplings, n_eigs, kwargs = args
+    arrays, blocks = attach(specs)
+    HE = hamiltonian_from_arrays('HE', kinds['HE'], arrays, shape)
+    HB = hamiltonian_from_arrays('HB', kinds['HB'], arrays, shape)
+    results = sweep_results(couplings, HE, HB, n_eigs, **kwargs)
+    # drop the views before closing the blocks they point to
+    del arrays, HE, HB
+    for block in blocks:
+        block.close()
+    return index, results
+
+
+def parallel_sweep_segments(
+        couplings: np.ndarray,
+        elec_hamil,
+        magn_hamil,
+        n_eigs: int,
+        n_workers: int | None = None,
+        threads_per_worker: int = 1,
+        n_segments: int | None = None,
+        seed: int | None = None,
+        **kwargs
+    ) -> Iterator[tuple[int, np.ndarray, dict[str, np.ndarray]]]:
+    """
+    Split the couplings into `n_segments` contiguous segments (by default
+    one per worker), each one warm-started within itself, and sweep them
+    with `n_workers` processes running `threads_per_worker` BLAS threads.
+    Yields `(index, couplings, results)` for every segment as soon as it is
+    done, in order of completion, with the results as in `sweep_results`
+    (nothing for an empty grid).
+
+    H_E and H_B (sparse matrices or diagonals) are placed once in shared
+    memory; the workers are spawned, so the calling script must be guarded
+    by `if __name__ == '__main__'`
+    """
+    couplings = np.asarray(couplings)
+    if len(couplings) == 0:
+        return
+    if n_workers is None:
+        n_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    n_segments = min(n_segments or n_workers, len(couplings))
+    segments = [seg for seg in np.array_split(couplings, n_segments) if len(seg)]
+    seeds = np.random.SeedSequence(seed).spawn(len(segments))
+
+    kinds, arrays = {}, {}
+    for name, H in (('HE', elec_hamil), ('HB', magn_hamil)):
+        kinds[name], H_arrays = hamiltonian_arrays(name, H)
+        arrays.update(H_arrays)
+    shape = magn_hamil.shape
+
+    n_workers = min(n_workers, len(segments))
+    log.info(f"Sweeping {len(couplings)} couplings in {len(segments)} segments"
+             f" on {n_workers} workers x {threads_per_worker} threads")
+    with SharedArrays(arrays) as shared:
+        tasks = [
+            (index, shared.specs, kinds, shape, segment, n_eigs, dict(kwargs, seed=seg_seed))
+            for index, (segment, seg_seed) in enumerate(zip(segments, seeds))
+        ]
+        # the thread limits are read by the workers when they import numpy
+        saved = {var: os.environ.get(var) for var in THREAD_VARS}
+        os.environ.update({var: str(threads_per_worker) for var in THREAD_VARS})
+        try:
+            pool = mp.get_context('spawn').Pool(n_workers)
+        finally:
+            for var, value in saved.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+        with pool:
+            for index, results in pool.imap_unordered(_sweep_segment, tasks):
+                yield index, segments[index], results
+            # let the workers exit cleanly before the pool terminates them
+            pool.close()
+            pool.join()
+
+
+def parallel_sweep(
+        couplings: np.ndarray,
+        elec_hamil,
+        magn_hamil,
+        n_eigs: int,
+        n_workers: int | None = None,
+        threads_per_worker: int = 1,
+        seed: int | None = None,
+        **kwargs
+    ) -> dict[str, np.ndarray]:
+    """
+    Same results as `sweep_results`, with the couplings split into
+    contiguous segments solved in parallel (see `parallel_sweep_segments`,
+    keyword arguments are passed to it)
+    """
+    if len(couplings) == 0:
+        # no segments, the same empty arrays as the serial sweep
+        return sweep_results(couplings, elec_hamil, magn_hamil, n_eigs)
+    parts = dict()
+    for index, _, results in parallel_sweep_segments(
+            couplings, elec_hamil, magn_hamil, n_eigs, n_workers=n_workers,
+            threads_per_worker=threads_per_worker, seed=seed, **kwargs
+        ):
+        parts[index] = results
+    parts = [parts[index] for index in sorted(parts)]
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
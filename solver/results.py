@@ -0,0 +1,224 @@
+"""
+Append-only storage for the results of coupling sweeps: one JSON record
+per coupling and the ground states in a raw binary file, both written as
+soon as each coupling is done, so an interrupted sweep can be resumed
+"""
+
+import json
+import logging as log
+import os
+import numpy as np
+from collections.abc import Iterable
+from tqdm import tqdm
+
+from .sweep import sweep, expt_value
+from .parallel import parallel_sweep_segments
+
+
+class ResultsStore:
+    """
+    Directory with `meta.json` (shape and dtype of the results),
+    `records.jsonl` (coupling, energies and expectation values, one line per
+    coupling) and `ground_states.bin` (one row of `n_states` numbers per record,
+    in the same order). Reopening an existing directory resumes it: a
+    truncated last record or ground state from a crash is discarded
+    """
+    META = 'meta.json'
+    RECORDS = 'records.jsonl'
+    GROUND_STATES = 'ground_states.bin'
+
+    def __init__(
+            self,
+            root: str,
+            n_states: int,
+            n_eigs: int,
+            dtype: str = 'float64',
+            description: dict | None = None
+        ):
+        """
+        `dtype` of the stored ground states, the one of the Hamiltonian or its
+        single precision version (see `single_precision`) to halve their size.
+        `description` is any JSON data identifying the run (e.g. the
+        generating set), it must match when resuming
+        """
+        self.root = root
+        self.meta = dict(
+            n_states=n_states, n_eigs=n_eigs, dtype=np.dtype(dtype).name,
+            description=description or {}
+        )
+        os.makedirs(root, exist_ok=True)
+        meta_path = self._path(self.META)
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                stored = json.load(file)
+            if stored != self.meta:
+                raise ValueError(f"{root} holds results of a different run: {stored}")
+        else:
+            with open(meta_path, 'w') as file:
+                json.dump(self.meta, file)
+        self.dtype = np.dtype(self.meta['dtype'])
+        self._row_bytes = n_states * self.dtype.itemsize
+        self.records = self._recover()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _recover(self) -> list[dict]:
+        """Read the complete records, dropping what was written after the last one"""
+        records, valid_bytes = [], 0
+        path = self._path(self.RECORDS)
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    records.append(json.loads(line))
+                    valid_bytes += len(line)
+            os.truncate(path, valid_bytes)
+        gs_path = self._path(self.GROUND_STATES)
+        gs_bytes = len(records) * self._row_bytes
+        if os.path.exists(gs_path):
+            if os.path.getsize(gs_path) < gs_bytes:
+                raise ValueError(f"{gs_path} is shorter than the records")
+            os.truncate(gs_path, gs_bytes)
+        if records:
+            log.info(f"Resuming {self.root} with {len(records)} couplings done")
+        return records
+
+    def __len__(self):
+        return len(self.records)
+
+    def done(self) -> set[float]:
+        """Couplings already stored"""
+        return {record['coupling'] for record in self.records}
+
+    def append(
+            self,
+            coupling: float,
+            energies: np.ndarray,
+            ground_state: np.ndarray,
+            expt_elec: float,
+            expt_magn: float
+        ):
+        """
+        Store the results of one coupling. The ground state is written and
+        flushed before its record, so a record always has its ground state
+        """
+        ground_state = np.asarray(ground_state)
+        if not np.can_cast(ground_state.dtype, self.dtype, casting='same_kind'):
+            raise TypeError(f"cannot store a {ground_state.dtype} ground state as {self.dtype}")
+        with open(self._path(self.GROUND_STATES), 'ab') as file:
+            file.write(np.asarray(ground_state, dtype=self.dtype).tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        record = dict(
+            coupling=float(coupling), energies=[float(e) for e in energies],
+            expt_elec=float(expt_elec), expt_magn=float(expt_magn)
+        )
+        with open(self._path(self.RECORDS), 'a') as file:
+            file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.records.append(record)
+
+    def extend(self, couplings: Iterable[float], results: dict[str, np.ndarray]):
+        """Store the results of several couplings, in the layout of `sweep_results`"""
+        for n, coupling in enumerate(couplings):
+            self.append(
+                coupling, results['energies'][n], results['ground_states'][n],
+                results['expt_elec'][n], results['expt_magn'][n]
+            )
+
+    def ground_states(self) -> np.ndarray:
+        """Stored ground states, memory-mapped read-only, one row per record"""
+        if not self.records:
+            return np.zeros((0, self.meta['n_states']), dtype=self.dtype)
+        return np.memmap(
+            self._path(self.GROUND_STATES), dtype=self.dtype, mode='r',
+            shape=(len(self.records), self.meta['n_states'])
+        )
+
+    def load(self) -> dict[str, np.ndarray]:
+        """
+        Results in the layout of `sweep_results` (plus the couplings),
+        sorted by coupling, with the ground states memory-mapped
+        """
+        order = np.argsort([record['coupling'] for record in self.records], kind='stable')
+        records = [self.records[n] for n in order]
+        gs = self.ground_states()
+        return dict(
+            couplings = np.array([r['coupling'] for r in records]),
+            energies = np.array([r['energies'] for r in records]).reshape(-1, self.meta['n_eigs']),
+            expt_elec = np.array([r['expt_elec'] for r in records]),
+            expt_magn = np.array([r['expt_magn'] for r in records]),
+            ground_states = gs[order] if np.any(order != np.arange(len(order))) else gs
+        )
+
+    def to_npz(self, path: str):
+        """Export all the results in a single compressed .npz file"""
+        np.savez_compressed(path, **self.load())
+
+
+def single_precision(dtype) -> np.dtype:
+    """Single precision version of a real or complex dtype ('float32' or 'complex64')"""
+    return np.dtype(np.complex64 if np.issubdtype(dtype, np.complexfloating) else np.float32)
+
+
+def _todo(store: ResultsStore, couplings: Iterable[float]) -> list[float]:
+    """Couplings not yet in `store`"""
+    couplings = list(couplings)
+    done = store.done()
+    todo = [c for c in couplings if float(c) not in done]
+    if len(todo) < len(couplings):
+        log.info(f"Skipping {len(couplings) - len(todo)} couplings already in {store.root}")
+    return todo
+
+
+def sweep_to_store(
+        store: ResultsStore,
+        couplings: Iterable[float],
+        elec_hamil,
+        magn_hamil,
+        n_eigs: int,
+        progress_bar: bool = False,
+        **kwargs
+    ) -> ResultsStore:
+    """
+    Run `sweep` over the couplings not yet in `store`, appending the
+    results of each one as soon as it is computed
+    """
+    todo = _todo(store, couplings)
+    eigs = sweep(todo, elec_hamil, magn_hamil, n_eigs, **kwargs)
+    for coupling, energies, eigvecs in tqdm(eigs, total=len(todo), disable=not progress_bar):
+        gs = eigvecs[:, 0]
+        store.append(
+            coupling, energies, gs,
+            expt_value(elec_hamil, gs), expt_value(magn_hamil, gs)
+        )
+    return store
+
+
+def parallel_sweep_to_store(
+        store: ResultsStore,
+        couplings: Iterable[float],
+        elec_hamil,
+        magn_hamil,
+        n_eigs: int,
+        progress_bar: bool = False,
+        **kwargs
+    ) -> ResultsStore:
+    """
+    Run `parallel_sweep_segments` over the couplings not yet in `store`,
+    appending the results of each segment as soon as it is done: more
+    segments than workers lose less work on a crash and keep fewer
+    ground states in memory
+    """
+    todo = _todo(store, couplings)
+    if not todo:
+        return store
+    segments = parallel_sweep_segments(todo, elec_hamil, magn_hamil, n_eigs, **kwargs)
+    with tqdm(total=len(todo), disable=not progress_bar) as bar:
+        for _, segment, results in segments:
+            store.extend(segment, results)
+            bar.update(len(segment))
+    return store
@@ -0,0 +1,161 @@
+"""
+Sweep the coupling of H(λ) = (1-λ) H_E - λ H_B, starting the eigensolver
+at each coupling from the eigenvectors of the previous one
+"""
+
+import numpy as np
+from collections.abc import Iterable, Iterator
+from scipy.sparse.linalg import LinearOperator, eigsh, lobpcg
+from tqdm import tqdm
+
+
+def _apply(M, X: np.ndarray) -> np.ndarray:
+    """Apply `M` to `X`, with `M` either an operator or a 1-D diagonal"""
+    if isinstance(M, np.ndarray) and M.ndim == 1:
+        return M.reshape((-1,) + (1,) * (X.ndim - 1)) * X
+    return M @ X
+
+
+def expt_value(matrix, vector: np.ndarray) -> float:
+    """Expectation value of `matrix` (operator or diagonal) on `vector`"""
+    return np.real(np.vdot(vector, _apply(matrix, vector)))
+
+
+class CoupledHamiltonian(LinearOperator):
+    """
+    (1-λ) H_E - λ H_B applied on the fly, without building a new matrix
+    for every coupling. H_E and H_B can be sparse matrices, linear operators
+    or (for a diagonal Hamiltonian) 1-D arrays
+    """
+    def __init__(self, elec_hamil, magn_hamil, coupling: float = 0.0):
+        self.elec_hamil = elec_hamil
+        self.magn_hamil = magn_hamil
+        self.coupling = coupling
+        dtype = np.result_type(elec_hamil.dtype, magn_hamil.dtype)
+        super().__init__(dtype, magn_hamil.shape)
+
+    def _matmat(self, X):
+        c = self.coupling
+        out = _apply(self.magn_hamil, X)
+        out *= -c
+        out += (1 - c) * _apply(self.elec_hamil, X)
+        return out
+
+    def _matvec(self, x):
+        return self._matmat(x)
+
+    def _adjoint(self):
+        return self
+
+
+def random_vectors(rng: np.random.Generator, shape, dtype=np.float64) -> np.ndarray:
+    """Gaussian random array, with a random imaginary part too if `dtype` is complex"""
+    X = rng.standard_normal(shape)
+    if np.issubdtype(dtype, np.complexfloating):
+        X = X + 1j * rng.standard_normal(shape)
+    return X
+
+
+def warm_start(
+        eigvecs: np.ndarray | None,
+        n: int,
+        rng: np.random.Generator,
+        noise: float,
+        dtype=np.float64
+    ) -> np.ndarray:
+    """
+    Starting vector for ARPACK, of the `dtype` of the Hamiltonian: the sum of
+    the previous eigenvectors plus a small random part, so that symmetry
+    sectors absent from the previous eigenvectors are still reachable
+    """
+    v0 = random_vectors(rng, n, dtype)
+    if eigvecs is None:
+        return v0
+    v0 *= noise / np.sqrt(n)
+    v0 += eigvecs.sum(axis=1)
+    return v0
+
+
+def sweep(
+        couplings: Iterable[float],
+        elec_hamil,
+        magn_hamil,
+        n_eigs: int,
+        method: str = 'eigsh',
+        tol: float = 0,
+        maxiter: int | None = None,
+        ncv: int | None = None,
+        n_guard: int | None = None,
+        noise: float = 1e-2,
+        seed: int | None = None
+    ) -> Iterator[tuple[float, np.ndarray, np.ndarray]]:
+    """
+    Lowest `n_eigs` eigenpairs of (1-λ) H_E - λ H_B for every coupling λ,
+    in the given order. Yields (coupling, energies, eigvecs), with the
+    eigenvectors as columns of `eigvecs`.
+
+    `method` is 'eigsh' (ARPACK, started from the previous eigenvectors,
+    with `ncv` Lanczos vectors, by default 3*n_eigs) or 'lobpcg' (started
+    from the previous block of eigenvectors, with `n_guard` extra vectors
+    to follow the levels crossing from above)
+    """
+    if method not in ('eigsh', 'lobpcg'):
+        raise ValueError(f"unknown method {method!r}")
+    H = CoupledHamiltonian(elec_hamil, magn_hamil)
+    n = H.shape[0]
+    if ncv is None:
+        ncv = min(n, max(2 * n_eigs + 1, 3 * n_eigs))
+    if n_guard is None:
+        n_guard = max(2, n_eigs // 4)
+    rng = np.random.default_rng(seed)
+    eigvecs = None
+    for coupling in couplings:
+        H.coupling = coupling
+        if method == 'eigsh':
+            v0 = warm_start(eigvecs, n, rng, noise, H.dtype)
+            energies, eigvecs = eigsh(
+                H, k=n_eigs, which='SA', v0=v0, ncv=ncv, tol=tol, maxiter=maxiter
+            )
+        else:
+            X = random_vectors(rng, (n, n_eigs + n_guard), H.dtype)
+            if eigvecs is not None:
+                X *= noise / np.sqrt(n)
+                X += eigvecs
+            energies, eigvecs = lobpcg(
+                H, X, largest=False, tol=tol or None, maxiter=maxiter or 200
+            )
+        order = np.argsort(energies)
+        energies, eigvecs = energies[order], eigvecs[:, order]
+        yield coupling, energies[:n_eigs], eigvecs[:, :n_eigs]
+
+
+def sweep_results(
+        couplings: np.ndarray,
+        elec_hamil,
+        magn_hamil,
+        n_eigs: int,
+        progress_bar: bool = False,
+        **kwargs
+    ) -> dict[str, np.ndarray]:
+    """
+    Run `sweep` and collect, for every coupling, the lowest energies, the
+    ground state (of the dtype of the Hamiltonian) and the expectation
+    values of H_E and H_B on it
+    """
+    n_couplings = len(couplings)
+    results = dict(
+        energies = np.zeros((n_couplings, n_eigs)),
+        expt_elec = np.zeros(n_couplings),
+        expt_magn = np.zeros(n_couplings),
+        ground_states = np.zeros(
+            (n_couplings, magn_hamil.shape[0]), dtype=np.result_type(elec_hamil.dtype, magn_hamil.dtype)
+        )
+    )
+    eigs = sweep(couplings, elec_hamil, magn_hamil, n_eigs, **kwargs)
+    for n, (_, energies, eigvecs) in enumerate(tqdm(eigs, total=n_couplings, disable=not progress_bar)):
+        gs = eigvecs[:, 0]
+        results['energies'][n] = energies
+        results['ground_states'][n] = gs
+        results['expt_elec'][n] = expt_value(elec_hamil, gs)
+        results['expt_magn'][n] = expt_value(magn_hamil, gs)
+    return results
@@ -1,170 +1,192 @@
-# Set number of threads to use (before loading numpy and scipy)
+# Worker processes for the coupling sweeps and BLAS threads of each process.
+# The threads have to be set before loading numpy and scipy, the spawned
+# workers get their own value from `parallel_sweep`
+n_workers = 1
+threads_per_worker = 48
+# segments of the coupling grid for the workers, each one is stored as soon as it is done
+n_segments = 4 * n_workers
+
 import os
-os.environ['OMP_NUM_THREADS'] = '48'
+os.environ.setdefault('OMP_NUM_THREADS', str(threads_per_worker))
 
 import numpy as np
-from scipy.sparse.linalg import eigsh
 
 from group import DihGroup, DihIrreps
-from basis import Basis
-from hamiltonian import elec_hamiltonian
-from tests.lattice_2x2 import vertices, nlinks
-from utils.utils import unpickle
+from hamiltonian import elec_diagonals, MagneticOperator
+from solver import ResultsStore, sweep_to_store, parallel_sweep_to_store, single_precision
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+from utils.cache import ArtifactCache
+from cache import cached_basis, cached_plaquette_mels, cached_magnetic_hamiltonian
 
 group = DihGroup(4)
 irreps = DihIrreps(group.N)
-
-print(f'> Group: {group}')
-print(f'> Irreps: {irreps}')
-print("> Computing physical Hilbert space")
-basis = Basis(group, irreps, vertices, nlinks)
-print(f"\ttotal number of states: {len(basis.states)}")
+magn_irrep = 4
+# apply the magnetic Hamiltonian on the fly instead of storing it
+# (only with n_workers = 1, the operator cannot be shared between processes)
+matrix_free = False
+# store the ground states in single precision (half the disk space)
+gs_single_precision = False
 
 #------------------------------------------------------------
 # Helpful methods
 #------------------------------------------------------------
 
-def expt_value(matrix, vector):
-    """Compute expectation value given vector and matrix"""
-    return vector @ matrix @ vector
-
-
-def eigstates(coupling, elec_hamil, magn_hamil, n_eigs):
-    """Compute eigenvalues and eigenvectors for a given coupling"""
-    print(f'\tλ = {coupling:.5f}\t', end='')
-    H = (1 - coupling) * elec_hamil - coupling * magn_hamil
-    energies, vecs = eigsh(H, k=n_eigs, which='SA')
-    eigvecs = [vec.ravel() for vec in vecs.T]
-    return energies, eigvecs
-
-
-def eigstates_over_range(coupling_range, elec_hamil, magn_hamil, n_eigs):
-    """Compute eigenvalues and eigenvectors over a range of couplings"""
-    n_couplings = len(coupling_range)
-    results = dict(
-        energies = np.zeros((n_couplings, n_eigs)),
-        expt_elec = np.zeros(n_couplings),
-        expt_magn = np.zeros(n_couplings),
-        ground_states = np.zeros((n_couplings, elec_hamil.shape[0]))
-    )
+def eigstates_over_range(store, coupling_range, elec_hamil, magn_hamil, n_eigs, **kwargs):
+    """
+    Compute eigenvalues and eigenvectors over a range of couplings,
+    each coupling warm-started from the previous one. The results are
+    appended to `store`, skipping the couplings it already has
+    """
     print('\n>> Computing eigenvalues and eigenvectors\n')
-    for n, coupling in enumerate(coupling_range):
-        energies, eigvecs = eigstates(coupling, elec_hamil, magn_hamil, n_eigs)
-        gs = eigvecs[0]
-        results['energies'][n, :] = energies
+    if n_workers > 1:
+        parallel_sweep_to_store(
+            store, coupling_range, elec_hamil, magn_hamil, n_eigs, progress_bar=True,
+            n_workers=n_workers, threads_per_worker=threads_per_worker, n_segments=n_segments, **kwargs
+        )
+    else:
+        sweep_to_store(
+            store, coupling_range, elec_hamil, magn_hamil, n_eigs, progress_bar=True, **kwargs
+        )
+    results = store.load()
+    for n, coupling in enumerate(results['couplings']):
+        print(f'\tλ = {coupling:.5f}\t', end='')
         print(f'E0 = {results["energies"][n, 0]:.5f}\t', end='')
-        results['ground_states'][n] = gs
-        results['expt_elec'][n] = expt_value(elec_hamil, gs)
-        results['expt_magn'][n] = expt_value(magn_hamil, gs)
         print(f'<H_E> = {results["expt_elec"][n]:.5f} \t', end='')
         print(f'<H_B> = {results["expt_magn"][n]:.5f}')
     print()
     return results
 
 
-def save_results(results: dict, name: str):
-    """Save results in a .npz format"""
+def load_elec_hamiltonians(basis, irreps, gen_sets):
+    """
+    Load the electric hamiltonians for all the given generating sets,
+    as their diagonals
+    """
+    print('> Computing Electric Hamiltonians')
+    elec_hamils = elec_diagonals(basis, gen_sets, irreps)
+    print('> loaded')
+    print(f'\t{len(elec_hamils)} diagonals of length {elec_hamils.shape[1]}')
+    return elec_hamils
+
+
+def compute(HE, HB, couplings, n_eigs, name):
+    """
+    Compute, storing each coupling in the directory `name` as soon as it is
+    done (rerunning resumes from there), then export to `name`.npz
+    """
+    gs_dtype = np.result_type(HE.dtype, HB.dtype)
+    if gs_single_precision:
+        gs_dtype = single_precision(gs_dtype)
+    store = ResultsStore(name, n_states=HB.shape[0], n_eigs=n_eigs, dtype=gs_dtype,
+                         description=dict(name=name))
+    eigstates_over_range(store, couplings, HE, HB, n_eigs)
     print(f'Saving for "{name}"')
-    np.savez_compressed(name, **results)
+    store.to_npz(name)
+    print()
 
 
-def load_elec_hamiltonian(basis, irreps, gen_set):
-    """Load the electric hamiltonian for the given generating set"""
-    print('> Computing Electric Hamiltonian')
-    elec_hamil = elec_hamiltonian(basis, gen_set, irreps, progress_bar=True).tocsc()
-    print('> loaded')
-    print(f'\t{repr(elec_hamil)}')
-    return elec_hamil
+# The sweep workers are spawned and re-import this module,
+# so the computation only runs in the main process
+if __name__ == '__main__':
 
+    cache = ArtifactCache()
 
-def compute(gen_set, couplings, n_eigs, name):
-    """Compute and then save"""
-    HE = load_elec_hamiltonian(basis, irreps, gen_set)
-    results = eigstates_over_range(couplings, HE, HB, n_eigs)
-    results['couplings'] = couplings
-    save_results(results, name)
-    print()
+    print(f'> Group: {group}')
+    print(f'> Irreps: {irreps}')
+    print("> Computing physical Hilbert space")
+    basis = cached_basis(group, irreps, vertices, nlinks, cache=cache)
+    print(f"\ttotal number of states: {len(basis.states)}")
 
+    #------------------------------------------------------------
+    # Useful objects
+    #------------------------------------------------------------
 
-#------------------------------------------------------------
-# Useful objects
-#------------------------------------------------------------
+    ## Common objects for the three classes of electric Hamiltonians
+    # couplings = np.linspace(0, 1, 3) # testing case
 
-## Common objects for the three classes of electric Hamiltonians
-# couplings = np.linspace(0, 1, 3) # testing case
+    # Electric and magnetic hamiltonian are built directly as compressed sparse matrices
 
-# Load electric and magnetic hamiltonian as dok (dict of keys) sparse matrices
-# and convert them to compressed sparse column
+    # Magnetic Hamiltonian
+    print('> Loading Magnetic Hamiltonian')
+    plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep, cache=cache)
+    if matrix_free:
+        HB = MagneticOperator(basis, plaqs_vertices, plaq_mels)
+    else:
+        HB = cached_magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels, cache=cache)
+    print('\tloaded')
+    print(f'\t{repr(HB)}')
+    print()
 
-# Magnetic Hamiltonian
-print('> Loading Magnetic Hamiltonian')
-HB_dok = unpickle("pickled/magn_hamiltonian_D4_2x2.old.pkl") # old but correct Hamiltonian
-HB = HB_dok.todense()
-print('\tloaded')
-print(f'\t{repr(HB)}')
-print()
+    # number of energy levels
+    # num_eigs = 24
 
-# number of energy levels
-# num_eigs = 24
+    # Group generators
+    r = group.r
+    s = group.s
 
-# Group generators
-r = group.r
-s = group.s
+    # Generating sets of the three electric Hamiltonians
+    gen_set_NR = {r, ~r, s, r*r*s}
+    gen_set_R = {r, ~r, s, r*s, r*r*s, r*r*r*s}
+    gen_set_D = {r, r*r, r*r*r}
 
-# printing options
-np.set_printoptions(precision=6, linewidth=120)
+    # Electric Hamiltonians, all diagonals in one pass over the basis
+    HE_NR, HE_R, HE_D = load_elec_hamiltonians(basis, irreps, [gen_set_NR, gen_set_R, gen_set_D])
+    print()
 
+    # printing options
+    np.set_printoptions(precision=6, linewidth=120)
+
+
+    #------------------------------------------------------------
+    # Main computation
+    #------------------------------------------------------------
+
+    print('----------------------------------------')
+    print(' Non-relativistic case')
+    print('----------------------------------------')
+    couplings_NR = np.concatenate((
+                      np.linspace(0, 0.6, 61)[:-1],
+                      np.linspace(0.6, 0.8, 101),
+                      np.linspace(0.8, 1, 21)[1:]
+                  ))
+    compute(
+        HE=HE_NR,
+        HB=HB,
+        couplings=couplings_NR,
+        n_eigs=10,
+        name='results_NR'
+    )
 
-#------------------------------------------------------------
-# Main computation
-#------------------------------------------------------------
 
-print('----------------------------------------')
-print(' Non-relativistic case')
-print('----------------------------------------')
-gen_set_NR = {r, ~r, s, r*r*s}
-couplings_NR = np.concatenate((
-                  np.linspace(0, 0.6, 61)[:-1],
-                  np.linspace(0.6, 0.8, 101),
-                  np.linspace(0.8, 1, 21)[1:]
-              ))
-compute(
-    gen_set=gen_set_NR,
-    couplings=couplings_NR,
-    n_eigs=10,
-    name='results_NR'
-)
-
-
-print('----------------------------------------')
-print(' Relativistic case')
-print('----------------------------------------')
-gen_set_R = {r, ~r, s, r*s, r*r*s, r*r*r*s}
-couplings_R = np.concatenate((
-                  np.linspace(0, 0.65, 66)[:-1],
-                  np.linspace(0.65, 0.85, 101),
-                  np.linspace(0.85, 1, 16)[1:]
-              ))
-compute(
-    gen_set=gen_set_R,
-    couplings=couplings_R,
-    n_eigs=10,
-    name='results_R'
-)
-
-
-print('----------------------------------------')
-print(' Degenerate case')
-print('----------------------------------------')
-gen_set_D = {r, r*r, r*r*r}
-couplings_D = np.concatenate((
-                  np.linspace(0, 0.5, 51)[:-1],
-                  np.linspace(0.5, 0.8, 151),
-                  np.linspace(0.8, 1, 21)[1:]
-              ))
-compute(
-    gen_set=gen_set_D,
-    couplings=couplings_D,
-    n_eigs=40,
-    name='results_D'
-)
+    print('----------------------------------------')
+    print(' Relativistic case')
+    print('----------------------------------------')
+    couplings_R = np.concatenate((
+                      np.linspace(0, 0.65, 66)[:-1],
+                      np.linspace(0.65, 0.85, 101),
+                      np.linspace(0.85, 1, 16)[1:]
+                  ))
+    compute(
+        HE=HE_R,
+        HB=HB,
+        couplings=couplings_R,
+        n_eigs=10,
+        name='results_R'
+    )
+
+
+    print('----------------------------------------')
+    print(' Degenerate case')
+    print('----------------------------------------')
+    couplings_D = np.concatenate((
+                      np.linspace(0, 0.5, 51)[:-1],
+                      np.linspace(0.5, 0.8, 151),
+                      np.linspace(0.8, 1, 21)[1:]
+                  ))
+    compute(
+        HE=HE_D,
+        HB=HB,
+        couplings=couplings_D,
+        n_eigs=40,
+        name='results_D'
+    )
@@ -2,9 +2,12 @@ import sys
 if '..' not in sys.path:
     sys.path.append('..')
 
+import numpy as np
+
 from group import DihGroup, DihIrreps
-from basis.basis import Basis
-from tests.lattice_2x2 import vertices, nlinks
+from basis.basis import Basis, vertex_basis
+from tests.lattice_2x2 import vertices, nlinks, plaqs_vertices
+from utils.lattice import plaquette_translation, square_lattice
 
 group = DihGroup(4)
 irreps = DihIrreps(group.N)
@@ -22,3 +25,29 @@ expected_num_states = sum(
 print(f'> Total number of expectect physical states: {expected_num_states}')
 
 print(f'> Equal? {len(basis.states) == expected_num_states}')
+
+print("> Computing physical Hilbert space (vertex basis from the projectors)")
+vbasis = vertex_basis(group, irreps, method='projector')
+basis_proj = Basis(group, irreps, vertices, nlinks, vbasis=vbasis)
+print(f'> Total number of physical states: {len(basis_proj.states)}')
+print(f'> Same states? {basis_proj.states == basis.states}')
+
+print("> Packed states")
+print(f'> Packed array: {basis.state_array.shape}, {basis.state_array.dtype}')
+print(f'> index_of consistent? {all(basis.index_of(s) == n for n, s in enumerate(basis.states))}')
+
+print("> Lattice translations")
+for p_vertices in plaqs_vertices:
+    vertex_perm, link_perm = plaquette_translation(vertices, plaqs_vertices[0], p_vertices)
+    translated = basis.state_array.copy()
+    translated[:, link_perm] = basis.state_array[:, :nlinks]
+    translated[:, nlinks + np.array(vertex_perm)] = basis.state_array[:, nlinks:]
+    perm = basis.indices_of(translated)
+    print(f'> Plaquette {p_vertices}: basis invariant? {np.array_equal(np.sort(perm), np.arange(len(basis)))}')
+
+print("> Lattices one vertex wide (a link on two legs of the same vertex)")
+for nx, ny in ((1, 2), (1, 3)):
+    lattice_vertices, _, lattice_nlinks = square_lattice(nx, ny)
+    lattice_basis = Basis(group, irreps, lattice_vertices, lattice_nlinks)
+    expected = sum((len(group)/len(C))**len(lattice_vertices) for C in group.conj_classes())
+    print(f'> {nx}x{ny}: {len(lattice_basis.states) == expected}')
@@ -0,0 +1,49 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import os
+import tempfile
+
+from group import DihGroup, DihIrreps
+from utils.cache import ArtifactCache, group_key, irreps_key
+from cache import cached_basis, BASIS_MODULES
+from tests.lattice_2x2 import vertices, nlinks
+
+group = DihGroup(3)
+irreps = DihIrreps(group.N)
+
+# temporary cache, not to write in the user one
+with tempfile.TemporaryDirectory() as root:
+    cache = ArtifactCache(root)
+
+    print('> Miss, then hit')
+    calls = []
+    compute = lambda: calls.append(1) or [1, 2, 3]
+    first = cache.get_or_compute('test', compute, n=1)
+    second = cache.get_or_compute('test', compute, n=1)
+    print(f'\tcomputed once: {len(calls) == 1 and first == second}')
+
+    basis = cached_basis(group, irreps, vertices, nlinks, cache=cache)
+    cached = cached_basis(group, irreps, vertices, nlinks, cache=cache)
+    print(f'\tsame basis: {cached.states == basis.states}')
+
+    print('> Keys')
+    real = cache.key('basis', BASIS_MODULES, **group_key(group), **irreps_key(group, irreps))
+    complex_irreps = DihIrreps(group.N, complex=True)
+    cplx = cache.key('basis', BASIS_MODULES, **group_key(group), **irreps_key(group, complex_irreps))
+    print(f'\treal and complex irreps differ: {real != cplx}')
+    other = cache.key('basis', ('utils.lattice',), **group_key(group), **irreps_key(group, irreps))
+    print(f'\tdepends on the source modules: {real != other}')
+
+with tempfile.TemporaryDirectory() as root:
+    print('> Eviction')
+    cache = ArtifactCache(root, max_bytes=3000)
+    cache.put(cache.key('test', n=1), bytes(2000))
+    os.utime(cache.path(cache.key('test', n=1)), (0, 0))
+    cache.put(cache.key('test', n=2), bytes(2000))
+    print(f'\tolder entry evicted: {cache.key("test", n=1) not in cache}')
+    print(f'\tnew entry kept: {cache.key("test", n=2) in cache}')
+    # an entry larger than the whole cache is kept until the next one
+    cache.put(cache.key('test', n=3), bytes(4000))
+    print(f'\tlarge entry kept: {cache.key("test", n=3) in cache and cache.key("test", n=2) not in cache}')
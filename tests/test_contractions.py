@@ -2,12 +2,14 @@ import sys
 if '..' not in sys.path:
     sys.path.append('..')
 
+import tempfile
+import numpy as np
 from itertools import chain
 from group import DihGroup, DihIrreps
 from basis import Basis, State
 from lattice_2x2 import vertices, nlinks, plaqs_vertices
 from hamiltonian.plaquette import get_plaq_links
-from basis.contractions import tensor_around_plaq
+from basis.contractions import tensor_around_plaq, compose_inv_tensors
 
 def compare(statement, message):
     print(f'> {message}:  ', end='')
@@ -50,6 +52,54 @@ for ket, shapes in zip(kets, kets_shapes):
         tensor = tensor_around_plaq(basis, ket, plaquette)
         expect_tensor_shape = tuple(chain.from_iterable(shapes[v] for v in plaquette))
         compare(tensor.shape == expect_tensor_shape, f"Comparing shapes for plaquette n. {n}")
+        expect_tensor = np.einsum(
+            'abcd,efgh,ijkl,mnop->abcdefghijklmnop',
+            *(basis(ket)[v] for v in plaquette)
+        )
+        compare(np.allclose(tensor, expect_tensor), f"Comparing entries for plaquette n. {n}")
     print()
 
+# Product of two vertex tensors: the axes of the first one come first,
+# not interleaved with the ones of the second as with np.kron
+print('>> Composing two vertex tensors')
+for ket in (ket_medium2, ket_hard):
+    psi0, psi1 = basis(ket)[0], basis(ket)[1]
+    expect_tensor = np.einsum('abcd,efgh->abcdefgh', psi0, psi1)
+    compare(np.array_equal(compose_inv_tensors(psi0, psi1), expect_tensor), f"Comparing entries for {ket}")
+print()
+
+
+
+# Batched kernel against the single matrix elements
+from basis.contractions import contract_magnetic_elem, contract_magnetic_block
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
 
+print('>> Contracting whole blocks of states')
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=4, cache=ArtifactCache(cache_dir.name))
+plaq = plaqs_vertices[0]
+plaq_links = plaqs_links[0]
+conf_outside = tuple(0 if link in plaqs_links[0] else 4 for link in range(nlinks))
+for bra_conf, ket_conf in [(ket_easy.irreps, ket_medium1.irreps), (ket_hard.irreps, conf_outside)]:
+    plaq_tensor = plaq_mels.tensor(
+        tuple(bra_conf[link] for link in plaq_links),
+        tuple(ket_conf[link] for link in plaq_links)
+    )
+    block = contract_magnetic_block(
+        plaq_tensor,
+        [np.array(basis._basis[bra_conf][v]) for v in plaq],
+        [np.array(basis._basis[ket_conf][v]) for v in plaq]
+    )
+    bras = [s for s in basis.states if s.irreps == bra_conf]
+    kets = [s for s in basis.states if s.irreps == ket_conf]
+    expected = [
+        contract_magnetic_elem(
+            plaq_tensor,
+            tensor_around_plaq(basis, bra, plaq),
+            tensor_around_plaq(basis, ket, plaq)
+        )
+        for bra in bras for ket in kets
+    ]
+    compare(np.allclose(block.ravel(), expected), f"Block {bra_conf} x {ket_conf}")
@@ -2,17 +2,17 @@ import sys
 if '..' not in sys.path:
     sys.path.append('..')
 
-from dihedral import DihGroup, Dih_irreps
+from group import DihGroup, DihIrreps
 
 dih = DihGroup(4)
-irreps = Dih_irreps(dih.N)
+irreps = DihIrreps(dih.N)
 
 print("Elements:")
 print(dih.elements)
 print("-" * 80 + "\n")
 
 print("Multiplication table:")
-for r in dih.mul_table():
+for r in dih.mul_table:
     print(r)
 print("-" * 80 + "\n")
 
@@ -23,7 +23,7 @@ print("-" * 80 + "\n")
 
 print("Character tables for the generators (r and s)")
 for irr in irreps.chars:
-    print([irr(dih.elem(1, 0)), irr(dih.elem(0, 1))])
+    print([irr(dih.r), irr(dih.s)])
 print()
 
 print("Character tables for conjugacy class")
@@ -2,6 +2,8 @@ import sys
 if '..' not in sys.path:
     sys.path.append('..')
 
+import numpy as np
+
 from group import DihGroup, DihIrreps
 from basis.basis import Basis
 from hamiltonian.electric import elec_hamiltonian
@@ -24,5 +26,25 @@ else:
     print(f"> Valid generating set: {generating_set}")
 
 print("> Computing electric Hamiltonian")
-H_E = elec_hamiltonian(basis, generating_set, irreps, progress_bar=True)
+H_E = elec_hamiltonian(basis, generating_set, irreps)
 print("> Done")
+print(f"\t{repr(H_E)}")
+
+# compare with the link-by-link sum over the states
+# (characters evaluated one by one, without the group)
+from hamiltonian.electric import elec_single_link_fn
+f = elec_single_link_fn(generating_set, irreps)
+expected = [sum(f(j) for j in state.irreps) for state in basis.states]
+print(f"> Diagonal matches the sum over the links: {np.allclose(H_E.diagonal(), expected)}")
+
+# several generating sets at once
+from hamiltonian.electric import elec_diagonals
+r, s = group.r, group.s
+gen_sets = [generating_set, {r, ~r, s, r*s, r*r*s, r*r*r*s}, {r, r*r, r*r*r}]
+diagonals = elec_diagonals(basis, gen_sets, irreps)
+print(f"> Diagonals for {len(gen_sets)} generating sets: {diagonals.shape}")
+for gen_set, diagonal in zip(gen_sets, diagonals):
+    expected = elec_hamiltonian(basis, gen_set, irreps).diagonal()
+    f = elec_single_link_fn(gen_set, irreps, group)
+    direct = [sum(f(j) for j in state.irreps) for state in basis.states]
+    print(f"\t{np.allclose(diagonal, expected) and np.allclose(diagonal, direct)}")
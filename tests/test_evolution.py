@@ -0,0 +1,53 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import tempfile
+import numpy as np
+
+from group import DihGroup, DihIrreps
+from basis.basis import Basis
+from hamiltonian import elec_diagonals, magnetic_hamiltonian
+from hamiltonian.electric import casimir_values
+from solver.evolution import evolve, quench, ground_state
+from solver.sweep import CoupledHamiltonian
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+
+group = DihGroup(3)
+irreps = DihIrreps(group.N)
+r, s = group.r, group.s
+
+print(f'> Group: {group}')
+print('> Computing physical Hilbert space')
+basis = Basis(group, irreps, vertices, nlinks)
+print(f'\ttotal number of states: {len(basis.states)}')
+
+print('> Computing the Hamiltonians')
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=2, cache=ArtifactCache(cache_dir.name))
+HB = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+gen_set = {r, ~r, s}
+HE = elec_diagonals(basis, [gen_set], irreps)[0]
+link_energies = casimir_values([gen_set], irreps, group)[0]
+
+# Krylov evolution against the exact one from dense diagonalization
+print('> Quench from λ = 0.2 to λ = 0.7')
+times = np.linspace(0, 5, 11)
+psi0 = ground_state(CoupledHamiltonian(HE, HB, 0.2), seed=0)
+energies, vecs = np.linalg.eigh(0.3 * np.diag(HE) - 0.7 * HB.toarray())
+for t, psi in evolve(CoupledHamiltonian(HE, HB, 0.7), psi0, times):
+    exact = vecs @ (np.exp(-1j * energies * t) * (vecs.T @ psi0))
+    print(f'\tt = {t:.1f}\t{np.allclose(psi, exact, atol=1e-8)}')
+
+# observables
+for method in ('krylov', 'expm'):
+    results = quench(HE, HB, 0.7, times, psi0=psi0, basis=basis,
+                     link_energies=link_energies, method=method)
+    energy = 0.3 * results['expt_elec'] - 0.7 * results['expt_magn']
+    print(f'> Observables with {method}')
+    print(f"\tnorm conserved: {np.allclose(results['norm'], 1)}")
+    print(f"\tenergy conserved: {np.allclose(energy, energy[0])}")
+    print(f"\tlinks sum to <H_E>: {np.allclose(results['link_elec'].sum(axis=1), results['expt_elec'])}")
@@ -0,0 +1,54 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import tempfile
+import numpy as np
+
+from group import DihGroup, DihIrreps
+from basis.basis import Basis
+from hamiltonian import elec_diagonals, magnetic_hamiltonian
+from solver.kpm import kpm_over_range
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+
+group = DihGroup(3)
+irreps = DihIrreps(group.N)
+r, s = group.r, group.s
+
+print(f'> Group: {group}')
+print('> Computing physical Hilbert space')
+basis = Basis(group, irreps, vertices, nlinks)
+print(f'\ttotal number of states: {len(basis.states)}')
+
+print('> Computing the Hamiltonians')
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=2, cache=ArtifactCache(cache_dir.name))
+HB = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+HE = elec_diagonals(basis, [{r, ~r, s}], irreps)[0]
+
+couplings = [0.3, 0.7]
+betas = np.array([0.1, 0.5])
+print('> Kernel polynomial method')
+results = kpm_over_range(couplings, HE, HB, betas, n_moments=256, n_random=64, seed=0)
+again = kpm_over_range(couplings, HE, HB, betas, n_moments=256, n_random=64, seed=0)
+print(f"\treproducible with a seed: {np.array_equal(results['energy'], again['energy'])}")
+
+# compare with the exact thermal averages
+HB_dense = HB.toarray()
+for n, coupling in enumerate(couplings):
+    energies, vecs = np.linalg.eigh((1 - coupling) * np.diag(HE) - coupling * HB_dense)
+    expt_elec = np.einsum('in,i,in->n', vecs, HE, vecs)
+    print(f'\tλ = {coupling}')
+    dos_norm = np.trapezoid(results['dos'][n], results['energies'][n])
+    print(f'\t\tDOS normalized: {np.isclose(dos_norm, 1, atol=1e-3)}')
+    for m, beta in enumerate(betas):
+        weights = np.exp(-beta * (energies - energies[0]))
+        weights /= weights.sum()
+        # stochastic trace: agreement within a percent of the bandwidth
+        atol = 1e-2 * (energies[-1] - energies[0])
+        print(f'\t\tβ = {beta}'
+              f'\t<H> {np.isclose(results["energy"][n, m], weights @ energies, atol=atol)}'
+              f'\t<H_E> {np.isclose(results["expt_elec"][n, m], weights @ expt_elec, atol=atol)}')
@@ -2,10 +2,15 @@ import sys
 if '..' not in sys.path:
     sys.path.append('..')
 
+import tempfile
+import numpy as np
+
 from group import DihGroup, DihIrreps
 from basis.basis import Basis, State
-from hamiltonian.plaquette import PlaquetteMels
-from hamiltonian.magnetic import magn_hamiltonian_mel, MagneticWorker
+from hamiltonian.magnetic import magn_hamiltonian_mel, MagneticWorker, MagneticOperator, plaquette_hamiltonians, \
+                                 magnetic_hamiltonian, magnetic_hamiltonian_mp
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
 from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
 
 group = DihGroup(4)
@@ -19,7 +24,9 @@ basis = Basis(group, irreps, vertices, nlinks)
 print(f'\ttotal number of states: {len(basis.states)}\n')
 
 print('> Loading single plaquette matrix elements')
-plaq_mels = PlaquetteMels(irreps=irreps, from_file="../pickled/plaquette_data_D4.pkl")
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=4, cache=ArtifactCache(cache_dir.name))
 print('\tPlaquette loaded')
 print(f'\t#rows: {len(plaq_mels)}')
 
@@ -66,3 +73,37 @@ for bra in bras:
     for state, val in result_row.items():
         print(f'\t{state} -> {val}')
     print()
+
+
+print('> Comparing the selection-rule kets with a scan over all the states')
+for bra in bras[:2]:
+    scanned = {
+        ket for ket in basis.states
+        if magn_hamiltonian_mel(basis, bra, ket, plaqs_vertices, plaq_mels)
+    }
+    print(f'\t{bra}: {set(magn_worker.full_row(bra)) == scanned}')
+
+
+print('> Comparing the matrix-free operator with the single rows')
+magn_operator = MagneticOperator(basis, plaqs_vertices, plaq_mels)
+for bra in bras:
+    # column of the operator, i.e. the conjugated row by hermiticity
+    unit = np.zeros(len(basis))
+    unit[basis.index_of(bra)] = 1
+    column = magn_operator @ unit
+    row = magn_worker.full_row(bra)
+    expected = np.zeros(len(basis), dtype=column.dtype)
+    for ket, val in row.items():
+        expected[basis.index_of(ket)] = np.conj(val)
+    print(f'\t{bra}: {np.allclose(column, expected)}')
+
+
+print('> Comparing the translated plaquette Hamiltonians with the matrix-free operator')
+x = np.random.default_rng(0).standard_normal(len(basis))
+H_plaqs = plaquette_hamiltonians(basis, plaqs_vertices, plaq_mels)
+print(f'\t{np.allclose(sum(H_plaqs) @ x, magn_operator @ x)}')
+
+
+print('> Comparing the forked build with the serial one')
+H_B = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+print(f'\t{abs(magnetic_hamiltonian_mp(basis, plaqs_vertices, plaq_mels, pool_size=2) - H_B).max() < 1e-12}')
@@ -0,0 +1,48 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import tempfile
+import numpy as np
+
+from group import DihGroup, DihIrreps
+from basis.basis import Basis
+from hamiltonian import elec_diagonals, magnetic_hamiltonian
+from solver import sweep, parallel_sweep
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+
+# the sweep workers are spawned and re-import this script
+if __name__ == '__main__':
+    group = DihGroup(3)
+    irreps = DihIrreps(group.N)
+    r, s = group.r, group.s
+
+    print(f'> Group: {group}')
+    print('> Computing physical Hilbert space')
+    basis = Basis(group, irreps, vertices, nlinks)
+    print(f'\ttotal number of states: {len(basis.states)}')
+
+    print('> Computing the Hamiltonians')
+    # temporary cache, not to write in the user one
+    cache_dir = tempfile.TemporaryDirectory()
+    plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=2, cache=ArtifactCache(cache_dir.name))
+    HB = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+    HE = elec_diagonals(basis, [{r, ~r, s}], irreps)[0]
+
+    couplings = np.linspace(0.2, 0.8, 7)
+    n_eigs = 4
+
+    print('> Parallel sweep with 2 workers against the serial one')
+    serial = list(sweep(couplings, HE, HB, n_eigs, seed=0))
+    results = parallel_sweep(couplings, HE, HB, n_eigs, n_workers=2, seed=0)
+    energies = np.array([e for _, e, _ in serial])
+    print(f'\tenergies: {np.allclose(results["energies"], energies, atol=1e-8)}')
+    gs = np.array([v[:, 0] for _, _, v in serial])
+    overlaps = np.abs(np.sum(gs.conj() * results['ground_states'], axis=1))
+    print(f'\tground states: {np.allclose(overlaps, 1, atol=1e-6)}')
+
+    print('> Empty coupling grid')
+    empty = parallel_sweep(np.zeros(0), HE, HB, n_eigs, n_workers=2)
+    print(f'\t{empty["energies"].shape == (0, n_eigs) and empty["ground_states"].shape == (0, HB.shape[0])}')
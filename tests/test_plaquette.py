@@ -3,9 +3,15 @@ if '..' not in sys.path:
     sys.path.append('..')
 
 import logging as log
+import os
+import pickle
+import tempfile
+import numpy as np
 
 from group import DihGroup, DihIrreps
 from hamiltonian.plaquette import PlaquetteMels, get_plaq_links
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
 from tests.lattice_2x2 import vertices, plaqs_vertices
 
 log.basicConfig(level=log.INFO)
@@ -17,7 +23,9 @@ irreps = DihIrreps(group.N)
 # plaq_matrix = wl_matrix_multiproc(group, irreps, 4, pool_size=8)
 # plaq = Plaquette(from_dict=plaq_matrix)
 
-plaq = PlaquetteMels(irreps=irreps, from_file="../pickled/plaquette_data_D4.pkl")
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq = cached_plaquette_mels(group, irreps, magn_irrep=4, cache=ArtifactCache(cache_dir.name))
 print('> Plaquette loaded')
 print(f'\t> #rows: {len(plaq)}')
 print()
@@ -37,6 +45,38 @@ print(f'> Selected irrep conf: {conf3}')
 print(f'\t> #confs: {len(plaq.select_rows(conf3))}')
 print(f'\t> expected: {4**2}')
 
+# the block tensors do not depend on how the irreps are given
+bra, ket = (4, 4, 4, 4), (0, 0, 0, 0)
+print('> Block tensor with lists and numpy integers')
+print(f'\t> {np.array_equal(plaq.tensor(list(bra), np.array(ket)), plaq.tensor(bra, ket))}')
+print(f'\t> {plaq.has_block(np.array(bra), list(ket))}')
+
+# the saved table is memory-mapped when loaded back
+blocks = [(tuple(irr[:4]), tuple(irr[4:])) for irr in plaq.block_irreps.tolist()]
+legacy = dict()
+for block in blocks:
+    for row_bra, row in plaq.select(*block).items():
+        legacy.setdefault(row_bra, dict()).update(row)
+with tempfile.TemporaryDirectory() as tmp:
+    print('> Saved and loaded back')
+    plaq.save(os.path.join(tmp, 'plaq'))
+    loaded = PlaquetteMels(irreps, from_file=os.path.join(tmp, 'plaq'))
+    print(f'\t> memory-mapped: {isinstance(loaded.values, np.memmap)}')
+    print(f'\t> same tensors: {all(np.array_equal(loaded.tensor(*b), plaq.tensor(*b)) for b in blocks)}')
+    print(f'\t> same selection: {all(loaded.select(*b) == plaq.select(*b) for b in blocks)}')
+
+    print('> Loaded from a legacy pickled dict')
+    with open(os.path.join(tmp, 'plaq.pkl'), 'wb') as file:
+        pickle.dump(legacy, file)
+    loaded = PlaquetteMels(irreps, from_file=os.path.join(tmp, 'plaq.pkl'))
+    print(f'\t> same tensors: {all(np.array_equal(loaded.tensor(*b), plaq.tensor(*b)) for b in blocks)}')
+
+    print('> Empty table saved and loaded back')
+    empty = PlaquetteMels(irreps, from_blocks=dict())
+    empty.save(os.path.join(tmp, 'empty'))
+    loaded = PlaquetteMels(irreps, from_file=os.path.join(tmp, 'empty'))
+    print(f'\t> {len(loaded) == 0 and not loaded.has_block(bra, ket)}')
+
 # expected plaquettes links
 expect_plq_links = [
     (0, 1, 2, 3),
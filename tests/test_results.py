@@ -0,0 +1,100 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import os
+import tempfile
+import numpy as np
+import scipy.sparse as sparse
+
+from group import DihGroup, DihIrreps
+from basis.basis import Basis
+from hamiltonian import elec_diagonals, magnetic_hamiltonian
+from solver import sweep_results, ResultsStore, sweep_to_store, parallel_sweep_to_store, single_precision
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+
+# the sweep workers of parallel_sweep_to_store are spawned and re-import this script
+if __name__ == '__main__':
+    group = DihGroup(3)
+    irreps = DihIrreps(group.N)
+    r, s = group.r, group.s
+
+    print(f'> Group: {group}')
+    print('> Computing physical Hilbert space')
+    basis = Basis(group, irreps, vertices, nlinks)
+    print(f'\ttotal number of states: {len(basis.states)}')
+
+    print('> Computing the Hamiltonians')
+    # temporary cache, not to write in the user one
+    cache_dir = tempfile.TemporaryDirectory()
+    plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=2, cache=ArtifactCache(cache_dir.name))
+    HB = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+    HE = elec_diagonals(basis, [{r, ~r, s}], irreps)[0]
+
+    couplings = np.linspace(0.4, 0.8, 5)
+    n_eigs = 4
+    n_states = HB.shape[0]
+    expected = sweep_results(couplings, HE, HB, n_eigs, seed=0)
+
+    with tempfile.TemporaryDirectory() as root:
+        print('> Interrupted sweep')
+        store = ResultsStore(root, n_states, n_eigs)
+        sweep_to_store(store, couplings[:3], HE, HB, n_eigs, seed=0)
+        # a crash while writing the next coupling
+        with open(os.path.join(root, ResultsStore.GROUND_STATES), 'ab') as file:
+            file.write(b'\0' * 100)
+        with open(os.path.join(root, ResultsStore.RECORDS), 'a') as file:
+            file.write('{"coupling": 0.7, "ener')
+
+        print('> Resumed sweep')
+        store = ResultsStore(root, n_states, n_eigs)
+        print(f'\tcouplings kept: {len(store) == 3}')
+        sweep_to_store(store, couplings, HE, HB, n_eigs, seed=0)
+        results = ResultsStore(root, n_states, n_eigs).load()
+        # copied out of the temporary store, to compare with the parallel sweep
+        serial = {key: np.array(value) for key, value in results.items()}
+        print(f'\tcouplings: {np.allclose(results["couplings"], couplings)}')
+        print(f'\tenergies: {np.allclose(results["energies"], expected["energies"], atol=1e-8)}')
+        print(f'\t<H_E>: {np.allclose(results["expt_elec"], expected["expt_elec"], atol=1e-8)}')
+        overlaps = np.abs(np.sum(results['ground_states'] * expected['ground_states'], axis=1))
+        print(f'\tground states: {np.allclose(overlaps, 1, atol=1e-8)}')
+
+        print('> Different run in the same directory')
+        try:
+            ResultsStore(root, n_states, n_eigs, dtype='float32')
+            print('\tFalse')
+        except ValueError:
+            print('\tTrue')
+
+    # complex Hamiltonian: H_B in a basis of states with random phases
+    print('> Complex ground states in single precision')
+    phases = np.exp(2j * np.pi * np.random.default_rng(1).random(n_states))
+    HB_complex = sparse.diags(phases) @ HB @ sparse.diags(phases.conj())
+    dtype = single_precision(np.result_type(HE.dtype, HB_complex.dtype))
+    with tempfile.TemporaryDirectory() as root:
+        store = sweep_to_store(ResultsStore(root, n_states, n_eigs, dtype=dtype), couplings, HE, HB_complex, n_eigs, seed=0)
+        results = store.load()
+        overlaps = np.abs(np.sum(np.conj(results['ground_states']) * phases * expected['ground_states'], axis=1))
+        print(f'\t{dtype}: {np.allclose(overlaps, 1, atol=1e-6)}')
+        print(f'\t<H_B>: {np.allclose(results["expt_magn"], expected["expt_magn"], atol=1e-8)}')
+        try:
+            ResultsStore(tempfile.mkdtemp(dir=root), n_states, n_eigs).append(0, [0] * n_eigs, results['ground_states'][0], 0, 0)
+            print('\tcomplex into real: False')
+        except TypeError:
+            print('\tcomplex into real: True')
+
+    print('> Parallel sweep streamed to the store')
+    with tempfile.TemporaryDirectory() as root:
+        # more segments than workers, appended in order of completion
+        parallel_sweep_to_store(
+            ResultsStore(root, n_states, n_eigs), couplings, HE, HB, n_eigs, n_workers=2, n_segments=4, seed=0
+        )
+        results = ResultsStore(root, n_states, n_eigs).load()
+        print(f'\tcouplings: {np.array_equal(results["couplings"], serial["couplings"])}')
+        print(f'\tenergies: {np.allclose(results["energies"], serial["energies"], atol=1e-8)}')
+        print(f'\t<H_E>: {np.allclose(results["expt_elec"], serial["expt_elec"], atol=1e-8)}')
+        overlaps = np.abs(np.sum(results['ground_states'] * serial['ground_states'], axis=1))
+        print(f'\tground states: {np.allclose(overlaps, 1, atol=1e-8)}')
+
@@ -0,0 +1,61 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import os
+import tempfile
+
+from group import DihGroup, DihIrreps
+from basis.basis import Basis
+from hamiltonian.magnetic import magnetic_hamiltonian
+from hamiltonian.shards import ShardedMagneticBuild
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+
+group = DihGroup(3)
+irreps = DihIrreps(group.N)
+
+print(f'> Group: {group}')
+print('> Computing physical Hilbert space')
+basis = Basis(group, irreps, vertices, nlinks)
+n_states = len(basis)
+print(f'\ttotal number of states: {n_states}')
+
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=2, cache=ArtifactCache(cache_dir.name))
+H_exp = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+
+with tempfile.TemporaryDirectory() as root:
+    print('> Two machines building half of the rows each')
+    build = ShardedMagneticBuild(root, basis, plaqs_vertices, plaq_mels, key='test', n_shards=8)
+    first = build.build(row_range=(0, n_states // 2))
+    print(f'\tfirst half: {0 < len(first) < len(build) and not build.complete()}')
+    # the second machine is interrupted, leaving a temporary file
+    second = build.pending()
+    build.build_shard(second[0])
+    stale = build.shard_path(second[1]) + '.otherhost.1234.tmp'
+    open(stale, 'wb').close()
+
+    print('> Reopened with a different number of shards')
+    try:
+        ShardedMagneticBuild(root, basis, plaqs_vertices, plaq_mels, key='test', n_shards=4)
+        print('\tFalse')
+    except ValueError:
+        print('\tTrue')
+
+    print('> Resumed build')
+    build = ShardedMagneticBuild(root, basis, plaqs_vertices, plaq_mels, key='test')
+    computed = build.build(row_range=(n_states // 2, n_states), pool_size=2)
+    print(f'\tonly the missing shards: {computed == second[1:]}')
+    H = build.merge()
+    print(f'\tmerged: {abs(H - H_exp).max() < 1e-12}')
+    print(f'\ttemporary files removed: {not os.path.exists(stale)}')
+
+    print('> Different build in the same directory')
+    try:
+        ShardedMagneticBuild(root, basis, plaqs_vertices, plaq_mels, key='other')
+        print('\tFalse')
+    except ValueError:
+        print('\tTrue')
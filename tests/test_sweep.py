@@ -0,0 +1,65 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import tempfile
+import numpy as np
+import scipy.sparse as sparse
+
+from group import DihGroup, DihIrreps
+from basis.basis import Basis
+from hamiltonian import elec_diagonals, magnetic_hamiltonian
+from solver import sweep, sweep_results
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+
+group = DihGroup(3)
+irreps = DihIrreps(group.N)
+r, s = group.r, group.s
+
+print(f'> Group: {group}')
+print('> Computing physical Hilbert space')
+basis = Basis(group, irreps, vertices, nlinks)
+print(f'\ttotal number of states: {len(basis.states)}')
+
+print('> Computing the Hamiltonians')
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=2, cache=ArtifactCache(cache_dir.name))
+HB = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+HE = elec_diagonals(basis, [{r, ~r, s}], irreps)[0]
+
+# compare the warm-started sweep with dense diagonalization
+couplings = np.linspace(0.4, 0.8, 5)
+n_eigs = 6
+HB_dense = HB.toarray()
+expected = [
+    np.linalg.eigvalsh((1 - c) * np.diag(HE) - c * HB_dense)[:n_eigs]
+    for c in couplings
+]
+for method, tol in (('eigsh', 0), ('lobpcg', 1e-6)):
+    print(f'> Sweep with {method}')
+    eigs = sweep(couplings, HE, HB, n_eigs, method=method, tol=tol, maxiter=1000, seed=0)
+    for (coupling, energies, eigvecs), energies_exp in zip(eigs, expected):
+        print(f'\tλ = {coupling:.2f}\t{np.allclose(energies, energies_exp, atol=1e-7)}')
+
+# same spectrum with H_B in a basis of states with random phases, which makes it complex
+print('> Sweep of a complex Hamiltonian')
+phases = np.exp(2j * np.pi * np.random.default_rng(1).random(len(HE)))
+HB_complex = sparse.diags(phases) @ HB @ sparse.diags(phases.conj())
+for method, tol in (('eigsh', 0), ('lobpcg', 1e-6)):
+    eigs = sweep(couplings, HE, HB_complex, n_eigs, method=method, tol=tol, maxiter=1000, seed=0)
+    same = all(
+        np.allclose(energies, energies_exp, atol=1e-7) and np.iscomplexobj(eigvecs)
+        for (_, energies, eigvecs), energies_exp in zip(eigs, expected)
+    )
+    print(f'\t{method}: {same}')
+
+print('> Ground states and expectation values of the complex Hamiltonian')
+results = sweep_results(couplings, HE, HB, n_eigs, seed=0)
+results_complex = sweep_results(couplings, HE, HB_complex, n_eigs, seed=0)
+overlaps = np.abs(np.sum(np.conj(results_complex['ground_states']) * phases * results['ground_states'], axis=1))
+print(f'\tground states: {np.allclose(overlaps, 1, atol=1e-8)}')
+print(f'\t<H_E>: {np.allclose(results_complex["expt_elec"], results["expt_elec"], atol=1e-8)}')
+print(f'\t<H_B>: {np.allclose(results_complex["expt_magn"], results["expt_magn"], atol=1e-8)}')
@@ -0,0 +1,55 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import numpy as np
+import scipy.sparse as sparse
+import tempfile
+
+from group import DihGroup, DihIrreps
+from basis.basis import Basis
+from basis.symmetry import SymmetrySectors, sector_hamiltonians, diagonalize_sectors, merge_spectra
+from hamiltonian import elec_diagonals, magnetic_hamiltonian
+from utils.cache import ArtifactCache
+from cache import cached_plaquette_mels
+from tests.lattice_2x2 import vertices, plaqs_vertices, nlinks
+
+group = DihGroup(3)
+irreps = DihIrreps(group.N)
+r, s = group.r, group.s
+
+print(f'> Group: {group}')
+print('> Computing physical Hilbert space')
+basis = Basis(group, irreps, vertices, nlinks)
+print(f'\ttotal number of states: {len(basis)}')
+
+print('> Computing the Hamiltonians')
+# temporary cache, not to write in the user one
+cache_dir = tempfile.TemporaryDirectory()
+plaq_mels = cached_plaquette_mels(group, irreps, magn_irrep=2, cache=ArtifactCache(cache_dir.name))
+HB = magnetic_hamiltonian(basis, plaqs_vertices, plaq_mels)
+HE = elec_diagonals(basis, [{r, ~r, s}], irreps)[0]
+
+print('> Symmetry sectors')
+sectors = SymmetrySectors(basis)
+dims = sectors.dims()
+for label, dim in dims.items():
+    print(f'\t{label}: {dim} states')
+print(f'\tsectors cover the basis: {sum(dims.values()) == len(basis)}')
+R = sectors.reflection
+print(f'\treflection commutes with H_B: {abs(R @ HB - HB @ R).max() < 1e-12}')
+isometries = all(
+    abs(B.conj().T @ B - sparse.eye(B.shape[1])).max() < 1e-12
+    for B in sectors.sectors.values()
+)
+print(f'\torthonormal symmetry-adapted states: {isometries}')
+
+print('> Spectrum from the sectors against the full one')
+blocks = sector_hamiltonians(sectors, HE, HB)
+weight = sum(sparse.linalg.norm(HB_s)**2 for _, HB_s in blocks.values())
+print(f'\tH_B is block diagonal: {np.isclose(weight, sparse.linalg.norm(HB)**2)}')
+for coupling in (0.3, 0.7):
+    spectra = diagonalize_sectors(blocks, coupling, n_eigs=8)
+    energies, labels = merge_spectra(spectra, n_eigs=8)
+    full = np.linalg.eigvalsh((1 - coupling) * np.diag(HE) - coupling * HB.toarray())[:8]
+    print(f'\tλ = {coupling}\t{np.allclose(energies, full)}\tground state in {labels[0]}')
@@ -0,0 +1,61 @@
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+
+import random
+import numpy as np
+
+from group import DihGroup, DihIrreps
+from hamiltonian.plaquette import wl_matrix_vectorized, wl_matrix_cg, wl_mel, non_zero_plaq_char
+
+def compare(statement, message):
+    print(f'> {message}:  ', end='')
+    if statement:
+        print('pass ✓')
+    else:
+        print('fail ✗')
+
+random.seed(42)
+
+for N, complex_irreps in [(3, False), (3, True), (4, False)]:
+    group = DihGroup(N)
+    irreps = DihIrreps(group.N, complex=complex_irreps)
+    magn_irrep = len(irreps) - 1
+    print(f'>> Group: {group}, irreps: {irreps}, complex: {complex_irreps}')
+
+    C = wl_matrix_vectorized(group, irreps, magn_irrep)
+    print(f'\t#rows: {len(C)}, #mels: {sum(len(row) for row in C.values())}')
+
+    # Compare against the brute-force sum over G^4 on a sample of the entries,
+    # both non-zero (from the vectorized table) and random ones
+    group_range = non_zero_plaq_char(group, irreps, magn_irrep)
+    bras = random.sample(sorted(C), 10)
+    for bra in bras:
+        kets = random.sample(sorted(C[bra]), min(5, len(C[bra])))
+        kets += [tuple(random.choice(irreps.mel_indices()) for _ in range(4)) for _ in range(5)]
+        expected = [wl_mel(group, irreps, ket, bra, magn_irrep, group_range) for ket in kets]
+        computed = [C[bra].get(ket) for ket in kets]
+        compare(
+            all(
+                (e is None and c is None) or (e is not None and c is not None and np.isclose(e, c))
+                for e, c in zip(expected, computed)
+            ),
+            f'Comparing row {bra}'
+        )
+    print()
+
+# Closed form from the Clebsch-Gordan coefficients
+for N in [3, 4, 5]:
+    group = DihGroup(N)
+    irreps = DihIrreps(group.N)
+    magn_irrep = len(irreps) - 1
+    C_sum = wl_matrix_vectorized(group, irreps, magn_irrep)
+    C_cg = wl_matrix_cg(group, irreps, magn_irrep)
+    compare(
+        C_sum.keys() == C_cg.keys() and all(
+            C_sum[bra].keys() == C_cg[bra].keys() and
+            np.allclose(list(C_sum[bra].values()), list(C_cg[bra].values()))
+            for bra in C_sum
+        ),
+        f'Comparing Clebsch-Gordan and group sum for {group}'
+    )
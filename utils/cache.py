@@ -0,0 +1,168 @@
+"""
+Content-addressed cache for the expensive artifacts:
+plaquette tables, vertex bases, physical bases and Hamiltonians
+(the cached computations are in the top-level `cache` module).
+
+Each artifact is stored under the hash of everything it depends on
+(group, irreps, magnetic irrep, lattice geometry and the source of the
+modules it is computed with), so a stale artifact can never be picked up
+by mistake, while editing an unrelated module keeps it valid
+"""
+
+import hashlib
+import importlib.util
+import json
+import logging as log
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+
+from group import Group, Irreps
+from utils.mytyping import VertexLinks, PlaqVertices
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'NALGT_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'nalgt')
+)
+DEFAULT_MAX_BYTES = 4 * 2**30
+
+def hash_bytes(*chunks: bytes) -> str:
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(chunk)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def source_version(modules: tuple[str, ...]) -> str:
+    """Hash of the source code of `modules` (dotted names, e.g. 'basis.basis')"""
+    chunks = []
+    for module in sorted(set(modules)):
+        with open(importlib.util.find_spec(module).origin, 'rb') as file:
+            chunks += [module.encode(), file.read()]
+    return hash_bytes(*chunks)
+
+
+def group_key(group: Group) -> dict:
+    """Description of a group: its name and its multiplication table"""
+    return {
+        'name': group.name,
+        'mul_table': hash_bytes(group.mul_table.tobytes()),
+    }
+
+
+def irreps_key(group: Group, irreps: Irreps) -> dict:
+    """
+    Description of a set of irreps, from its representation matrices.
+    Captures the choice of basis (e.g. real or complex dihedral irreps)
+    """
+    mats = irreps.matrices(group)
+    return {
+        'irreps': repr(irreps),
+        'matrices': hash_bytes(str(mats.dtype).encode(), mats.tobytes()),
+    }
+
+
+def lattice_key(
+        vertices: list[VertexLinks],
+        nlinks: int,
+        plaqs_vertices: list[PlaqVertices] | None = None
+    ) -> dict:
+    """Description of the lattice geometry"""
+    key = {'vertices': [list(v) for v in vertices], 'nlinks': nlinks}
+    if plaqs_vertices is not None:
+        key['plaqs_vertices'] = [list(p) for p in plaqs_vertices]
+    return key
+
+
+class ArtifactCache:
+    """
+    Directory of pickled artifacts, addressed by the hash of their description.
+    The least recently used artifacts are evicted when the total size
+    exceeds `max_bytes`
+    """
+    def __init__(
+            self,
+            root: str = DEFAULT_CACHE_DIR,
+            max_bytes: int = DEFAULT_MAX_BYTES
+        ):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, kind: str, modules: tuple[str, ...] = (), **description) -> str:
+        """
+        Hash of the description of an artifact, including the source of the
+        `modules` it is computed with (see `source_version`) if any
+        """
+        description = dict(description, kind=kind)
+        if modules:
+            description['code'] = source_version(tuple(modules))
+        return hash_bytes(json.dumps(description, sort_keys=True).encode())
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def get(self, key: str):
+        """Load an artifact, marking it as recently used"""
+        path = self.path(key)
+        with open(path, 'rb') as file:
+            value = pickle.load(file)
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value):
+        """Store an artifact, then evict the old ones if needed"""
+        path = self.path(key)
+        file = tempfile.NamedTemporaryFile(dir=self.root, suffix='.tmp', delete=False)
+        try:
+            with file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(file.name, path)
+        finally:
+            # only left if the write failed
+            if os.path.exists(file.name):
+                os.remove(file.name)
+        self.evict(keep=key)
+
+    def get_or_compute(self, kind: str, compute, modules: tuple[str, ...] = (), **description):
+        """
+        Return the artifact described by `kind`, `modules` and `description`
+        (see `key`), calling `compute()` and storing the result on a miss
+        """
+        key = self.key(kind, modules, **description)
+        if key in self:
+            log.info(f'Cache hit for {kind} ({key[:12]})')
+            return self.get(key)
+        log.info(f'Cache miss for {kind} ({key[:12]}), computing')
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def evict(self, keep: str | None = None):
+        """Remove the least recently used artifacts until the cache fits `max_bytes`"""
+        entries = [
+            os.path.join(self.root, name)
+            for name in os.listdir(self.root)
+            if name.endswith('.pkl')
+        ]
+        entries.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in entries)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == self.path(keep):
+                continue
+            total -= os.path.getsize(path)
+            os.remove(path)
+            log.info(f'Evicted {os.path.basename(path)} from the cache')
+
+    def clear(self):
+        """Remove all the artifacts"""
+        for name in os.listdir(self.root):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.root, name))
@@ -0,0 +1,157 @@
+"""
+Geometry of periodic square lattices, in the same conventions of `tests/lattice_2x2.py`:
+each vertex is given by its 4 links from the right in the counterclockwise
+direction, each plaquette by its 4 vertices from the bottom left
+in the counterclockwise direction
+"""
+
+from collections import deque
+
+from utils.mytyping import VertexLinks, PlaqVertices
+
+
+def square_lattice(nx: int, ny: int) -> tuple[list[VertexLinks], list[PlaqVertices], int]:
+    """
+    Periodic `nx` x `ny` square lattice.
+    The vertex (x, y) has index x + nx*y, the horizontal link leaving it
+    to the right has the same index, the vertical link leaving it
+    upwards has index nx*ny + x + nx*y.
+    Returns the links of each vertex, the vertices of each plaquette
+    and the number of links
+    """
+    nvertices = nx * ny
+    vertex = lambda x, y: (x % nx) + nx * (y % ny)
+    h_link = lambda x, y: vertex(x, y)
+    v_link = lambda x, y: nvertices + vertex(x, y)
+    vertices = [
+        (h_link(x, y), v_link(x, y), h_link(x - 1, y), v_link(x, y - 1))
+        for y in range(ny) for x in range(nx)
+    ]
+    plaqs_vertices = [
+        (vertex(x, y), vertex(x + 1, y), vertex(x + 1, y + 1), vertex(x, y + 1))
+        for y in range(ny) for x in range(nx)
+    ]
+    return vertices, plaqs_vertices, 2 * nvertices
+
+
+def _endpoints(vertices: list[VertexLinks]) -> dict[tuple[int, int], int]:
+    """Vertex at the end of each link, on the given leg"""
+    return {
+        (link, leg): v for v, links in enumerate(vertices) for leg, link in enumerate(links)
+    }
+
+
+def neighbour(vertices: list[VertexLinks], v: int, leg: int) -> int:
+    """Vertex reached from `v` through the link on its leg `leg`"""
+    return _endpoints(vertices)[(vertices[v][leg], (leg + 2) % 4)]
+
+
+def lattice_map(
+        vertices: list[VertexLinks],
+        source: int,
+        target: int,
+        leg_perm: tuple[int, ...] = (0, 1, 2, 3)
+    ) -> tuple[list[int], list[int]] | None:
+    """
+    Lattice symmetry sending the vertex `source` to `target` and the leg `k`
+    of every vertex to the leg `leg_perm[k]` of its image, found by moving
+    along corresponding directions from both vertices (the identity `leg_perm`
+    gives the translations, swapping 0 and 2 the reflection of the x axis).
+    Returns the permutations of the vertices and of the links, or None if
+    the lattice is not invariant under it
+    """
+    nlinks = max(max(links) for links in vertices) + 1
+    endpoints = _endpoints(vertices)
+    neighbour = lambda v, leg: endpoints[(vertices[v][leg], (leg + 2) % 4)]
+
+    vertex_perm = {source: target}
+    queue = deque([source])
+    while queue:
+        v = queue.popleft()
+        for leg in range(4):
+            u, w = neighbour(v, leg), neighbour(vertex_perm[v], leg_perm[leg])
+            if u not in vertex_perm:
+                vertex_perm[u] = w
+                queue.append(u)
+            elif vertex_perm[u] != w:
+                return None
+    if len(set(vertex_perm.values())) != len(vertices):
+        return None
+
+    link_perm = [None] * nlinks
+    for v, w in vertex_perm.items():
+        for leg, link in enumerate(vertices[v]):
+            image = vertices[w][leg_perm[leg]]
+            if link_perm[link] not in (None, image):
+                return None
+            link_perm[link] = image
+    return [vertex_perm[v] for v in range(len(vertices))], link_perm
+
+
+def translation(
+        vertices: list[VertexLinks],
+        source: int,
+        target: int
+    ) -> tuple[list[int], list[int]] | None:
+    """
+    Lattice translation sending the vertex `source` to `target`, see `lattice_map`.
+    Returns the permutations of the vertices and of the links, or None if
+    the lattice is not invariant under it
+    """
+    return lattice_map(vertices, source, target)
+
+
+def translation_group(
+        vertices: list[VertexLinks]
+    ) -> dict[tuple[int, int], tuple[list[int], list[int]]]:
+    """
+    All the translations of the lattice, labelled by the number of steps
+    `(a, b)` along the legs 0 and 1 from the vertex 0, with `a < Lx` and `b < Ly`
+    (the periods in the two directions). Values as in `translation`
+    """
+    def period(leg):
+        steps, v = 1, neighbour(vertices, 0, leg)
+        while v != 0:
+            steps, v = steps + 1, neighbour(vertices, v, leg)
+        return steps
+
+    group = dict()
+    row_start = 0
+    for b in range(period(1)):
+        target = row_start
+        for a in range(period(0)):
+            perms = translation(vertices, 0, target)
+            if perms is not None:
+                group[(a, b)] = perms
+            target = neighbour(vertices, target, 0)
+        row_start = neighbour(vertices, row_start, 1)
+    return group
+
+
+def reflection(
+        vertices: list[VertexLinks],
+        axis: int = 0
+    ) -> tuple[list[int], list[int], tuple[int, ...]] | None:
+    """
+    Reflection of the lattice inverting the direction `axis` (0 for x, 1 for y)
+    and fixing the vertex 0. Returns the permutations of the vertices and of
+    the links, and the permutation of the legs, or None if there is no such symmetry
+    """
+    leg_perm = (2, 1, 0, 3) if axis == 0 else (0, 3, 2, 1)
+    perms = lattice_map(vertices, 0, 0, leg_perm)
+    return None if perms is None else (*perms, leg_perm)
+
+
+def plaquette_translation(
+        vertices: list[VertexLinks],
+        source: PlaqVertices,
+        target: PlaqVertices
+    ) -> tuple[list[int], list[int]] | None:
+    """
+    Lattice translation sending the plaquette `source` to `target`
+    (vertex by vertex), as in `translation`. None if there is no such translation
+    """
+    perms = translation(vertices, source[0], target[0])
+    if perms is None or tuple(perms[0][v] for v in source) != tuple(target):
+        return None
+    return perms
@@ -2,7 +2,8 @@
 
 import numpy as np
 from functools import reduce
-from scipy.linalg import null_space
+from scipy.linalg import null_space, qr
+import scipy.sparse as sparse
 
 def common_dtype(A, B, default=np.float64):
     """Return a common numpy dtype for given objects A and B"""
@@ -39,6 +40,15 @@ def null_space_system(matrices):
     return null_space(reduce(matrix_system, matrices))
 
 
+def range_basis(A, rank):
+    """
+    Returns an orthonormal basis of the range of `A`, given its `rank`,
+    using a rank-revealing (column pivoted) QR decomposition
+    """
+    Q, _, _ = qr(A, pivoting=True, mode='economic')
+    return Q[:, :rank]
+
+
 def direct_sum(A, B):
     """Returns the direct sum of A and B"""
     dtype = common_dtype(A, B)
@@ -57,3 +67,88 @@ def right_tensor(A):
     """Given a matrix `A` returns the matrix `Identity \otimes A`"""
     return np.kron(np.eye(shape(A)[0]), A)
 
+
+
+class COOBuffer:
+    """
+    Growable buffers of `(row, col, value)` triplets, used to assemble
+    a sparse matrix of given `shape` without going through `dok_matrix`.
+    The buffers double their capacity when full.
+    """
+
+    def __init__(self, shape, dtype=np.float64, capacity=1024):
+        self.shape = tuple(shape)
+        self.size = 0
+        self.rows = np.empty(capacity, dtype=np.int64)
+        self.cols = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=dtype)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, n):
+        """Make room for `n` more entries, and grow the buffers if needed"""
+        needed = self.size + n
+        capacity = len(self.rows)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity = 2 * max(capacity, 1)
+        for name in ('rows', 'cols', 'values'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def extend(self, rows, cols, values):
+        """Append arrays of entries"""
+        values = np.asarray(values)
+        n = len(values)
+        if n == 0:
+            return
+        # promote to complex if a complex value shows up in a real buffer
+        if not np.can_cast(values.dtype, self.dtype, casting='same_kind'):
+            self.values = self.values.astype(np.result_type(self.dtype, values.dtype))
+        self._reserve(n)
+        self.rows[self.size:self.size + n] = rows
+        self.cols[self.size:self.size + n] = cols
+        self.values[self.size:self.size + n] = values
+        self.size += n
+
+    def append(self, row, col, value):
+        """Append a single entry"""
+        self.extend([row], [col], [value])
+
+    def triplets(self, hermitian=False):
+        """
+        Return the `(rows, cols, values)` arrays. If `hermitian` the stored
+        entries are taken as the upper triangle of a hermitian matrix,
+        and the lower triangle is added by conjugation
+        """
+        rows = self.rows[:self.size]
+        cols = self.cols[:self.size]
+        values = self.values[:self.size]
+        if hermitian:
+            off_diag = rows != cols
+            rows, cols, values = (
+                np.concatenate((rows, cols[off_diag])),
+                np.concatenate((cols, rows[off_diag])),
+                np.concatenate((values, np.conj(values[off_diag])))
+            )
+        return rows, cols, values
+
+    def tocoo(self, hermitian=False) -> sparse.coo_matrix:
+        rows, cols, values = self.triplets(hermitian)
+        return sparse.coo_matrix((values, (rows, cols)), shape=self.shape)
+
+    def tocsr(self, hermitian=False) -> sparse.csr_matrix:
+        """Assemble a CSR matrix, duplicate entries are summed"""
+        return self.tocoo(hermitian).tocsr()
+
+    def tocsc(self, hermitian=False) -> sparse.csc_matrix:
+        """Assemble a CSC matrix, duplicate entries are summed"""
+        return self.tocoo(hermitian).tocsc()
@@ -8,6 +8,9 @@ Vector = Sequence[float]
 InvariantSpace = list[Vector]
 # Group tuple (g_1, g_2, g_3, g_4)
 GroupTuple = tuple[Group_elem, Group_elem, Group_elem, Group_elem]
+# Group elements labelled by their index in the group (see Group.index)
+ElemIndex = int
+GroupIndexTuple = tuple[ElemIndex, ElemIndex, ElemIndex, ElemIndex]
 
 # Each link is labeled by an int
 Link = int